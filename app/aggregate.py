@@ -0,0 +1,320 @@
+import time
+from collections import Counter
+from ortools.sat.python import cp_model
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+log = scheduler.telemetry.get_logger('aggregate')
+
+def employee_classes(employees):
+    """
+    Groups interchangeable employees: same role, contract, hours fund and days off.
+    Returns a list of classes, each a list of employee indices (in roster order).
+    """
+    classes = {}
+    for i, emp in enumerate(employees):
+        key = (
+            emp.get('role'),
+            emp.get('contract_type', 1.0),
+            emp['hours_fund'],
+            tuple(sorted(emp.get('unavailable_days', []))),
+            tuple(sorted(emp.get('vacation_days', []))),
+        )
+        classes.setdefault(key, []).append(i)
+    return list(classes.values())
+
+def build_class_model(data, classes, staff_reqs=None, compact=False, pruning=None):
+    """
+    Builds the aggregated CP-SAT model: one integer counter per class x day x template
+    (how many of the class work that shift) instead of one BoolVar per employee.
+    Per-employee rules become class-level bounds that every individual roster must meet:
+      - at most 4 x size worked days in any 5 (4-in-5 rule)
+      - clopens >= closers today + openers tomorrow - size
+      - hours and open/close fairness measured against size x the per-employee target
+    so the objective never exceeds that of any roster the class could be split into.
+    compact and pruning select the lean encoding and template pruning, as in scheduler.build_model.
+    Returns a context dict shaped like scheduler.build_model's (with counts and classes
+    instead of work), ready for disaggregate.
+    """
+    problem = scheduler.build_problem(data, staff_reqs=staff_reqs, pruning=pruning)
+    employees = problem['employees']
+    num_days = problem['num_days']
+    days = problem['days']
+    config = problem['config']
+    day_contexts = problem['day_contexts']
+    day_templates = problem['day_templates']
+    available = problem['available']
+
+    model = cp_model.CpModel()
+
+    # counts[class, day, shift_idx] -> Int in [0, class size]
+    counts = {}
+    for c, members in enumerate(classes):
+        # Members share their days off, so the first one speaks for the class
+        for day in days:
+            if (members[0], day) not in available:
+                continue
+            for s_idx, template in enumerate(day_templates[day]):
+                counts[(c, day, s_idx)] = model.NewIntVar(0, len(members), f'count_{c}_{day}_{s_idx}')
+
+    log.info("class_counters_created", counters=len(counts), classes=len(classes), employees=len(employees))
+
+    # Same index as the per-employee model, keyed by class instead of employee
+    index = scheduler.build_work_index(counts, day_templates)
+    class_day_vars = index['emp_day']
+    day_kind_vars = index['day_kind']
+
+    # 1. Each member works at most one shift a day
+    for (c, day), shifts in class_day_vars.items():
+        model.Add(sum(shifts) <= len(classes[c]))
+
+    # 2. Daily Staffing Requirements (build_problem's allocation, shared with the per-employee model)
+    managers = set(problem['manager_ids'])
+    manager_classes = [c for c, members in enumerate(classes) if members[0] in managers]
+
+    day_shape_vars = []
+    for day, staffing in problem['staffing'].items():
+        management_vars = None
+        if day_contexts[day].weekday == 0: # Monday
+            management_vars = []
+            for c in manager_classes:
+                management_vars.extend(class_day_vars.get((c, day), []))
+
+        day_shape_vars.extend(scheduler.add_day_staffing(
+            model, day, staffing,
+            index['day'].get(day, []),
+            day_kind_vars.get((day, 'OPEN'), []),
+            day_kind_vars.get((day, 'CLOSE'), []),
+            day_kind_vars.get((day, 'FLEX'), []),
+            management_vars
+        ))
+
+    # 3. Consecutive Days: a class of n can cover at most 4n member-days in any 5
+    for c, members in enumerate(classes):
+        for day in range(1, num_days - 3):
+            window = [class_day_vars.get((c, d)) for d in range(day, day + 5)]
+            if all(window):
+                model.Add(sum(sum(v) for v in window) <= 4 * len(members))
+
+    # 4. Soft Clopen Ban: whoever closes today and opens tomorrow beyond the class size must be the same person
+    clopen_vars = []
+    if config.get('enable_clopen_ban', True):
+        class_day_kind_vars = index['emp_day_kind']
+        for c, members in enumerate(classes):
+            for day in range(1, num_days):
+                close_vars = class_day_kind_vars.get((c, day, 'CLOSE'))
+                open_vars_next = class_day_kind_vars.get((c, day + 1, 'OPEN'))
+                if close_vars and open_vars_next:
+                    clopens = model.NewIntVar(0, len(members), f'clopens_{c}_{day}')
+                    model.Add(clopens >= sum(close_vars) + sum(open_vars_next) - len(members))
+                    clopen_vars.append(clopens)
+
+    # Fairness and hours, against the class total of the per-employee targets
+    fairness_vars = []
+    obj_vars = []
+    paid_hours = problem['paid_hours']
+    class_kind_vars = index['emp_kind']
+    class_hours = index['emp_hours']
+    longest_shift = {day: max((int(t['duration'] * 10) for t in templates), default=0)
+                     for day, templates in day_templates.items()}
+
+    for c, members in enumerate(classes):
+        size = len(members)
+        emp = employees[members[0]]
+        bound = num_days * size
+
+        target_ops = int(round(emp['hours_fund'] / 9.5 / 2)) * size
+        total_worked = sum(var * duration_int for var, duration_int in class_hours.get(c, []))
+        target_int = int((emp['hours_fund'] - paid_hours[members[0]]) * 10) * size
+
+        if compact:
+            o_count = sum(class_kind_vars.get((c, 'OPEN'), []))
+            c_count = sum(class_kind_vars.get((c, 'CLOSE'), []))
+            fairness_vars.append(scheduler.add_deviation(model, o_count - c_count, -bound, bound, f'abs_diff_oc_{c}'))
+            fairness_vars.append(scheduler.add_deviation(model, o_count - target_ops, -target_ops, bound - target_ops, f'abs_diff_o_t_{c}'))
+            fairness_vars.append(scheduler.add_deviation(model, c_count - target_ops, -target_ops, bound - target_ops, f'abs_diff_c_t_{c}'))
+            most_hours = size * sum(longest_shift[day] for (k, day) in class_day_vars if k == c)
+            obj_vars.append(scheduler.add_deviation(model, total_worked - target_int, -target_int, most_hours - target_int, f'abs_diff_{c}'))
+            continue
+
+        o_count = model.NewIntVar(0, bound, f'open_count_{c}')
+        c_count = model.NewIntVar(0, bound, f'close_count_{c}')
+        model.Add(o_count == sum(class_kind_vars.get((c, 'OPEN'), [])))
+        model.Add(c_count == sum(class_kind_vars.get((c, 'CLOSE'), [])))
+
+        for term, name in ((o_count - c_count, 'diff_oc'), (o_count - target_ops, 'diff_o_t'), (c_count - target_ops, 'diff_c_t')):
+            diff = model.NewIntVar(-bound, bound, f'{name}_{c}')
+            abs_diff = model.NewIntVar(0, bound, f'abs_{name}_{c}')
+            model.Add(diff == term)
+            model.AddAbsEquality(abs_diff, diff)
+            fairness_vars.append(abs_diff)
+
+        diff = model.NewIntVar(-10000 * size, 10000 * size, f'diff_{c}')
+        abs_diff = model.NewIntVar(0, 10000 * size, f'abs_diff_{c}')
+        model.Add(diff == total_worked - target_int)
+        model.Add(abs_diff >= diff)
+        model.Add(abs_diff >= -diff)
+        obj_vars.append(abs_diff)
+
+    cost_vars = [var * cost for var, cost in index['costs']]
+
+    # Weighting (build_problem resolved the defaults, see scheduler.objective_weights)
+    weights = problem['weights']
+    model.Minimize(
+        sum(obj_vars) * weights['work_hours'] +
+        sum(cost_vars) * weights['shift_cost'] +
+        sum(day_shape_vars) * weights['day_shape'] +
+        sum(fairness_vars) * weights['open_close_fairness'] +
+        sum(clopen_vars) * weights['clopen']
+    )
+
+    return dict(problem, model=model, counts=counts, classes=classes, index=index)
+
+def disaggregate(ctx, value):
+    """
+    Splits each class's daily shift counts between its members, day by day.
+    The crew is whoever has the shortest current streak (the longest streaks rest first,
+    so nobody reaches five in a row while the class-level 4-in-5 bound allows it), then
+    whoever is furthest behind on hours. Opening shifts are handed out first, to members
+    who did not close the day before; longer shifts go to whoever is furthest behind.
+    Returns ({(i, day): template}, {"consecutive_violations", "clopens"}).
+    """
+    counts = ctx['counts']
+    kinds_of = scheduler.TEMPLATE_KINDS
+    assignment = {}
+    stats = {"consecutive_violations": 0, "clopens": 0}
+
+    for c, members in enumerate(ctx['classes']):
+        streak = {i: 0 for i in members}
+        closed = {i: False for i in members}
+        worked = {i: 0.0 for i in members}
+        balance = {i: 0 for i in members}  # opens - closes
+
+        for day in ctx['days']:
+            slots = []
+            for s_idx, template in enumerate(ctx['day_templates'][day]):
+                var = counts.get((c, day, s_idx))
+                if var is not None:
+                    slots.extend([template] * int(value(var)))
+
+            ranked = sorted(members, key=lambda i: (streak[i], worked[i]))
+            crew = ranked[:len(slots)]
+            stats["consecutive_violations"] += sum(1 for i in crew if streak[i] >= 4)
+
+            slots.sort(key=lambda t: ('OPEN' not in kinds_of[t['type']], -t['duration']))
+            for template in slots:
+                kinds = kinds_of[template['type']]
+                opening = 'OPEN' in kinds
+                # Openers lean to who has closed more, closers to who has opened more
+                lean = balance if opening else {i: -b for i, b in balance.items()}
+                i = min(crew, key=lambda i: (opening and closed[i], worked[i], lean[i]))
+                crew.remove(i)
+                assignment[(i, day)] = template
+                if opening and closed[i]:
+                    stats["clopens"] += 1
+
+            for i in members:
+                template = assignment.get((i, day))
+                if template is None:
+                    streak[i] = 0
+                    closed[i] = False
+                    continue
+                kinds = kinds_of[template['type']]
+                streak[i] += 1
+                closed[i] = 'CLOSE' in kinds
+                worked[i] += template['duration']
+                balance[i] += ('OPEN' in kinds) - ('CLOSE' in kinds)
+
+    return assignment, stats
+
+def hint_counts(ctx, assignment):
+    """Hints every class counter from a per-employee assignment: how many of the class work that shift."""
+    class_of = {i: c for c, members in enumerate(ctx['classes']) for i in members}
+    positions = {day: {id(t): s_idx for s_idx, t in enumerate(templates)}
+                 for day, templates in ctx['day_templates'].items()}
+    working = Counter((class_of[i], day, positions[day][id(template)]) for (i, day), template in assignment.items())
+    for key, var in ctx['counts'].items():
+        ctx['model'].AddHint(var, working[key])
+
+def solve_aggregated(data, profile, stop_event=None, timer=None):
+    """
+    Solves the class model, then disaggregates it into individual rosters.
+    With profile['greedy'] the greedy schedule hints the counters and is returned
+    (status FALLBACK) if the solver finds nothing in time, as in the full mode.
+    Returns a result dict in the same shape as scheduler.solve_schedule, plus an
+    "aggregation" block (classes, counters, rule violations left by disaggregation).
+    """
+    timer = timer or scheduler.telemetry.PhaseTimer()
+    employees = data['employees']
+    with timer.phase("model_build"):
+        classes = employee_classes(employees)
+        ctx = build_class_model(data, classes, compact=profile["encoding"] == "compact",
+                                pruning=scheduler.get_template_pruning(profile))
+
+    greedy = None
+    if profile["greedy"]:
+        with timer.phase("warm_start"):
+            greedy = scheduler._sibling('greedy').build_greedy_schedule(ctx)
+            hint_counts(ctx, greedy[0])
+        log.info("greedy_built", build_ms=round(greedy[1]['build_time_seconds'] * 1000, 1),
+                 understaffed_slots=greedy[1]['understaffed_slots'])
+
+    solver = cp_model.CpSolver()
+    with scheduler.CPU_BUDGET.lease(profile["num_workers"]) as num_workers, timer.phase("solve"):
+        # A plain hint: repair_hint can abort the process on a timeout (see scheduler._solve_built_model)
+        scheduler.apply_solver_profile(solver, profile, num_workers)
+        log.info("solve_started", workers=num_workers, time_limit_seconds=profile["time_limit_seconds"])
+        watcher = scheduler.watch_stop_event(solver, stop_event) if stop_event is not None else None
+        try:
+            status = solver.Solve(ctx['model'])
+        finally:
+            if watcher is not None:
+                watcher.set()
+
+    log.info("solve_finished", status=solver.StatusName(status))
+
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    result = {
+        "status": solver.StatusName(status),
+        "solver_status": solver.StatusName(status),
+        "solve_time_seconds": solver.WallTime(),
+        # Class-level objective and bound: a lower bound on the per-employee objective
+        "best_bound": solver.BestObjectiveBound(),
+        "objective_value": solver.ObjectiveValue() if solved else 0,
+        "schedule": {},
+        "employees": [],
+        "understaffed": scheduler.format_understaffed(ctx['understaff_info']),
+        "solver_profile": dict(profile, num_workers=num_workers),
+        "model": scheduler.model_size(ctx['model']),
+        "aggregation": {
+            "classes": len(classes),
+            "largest_class": max((len(members) for members in classes), default=0),
+            "variables": len(ctx['counts']),
+        }
+    }
+
+    if greedy is not None:
+        result["greedy"] = dict(greedy[1], used_as_fallback=False)
+    if profile["debug"]:
+        result["debug"] = scheduler.search_debug(solver, profile)
+
+    assignment = None
+    if solved:
+        assignment, stats = disaggregate(ctx, solver.Value)
+        result["aggregation"].update(stats)
+    elif status == cp_model.UNKNOWN and greedy is not None:
+        # Out of time (or cancelled) before any solution: return the greedy schedule, labelled as such
+        log.warning("no_solution_in_time", action="returning the greedy schedule")
+        result["status"] = "FALLBACK"
+        result["greedy"]["used_as_fallback"] = True
+        assignment = greedy[0]
+    if assignment is not None:
+        open_days = [day for day in ctx['days'] if not ctx['day_contexts'][day].closed]
+        result["schedule"], result["employees"] = scheduler.format_assignment(
+            employees, assignment, open_days, ctx['paid_hours'])
+        timer.lap("extraction")
+
+    return result
@@ -0,0 +1,169 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+# --- Demand curves ------------------------------------------------------------
+# data['demand'] gives the staff needed on the floor through the day, per 30-minute slot
+# (slot k runs from k/2 to (k + 1)/2 hours). A curve is a list of
+# {"start": "HH:MM", "end": "HH:MM", "staff": n} entries on half-hour boundaries; where
+# entries overlap the larger figure counts. A day takes, in this order, its own curve
+# (demand['days'], keyed like special_days), its weekday's (demand['weekdays'], 'mon'..'sun')
+# or demand['default']. An empty curve means no demand that day.
+
+SLOT_HOURS = 0.5
+SLOTS_PER_DAY = 48
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# Objective weight per staff member missing from one slot (weights['coverage'])
+DEFAULT_COVERAGE_WEIGHT = 40
+
+def slot_time(slot):
+    return scheduler.fmt_time(slot * SLOT_HOURS)
+
+def _slot(text, what):
+    position = scheduler.parse_time(text) / SLOT_HOURS
+    if position != int(position) or not 0 <= position <= SLOTS_PER_DAY:
+        raise ValueError(f"Demand {what} '{text}' is not a half hour of the day")
+    return int(position)
+
+def parse_curve(curve):
+    """A demand curve as required staff per slot (an int array of SLOTS_PER_DAY)."""
+    required = np.zeros(SLOTS_PER_DAY, dtype=np.int64)
+    for entry in curve:
+        first, last = _slot(entry['start'], "start"), _slot(entry['end'], "end")
+        staff = int(entry['staff'])
+        if last <= first:
+            raise ValueError(f"Demand entry {entry['start']}-{entry['end']} ends before it starts")
+        if staff < 0:
+            raise ValueError(f"Demand entry {entry['start']}-{entry['end']} needs a negative staff count")
+        np.maximum(required[first:last], staff, out=required[first:last])
+    return required
+
+def _weekday_curves(demand):
+    weekdays = demand.get('weekdays') or {}
+    unknown = sorted(set(weekdays) - set(WEEKDAYS))
+    if unknown:
+        raise ValueError(f"Unknown demand weekdays: {', '.join(unknown)} (expected {', '.join(WEEKDAYS)})")
+    return weekdays
+
+def validate_demand(demand):
+    """Raises ValueError for an unknown weekday or a malformed curve anywhere in demand."""
+    curves = [demand.get('default')] + list(_weekday_curves(demand).values()) + list((demand.get('days') or {}).values())
+    for curve in curves:
+        if curve:
+            parse_curve(curve)
+
+def day_demand(demand, day_contexts, days):
+    """
+    {day: required staff per slot} for the open days in days whose curve asks for anyone.
+    Slots outside a day's opening hours are dropped, since no shift can cover them
+    (a default curve can run to closing time and still fit a short holiday).
+    """
+    if not demand:
+        return {}
+    weekdays = _weekday_curves(demand)
+    by_day = demand.get('days') or {}
+
+    parsed = {}  # id(curve) -> slots: a curve shared by many days is parsed once
+    required_by_day = {}
+    for day in days:
+        context = day_contexts[day]
+        if context.closed:
+            continue
+        curve = by_day.get(str(day))
+        if curve is None:
+            curve = weekdays.get(WEEKDAYS[context.weekday])
+        if curve is None:
+            curve = demand.get('default')
+        if not curve:
+            continue
+        if id(curve) not in parsed:
+            parsed[id(curve)] = parse_curve(curve)
+        required = parsed[id(curve)].copy()
+        required[:math.ceil(context.open_time / SLOT_HOURS)] = 0
+        required[math.floor(context.close_time / SLOT_HOURS):] = 0
+        if required.any():
+            required_by_day[day] = required
+    return required_by_day
+
+def month_demand(data):
+    """day_demand for every day of a (prepared) month's data dict."""
+    year, month = data.get('year', 2025), data.get('month', 12)
+    day_contexts = scheduler.build_day_contexts(year, month, data.get('config', {}),
+                                                data.get('closed_holidays', []), data.get('special_days', {}))
+    return day_demand(data.get('demand'), day_contexts, sorted(day_contexts))
+
+# --- Coverage -----------------------------------------------------------------
+
+@lru_cache(maxsize=scheduler.TEMPLATE_CACHE_SIZE)
+def _coverage_matrix(spans):
+    starts = np.array([start for start, _ in spans], dtype=float).reshape(-1, 1)
+    ends = np.array([end for _, end in spans], dtype=float).reshape(-1, 1)
+    slot_starts = np.arange(SLOTS_PER_DAY) * SLOT_HOURS
+    matrix = (starts <= slot_starts) & (slot_starts + SLOT_HOURS <= ends)
+    matrix.flags.writeable = False
+    return matrix
+
+def coverage_matrix(templates):
+    """
+    Read-only templates x slots bool matrix: True where the template's shift covers the whole slot.
+    Memoized per distinct template table, so days (and requests) with the same hours share it.
+    """
+    return _coverage_matrix(tuple((t['start'], t['end']) for t in templates))
+
+def add_coverage(model, template_vars, day_templates, required_by_day):
+    """
+    Soft coverage constraints: for every slot with demand, staff on shift plus a shortfall
+    variable must reach the required staff. template_vars is the work index's
+    {(day, s_idx): [var]}. Each (day, template) head count is summed once and shared by the
+    slots the template covers, so a work literal sits in one constraint however many slots
+    there are (summing the literals per slot doubles the build of a large store).
+    Returns the shortfall variables for the objective.
+    """
+    shortfall = []
+    for day, required in sorted(required_by_day.items()):
+        coverage = coverage_matrix(day_templates[day])
+        slots = np.flatnonzero(required)
+        counts = {}
+        for s_idx in np.flatnonzero(coverage[:, slots].any(axis=1)).tolist():
+            shift_vars = template_vars.get((day, s_idx))
+            if shift_vars:
+                count = model.NewIntVar(0, len(shift_vars), f'on_shift_{day}_{s_idx}')
+                model.Add(count == cp_model.LinearExpr.Sum(shift_vars))
+                counts[s_idx] = count
+        for slot in slots.tolist():
+            need = int(required[slot])
+            short = model.NewIntVar(0, need, f'short_{day}_{slot}')
+            on_shift = [counts[s_idx] for s_idx in np.flatnonzero(coverage[:, slot]).tolist() if s_idx in counts]
+            model.Add(cp_model.LinearExpr.Sum(on_shift) + short >= need)
+            shortfall.append(short)
+    return shortfall
+
+def coverage_report(required_by_day, schedule):
+    """
+    The result's 'coverage' block for a schedule ({str(day): {name: shift}}): the staff-hours
+    the demand asks for, how many of them were not covered, and every slot that came up short
+    as {day, start, end, required, scheduled}.
+    """
+    slot_starts = np.arange(SLOTS_PER_DAY) * SLOT_HOURS
+    short_slots = []
+    required_hours = short_hours = 0.0
+    for day, required in sorted(required_by_day.items()):
+        shifts = list(schedule.get(str(day), {}).values())
+        starts = np.array([scheduler.parse_time(s['start']) for s in shifts], dtype=float).reshape(-1, 1)
+        ends = np.array([scheduler.parse_time(s['end']) for s in shifts], dtype=float).reshape(-1, 1)
+        scheduled = ((starts <= slot_starts) & (slot_starts + SLOT_HOURS <= ends)).sum(axis=0)
+        short = np.maximum(required - scheduled, 0)
+        required_hours += required.sum() * SLOT_HOURS
+        short_hours += short.sum() * SLOT_HOURS
+        for slot in np.flatnonzero(short).tolist():
+            short_slots.append({"day": day, "start": slot_time(slot), "end": slot_time(slot + 1),
+                                "required": int(required[slot]), "scheduled": int(scheduled[slot])})
+    return {"required_staff_hours": float(required_hours), "short_staff_hours": float(short_hours),
+            "short_slots": short_slots}
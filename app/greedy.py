@@ -0,0 +1,119 @@
+import time
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+# Length the builder aims for while an employee still owes a full shift (the 0-cost "gold standard")
+IDEAL_SHIFT_HOURS = 9.5
+
+def _pick_template(templates, owed):
+    # Closest to what the employee still owes (capped at a full shift), cheapest on ties
+    ideal = min(IDEAL_SHIFT_HOURS, max(owed, 0.0))
+    return min(templates, key=lambda t: (abs(t['duration'] - ideal), t['cost']))
+
+def build_greedy_schedule(ctx):
+    """
+    Fills each day's staffing allocation from a built model context (scheduler.build_model),
+    one day at a time, in a few milliseconds:
+      - crew: available employees not on a 4-day streak, furthest from their hours fund first,
+        with a manager swapped in on Mondays (and one kept fresh for it on Sundays)
+      - shift kinds: the day's open / close targets, openers taken from who did not close
+        the day before, then whoever has opened least; closers from whoever has closed least
+      - templates: the one closest to what the employee still owes, capped at 9.5h
+    Returns ({(i, day): template}, {"understaffed_slots", "build_time_seconds"}).
+    Days it cannot fill without breaking the 4-in-5 rule are left short (counted in understaffed_slots).
+    """
+    started = time.perf_counter()
+    employees = ctx['employees']
+    available = ctx['available']
+    managers = set(ctx['manager_ids'])
+
+    owed = {i: emp['hours_fund'] - ctx['paid_hours'][i] for i, emp in enumerate(employees)}
+    streak = {i: 0 for i in range(len(employees))}
+    closed = {i: False for i in range(len(employees))}
+    balance = {i: 0 for i in range(len(employees))}  # opens - closes
+
+    assignment = {}
+    understaffed_slots = 0
+
+    for day in ctx['days']:
+        dc = ctx['day_contexts'][day]
+        staffing = ctx['staffing'].get(day)
+        if dc.closed or staffing is None:
+            for i in streak:
+                streak[i] = 0
+                closed[i] = False
+            continue
+
+        eligible = [i for i in range(len(employees)) if (i, day) in available and streak[i] < 4]
+        eligible.sort(key=lambda i: -owed[i])
+        need = staffing['req_staff']
+        crew = eligible[:need]
+
+        if dc.weekday == 0 and managers and crew and not managers.intersection(crew):
+            free_managers = [i for i in eligible if i in managers]
+            if free_managers:
+                crew = [free_managers[0]] + crew[:need - 1]
+
+        # Tomorrow is a Monday: keep one of its managers off a 4-day streak so they can work it
+        tomorrow = ctx['day_contexts'].get(day + 1)
+        if tomorrow is not None and tomorrow.weekday == 0 and not tomorrow.closed:
+            monday_managers = [i for i in managers if (i, day + 1) in available]
+            if monday_managers and all(i in crew and streak[i] >= 3 for i in monday_managers):
+                rested = max(monday_managers, key=lambda i: streak[i])
+                crew.remove(rested)
+                spare = [i for i in eligible if i not in crew and i != rested]
+                if spare:
+                    crew.append(spare[0])
+        understaffed_slots += need - len(crew)
+
+        by_type = {}
+        for t in dc.templates:
+            by_type.setdefault(t['type'], []).append(t)
+
+        kinds = {}
+        if 'FIXED' in by_type:
+            # Short day: one shift covers it
+            kinds = {i: 'FIXED' for i in crew}
+        else:
+            rest = list(crew)
+            openers = sorted(rest, key=lambda i: (closed[i], balance[i], -owed[i]))[:min(staffing['target_open'], len(rest))]
+            for i in openers:
+                kinds[i] = 'OPEN'
+                rest.remove(i)
+            closers = sorted(rest, key=lambda i: (-balance[i], -owed[i]))[:min(staffing['target_close'], len(rest))]
+            for i in closers:
+                kinds[i] = 'CLOSE'
+                rest.remove(i)
+            for i in rest:
+                kinds[i] = 'FLEX' if 'FLEX' in by_type else 'CLOSE'
+
+        for i, kind in kinds.items():
+            template = _pick_template(by_type.get(kind) or dc.templates, owed[i])
+            assignment[(i, day)] = template
+
+        for i in range(len(employees)):
+            template = assignment.get((i, day))
+            if template is None:
+                streak[i] = 0
+                closed[i] = False
+                continue
+            template_kinds = scheduler.TEMPLATE_KINDS[template['type']]
+            streak[i] += 1
+            closed[i] = 'CLOSE' in template_kinds
+            owed[i] -= template['duration']
+            balance[i] += ('OPEN' in template_kinds) - ('CLOSE' in template_kinds)
+
+    return assignment, {
+        "understaffed_slots": understaffed_slots,
+        "build_time_seconds": time.perf_counter() - started,
+    }
+
+def hint_assignment(ctx, assignment):
+    """Hints every work variable from an assignment: 1 for the chosen template, 0 otherwise."""
+    day_templates = ctx['day_templates']
+    model = ctx['model']
+    for (i, day, s_idx), var in ctx['work'].items():
+        model.AddHint(var, assignment.get((i, day)) is day_templates[day][s_idx])
@@ -0,0 +1,323 @@
+import copy
+import time
+import calendar
+import datetime
+from ortools.sat.python import cp_model
+
+try:
+    from . import scheduler
+    from . import demand
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+    import demand
+
+log = scheduler.telemetry.get_logger('horizon')
+
+MIN_HORIZON_DAYS = 7
+MAX_HORIZON_DAYS = 92
+# Full-time hours per weekday, for months without a full_time_hours figure
+HOURS_PER_WEEKDAY = 8.0
+
+# --- Carry-over between periods ---------------------------------------------
+# A period (a month, or one segment of a horizon) hands the next one, per employee name:
+#   trailing_worked_days  days worked in a row up to its last day (4-in-5 rule)
+#   last_shift_type       type of the shift on its last day, None if off (clopen)
+#   hours_balance         hours worked plus paid leave minus the hours fund, running total
+
+def carry_in_from_state(employees, carry_over, first_day, targets=None):
+    """
+    build_model's carry_in for a period starting on first_day, from the carry_over state the
+    previous period left. targets {employee index: fund - paid hours} lets a non-zero
+    hours_balance shift the period's hours target (ahead works less, behind works more).
+    """
+    names = {emp['name'] for emp in employees}
+    unknown = sorted(set(carry_over) - names)
+    if unknown:
+        raise ValueError(f"carry_over names unknown employees: {', '.join(unknown)}")
+
+    carry_in = {}
+    for i, emp in enumerate(employees):
+        state = carry_over.get(emp['name'])
+        if state is None:
+            continue
+        streak = int(state.get('trailing_worked_days') or 0)
+        last_type = state.get('last_shift_type')
+        if last_type is not None and last_type not in scheduler.TEMPLATE_KINDS:
+            raise ValueError(f"Unknown last_shift_type '{last_type}' for {emp['name']} "
+                             f"(expected one of {', '.join(scheduler.TEMPLATE_KINDS)})")
+        entry = {
+            "worked_before": {first_day - k: k <= streak for k in range(1, 5)},
+            "closed_before": streak > 0 and last_type is not None and 'CLOSE' in scheduler.TEMPLATE_KINDS[last_type],
+        }
+        balance = float(state.get('hours_balance') or 0.0)
+        if targets is not None and balance:
+            entry["hours_target"] = max(0.0, targets[i] - balance)
+        carry_in[i] = entry
+    return carry_in
+
+def month_carry_in(data):
+    """carry_in for a whole-month solve of a prepared data dict with a carry_over block."""
+    closed_holidays = data.get('closed_holidays', [])
+    special_days = data.get('special_days', {})
+    targets = {
+        i: emp['hours_fund'] - scheduler.get_paid_hours(emp, closed_holidays, special_days)[0]
+        for i, emp in enumerate(data['employees'])
+    }
+    return carry_in_from_state(data['employees'], data['carry_over'], 1, targets)
+
+def carry_over_from_schedule(employees, schedule, days, emp_stats, previous=None):
+    """
+    The carry_over state a period leaves: schedule and emp_stats are a result's 'schedule'
+    and 'employees' blocks over days (in order), previous is the state the period started from.
+    """
+    previous = previous or {}
+    diffs = {stat['name']: stat['diff'] for stat in emp_stats}
+    state = {}
+    for emp in employees:
+        name = emp['name']
+        before = previous.get(name, {})
+        streak = 0
+        for day in reversed(days):
+            if name not in schedule.get(str(day), {}):
+                break
+            streak += 1
+        else:
+            # Worked every day of the period: the streak runs on from the one before
+            streak += int(before.get('trailing_worked_days') or 0)
+        last = schedule.get(str(days[-1]), {}).get(name)
+        state[name] = {
+            "trailing_worked_days": streak,
+            "last_shift_type": last['type'] if last else None,
+            "hours_balance": round(float(before.get('hours_balance') or 0.0) + diffs.get(name, 0.0), 2),
+        }
+    return state
+
+# --- Horizons -----------------------------------------------------------------
+
+def parse_horizon(data):
+    """(start date, number of days) of data['horizon'] = {"start": "YYYY-MM-DD", "days": N}."""
+    horizon = data['horizon']
+    try:
+        start = datetime.date.fromisoformat(str(horizon['start']))
+        num_days = int(horizon['days'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("horizon needs a start date (YYYY-MM-DD) and a number of days")
+    if not MIN_HORIZON_DAYS <= num_days <= MAX_HORIZON_DAYS:
+        raise ValueError(f"A horizon covers {MIN_HORIZON_DAYS} to {MAX_HORIZON_DAYS} days, got {num_days}")
+    return start, num_days
+
+def plan_segments(start, num_days):
+    """Splits a horizon at month boundaries: [(year, month, first_day, last_day)]."""
+    segments = []
+    day = start
+    end = start + datetime.timedelta(days=num_days - 1)
+    while day <= end:
+        month_end = datetime.date(day.year, day.month, calendar.monthrange(day.year, day.month)[1])
+        last = min(end, month_end)
+        segments.append((day.year, day.month, day.day, last.day))
+        day = last + datetime.timedelta(days=1)
+    return segments
+
+def _to_date(value, start):
+    # ISO dates anywhere in the horizon; plain day numbers are days of the start month
+    if isinstance(value, int) or str(value).isdigit():
+        return datetime.date(start.year, start.month, int(value))
+    return datetime.date.fromisoformat(str(value))
+
+def _weekdays(year, month, first_day, last_day):
+    return sum(1 for day in range(first_day, last_day + 1) if calendar.weekday(year, month, day) < 5)
+
+def month_data(data, start, year, month):
+    """
+    One calendar month of a horizon request as an ordinary data dict. Dated entries
+    (unavailable_days, vacation_days, closed_holidays, special_days, heavy_days, demand['days']
+    and previous_schedule keys) that fall in the month become day numbers; the rest are dropped.
+    full_time_hours is one figure for every month or {"YYYY-MM": hours}; a month without one
+    gets 8h per weekday.
+    """
+    def in_month(values):
+        dates = (_to_date(value, start) for value in values)
+        return [d.day for d in dates if (d.year, d.month) == (year, month)]
+
+    def keyed_in_month(mapping):
+        dated = ((_to_date(key, start), value) for key, value in mapping.items())
+        return {str(d.day): value for d, value in dated if (d.year, d.month) == (year, month)}
+
+    prepared = dict(copy.deepcopy({key: value for key, value in data.items()
+                                   if key not in ('horizon', 'carry_over')}),
+                    year=year, month=month)
+    prepared['closed_holidays'] = in_month(data.get('closed_holidays', []))
+    prepared['special_days'] = keyed_in_month(data.get('special_days', {}))
+    prepared['heavy_days'] = keyed_in_month(data.get('heavy_days', {}))
+    if data.get('previous_schedule'):
+        prepared['previous_schedule'] = keyed_in_month(data['previous_schedule'])
+    if data.get('demand'):
+        prepared['demand'] = dict(prepared['demand'], days=keyed_in_month(data['demand'].get('days') or {}))
+    for emp in prepared['employees']:
+        emp['unavailable_days'] = in_month(emp.get('unavailable_days', []))
+        emp['vacation_days'] = in_month(emp.get('vacation_days', []))
+
+    full_time = data.get('full_time_hours')
+    if isinstance(full_time, dict):
+        full_time = full_time.get(f"{year:04d}-{month:02d}")
+    if full_time is None:
+        full_time = HOURS_PER_WEEKDAY * _weekdays(year, month, 1, calendar.monthrange(year, month)[1])
+    prepared['full_time_hours'] = full_time
+    return scheduler.prepare_data(prepared)
+
+def solve_horizon(data, profile, stop_event=None, timer=None):
+    """
+    Solves data['horizon'] (a start date and 7 to 92 days) one calendar month at a time,
+    each month with an equal slice of the remaining time limit and the carry_over state the
+    month before left (the request's own carry_over for the first). A month the horizon only
+    partly covers gets the weekday share of its hours fund. Returns a result dict in the shape
+    of scheduler.solve_schedule with the schedule keyed by ISO date, plus a 'horizon' block and
+    the 'carry_over' to start the next horizon from. A previous_schedule (keyed by ISO date, as
+    a horizon result's schedule is) hints each month with its own days. Cancelled between months,
+    it returns the months already solved with status PARTIAL and their carry_over.
+    timer (a telemetry.PhaseTimer) adds up each phase over all months.
+    """
+    timer = timer or scheduler.telemetry.PhaseTimer()
+    start, num_days = parse_horizon(data)
+    segments = plan_segments(start, num_days)
+    state = dict(data.get('carry_over') or {})
+    log.info("horizon_started", start=start.isoformat(), days=num_days, segments=len(segments))
+
+    started = time.time()
+    schedule = {}
+    understaffed = []
+    coverage = None
+    totals = {}
+    segment_stats = []
+    status_name = "OPTIMAL"
+    objective_total = 0.0
+    hints = None
+    num_workers = profile["num_workers"]
+
+    for n, (year, month, first_day, last_day) in enumerate(segments):
+        if stop_event is not None and stop_event.is_set():
+            # Cancelled between months: the months already solved still stand
+            status_name = "PARTIAL" if segment_stats else "UNKNOWN"
+            log.warning("horizon_cancelled", solved_segments=len(segment_stats), segments=len(segments))
+            break
+
+        with timer.phase("prepare_data"):
+            seg_data = month_data(data, start, year, month)
+        employees = seg_data['employees']
+        days = list(range(first_day, last_day + 1))
+        closed_holidays = [d for d in seg_data['closed_holidays'] if first_day <= d <= last_day]
+        special_days = {k: v for k, v in seg_data['special_days'].items() if first_day <= int(k) <= last_day}
+        if seg_data.get('previous_schedule'):
+            seg_data['previous_schedule'] = {k: v for k, v in seg_data['previous_schedule'].items()
+                                             if first_day <= int(k) <= last_day}
+
+        # The segment's share of each monthly fund, and the paid leave that falls inside it
+        share = (_weekdays(year, month, first_day, last_day)
+                 / _weekdays(year, month, 1, calendar.monthrange(year, month)[1]))
+        funds = {i: emp['hours_fund'] * share for i, emp in enumerate(employees)}
+        paid_hours = {}
+        for i, emp in enumerate(employees):
+            vacation = [d for d in emp['vacation_days'] if first_day <= d <= last_day]
+            paid_hours[i] = scheduler.get_paid_hours(dict(emp, vacation_days=vacation), closed_holidays, special_days)[0]
+
+        carry_in = carry_in_from_state(employees, state, first_day,
+                                       {i: funds[i] - paid_hours[i] for i in funds})
+        for i in range(len(employees)):
+            entry = carry_in.setdefault(i, {})
+            entry.setdefault("hours_target", max(0.0, funds[i] - paid_hours[i]))
+            entry["open_target"] = int(round(funds[i] / 9.5 / 2))
+
+        ctx = scheduler.build_model(seg_data, days=days, carry_in=carry_in,
+                                    compact=profile["encoding"] == "compact",
+                                    pruning=scheduler.get_template_pruning(profile), timer=timer)
+        # Each month gets an equal slice of whatever time is left
+        remaining = profile["time_limit_seconds"] - (time.time() - started)
+        segment_limit = max(0.1, remaining / (len(segments) - n))
+        solver, status, num_workers, hint_stats, greedy = scheduler._solve_built_model(
+            ctx, seg_data, dict(profile, time_limit_seconds=segment_limit), stop_event, timer=timer)
+
+        timer.mark()
+        segment = {
+            "year": year,
+            "month": month,
+            "first_day": first_day,
+            "last_day": last_day,
+            "status": solver.StatusName(status),
+            "time_limit_seconds": segment_limit,
+            "solve_time_seconds": solver.WallTime(),
+            "objective_value": solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None,
+            "model": scheduler.model_size(ctx['model']),
+        }
+        segment_stats.append(segment)
+        if hint_stats is not None:
+            hints = hints or dict.fromkeys(("previous_shifts", "matched_shifts", "hinted_variables"), 0)
+            for key in hints:
+                hints[key] += hint_stats[key]
+        if profile["debug"]:
+            segment["debug"] = scheduler.search_debug(solver, profile)
+
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            assignment = scheduler.read_assignment(ctx, solver)
+            objective_total += solver.ObjectiveValue()
+            if status == cp_model.FEASIBLE and status_name == "OPTIMAL":
+                status_name = "FEASIBLE"
+        elif status == cp_model.UNKNOWN and greedy is not None:
+            # Out of time before any solution: this month keeps its greedy schedule
+            log.warning("segment_fallback", year=year, month=month, action="using the greedy schedule")
+            assignment = greedy[0]
+            segment["status"] = "FALLBACK"
+            status_name = "FALLBACK"
+        else:
+            status_name = solver.StatusName(status)
+            log.warning("segment_failed", year=year, month=month, status=status_name)
+            break
+
+        open_days = [day for day in days if not ctx['day_contexts'][day].closed]
+        seg_employees = [dict(emp, hours_fund=funds[i]) for i, emp in enumerate(employees)]
+        seg_schedule, seg_stats = scheduler.format_assignment(seg_employees, assignment, open_days, paid_hours)
+        state = carry_over_from_schedule(employees, seg_schedule, days, seg_stats, state)
+
+        for day, shifts in seg_schedule.items():
+            schedule[datetime.date(year, month, int(day)).isoformat()] = shifts
+        for entry in scheduler.format_understaffed(ctx['understaff_info']):
+            understaffed.append(dict(entry, day=datetime.date(year, month, entry['day']).isoformat()))
+        if ctx['demand']:
+            seg_coverage = demand.coverage_report(ctx['demand'], seg_schedule)
+            coverage = coverage or {"required_staff_hours": 0.0, "short_staff_hours": 0.0, "short_slots": []}
+            coverage["required_staff_hours"] += seg_coverage["required_staff_hours"]
+            coverage["short_staff_hours"] += seg_coverage["short_staff_hours"]
+            coverage["short_slots"].extend(dict(entry, day=datetime.date(year, month, entry['day']).isoformat())
+                                           for entry in seg_coverage["short_slots"])
+        for stat in seg_stats:
+            total = totals.setdefault(stat['name'], dict.fromkeys(stat, 0))
+            for key, value in stat.items():
+                total[key] = value if key == 'name' else total[key] + value
+        timer.lap("extraction")
+
+    solved = status_name in ("OPTIMAL", "FEASIBLE", "FALLBACK", "PARTIAL")
+    end = start + datetime.timedelta(days=num_days - 1)
+    result = {
+        "status": status_name,
+        "solver_status": status_name,
+        "solve_time_seconds": time.time() - started,
+        "best_bound": None,
+        # Sum of the monthly objectives; not comparable with a single-month objective
+        "objective_value": objective_total,
+        "schedule": schedule if solved else {},
+        "employees": list(totals.values()) if solved else [],
+        "understaffed": understaffed,
+        "solver_profile": dict(profile, num_workers=num_workers),
+        "horizon": {"start": start.isoformat(), "end": end.isoformat(), "days": num_days,
+                    "segments": segment_stats},
+    }
+    if hints is not None:
+        result["hints"] = dict(hints, hit_rate=hints["matched_shifts"] / hints["previous_shifts"]
+                               if hints["previous_shifts"] else 0.0)
+    if status_name == "PARTIAL":
+        last = segment_stats[-1]
+        result["horizon"]["solved_through"] = datetime.date(last["year"], last["month"], last["last_day"]).isoformat()
+    if solved:
+        result["carry_over"] = state
+        if coverage is not None:
+            result["coverage"] = coverage
+    return result
@@ -0,0 +1,257 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from . import scheduler
+from . import telemetry
+from . import schedule_metrics
+
+# Solves running at once (one process each)
+DEFAULT_MAX_WORKERS = int(os.environ.get('SCHEDULER_JOB_WORKERS', 2))
+# Jobs accepted but not finished (running + waiting). Anything beyond is rejected.
+DEFAULT_QUEUE_DEPTH = int(os.environ.get('SCHEDULER_JOB_QUEUE_DEPTH', 16))
+# How long finished jobs (and their results) stay available
+DEFAULT_RESULT_TTL_SECONDS = float(os.environ.get('SCHEDULER_JOB_TTL_SECONDS', 3600))
+# Stores of a batch solved at once (one process each), unless the request asks for fewer
+DEFAULT_BATCH_WORKERS = int(os.environ.get('SCHEDULER_BATCH_WORKERS', os.cpu_count() or 1))
+# Batches running at once (each starts its own pool); the API rejects more with 429
+DEFAULT_MAX_BATCHES = int(os.environ.get('SCHEDULER_MAX_BATCHES', 2))
+BATCH_SLOTS = threading.BoundedSemaphore(max(1, DEFAULT_MAX_BATCHES))
+
+log = telemetry.get_logger('jobs')
+
+class QueueFullError(Exception):
+    pass
+
+def _init_worker(budget):
+    # Pool processes lease from the API process's budget (shared memory), so jobs, batches
+    # and in-process solves never hold more than the server's cores between them
+    scheduler.CPU_BUDGET = budget
+    telemetry.configure_logging()
+
+def _run_job(job_id, data, stop_event, started):
+    # Cancelled while waiting in the pool's call queue
+    if stop_event.is_set():
+        return None
+    started[job_id] = time.time()
+    return scheduler.solve_schedule(data, stop_event=stop_event)
+
+class JobManager:
+    """
+    Runs solve jobs in a bounded process pool so long solves never block the API.
+    Job states: queued -> running -> done | failed, or cancelling -> cancelled.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH,
+                 result_ttl=DEFAULT_RESULT_TTL_SECONDS):
+        self.max_workers = max(1, max_workers)
+        self.queue_depth = max(1, queue_depth)
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_broken = False
+        self._manager = None
+        self._started = None
+
+    def _ensure_pool(self):
+        if self._pool is not None and self._pool_broken:
+            # A worker died (e.g. a native crash): its jobs failed, start over with a fresh pool
+            # and hand back the cores the dead workers still leased
+            log.warning("job_pool_broken", action="starting a new pool")
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pool_broken = False
+            scheduler.CPU_BUDGET.reclaim()
+        # Started lazily so importing the app does not spawn processes
+        if self._pool is None:
+            ctx = multiprocessing.get_context('spawn')
+            # Each job leases at most an equal share, so parallel jobs split the cores
+            budget = scheduler.CPU_BUDGET.limited(scheduler.CPU_BUDGET.total // self.max_workers)
+            self._manager = ctx.Manager()
+            # job id -> start time, written by the worker that actually picks the job up
+            self._started = self._manager.dict()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(budget,),
+            )
+        return self._pool
+
+    def _active_count(self):
+        return sum(1 for job in self.jobs.values() if not job['future'].done())
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job['finished_at'] is not None and now - job['finished_at'] > self.result_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+            if self._started is not None:
+                self._started.pop(job_id, None)
+
+    def submit(self, data, metrics=False):
+        with self._lock:
+            self._purge_expired()
+            if self._active_count() >= self.queue_depth:
+                raise QueueFullError(f"Job queue is full ({self.queue_depth} jobs pending)")
+
+            pool = self._ensure_pool()
+            job_id = uuid.uuid4().hex
+            stop_event = self._manager.Event()
+            job = {
+                "id": job_id,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "cancelled": False,
+                "stop_event": stop_event,
+                # Add the 'metrics' block (schedule_metrics.py) to the result
+                "metrics": metrics,
+                # The requested solver settings, to label the solve in telemetry if it raises
+                "solver": data.get('solver'),
+                "future": pool.submit(_run_job, job_id, data, stop_event, self._started),
+            }
+            self.jobs[job_id] = job
+
+        job['future'].add_done_callback(lambda _f, job=job: self._mark_finished(job))
+        return job_id
+
+    def _mark_finished(self, job):
+        job['finished_at'] = time.time()
+        # The solve ran in a pool process, whose metrics nobody scrapes: count it here
+        future = job['future']
+        if future.cancelled():
+            return
+        if isinstance(future.exception(), BrokenProcessPool):
+            self._pool_broken = True
+        if future.exception() is not None:
+            telemetry.record_failure(job['solver'])
+        elif future.result() is not None:
+            telemetry.record_solve(future.result())
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if not job['future'].done():
+                job['cancelled'] = True
+                # Waiting jobs never start; running ones stop their search and return what they have
+                if not job['future'].cancel():
+                    job['stop_event'].set()
+        return self.describe(job_id)
+
+    def describe(self, job_id):
+        with self._lock:
+            self._purge_expired()
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job['future']
+        started_at = self._started.get(job_id) if self._started is not None else None
+        info = {
+            "id": job['id'],
+            "submitted_at": job['submitted_at'],
+            "started_at": started_at,
+            "finished_at": job['finished_at'],
+            "result": None,
+            "error": None,
+        }
+        if not future.done():
+            if job['cancelled']:
+                info["status"] = "cancelling"
+            else:
+                info["status"] = "running" if started_at is not None else "queued"
+        elif job['cancelled']:
+            info["status"] = "cancelled"
+            if not future.cancelled() and future.exception() is None:
+                info["result"] = future.result()
+        elif future.exception() is not None:
+            info["status"] = "failed"
+            info["error"] = str(future.exception())
+        else:
+            info["status"] = "done"
+            info["result"] = future.result()
+        if info["result"] is not None:
+            info["result"] = schedule_metrics.with_metrics(info["result"], job['metrics'])
+        return info
+
+    def shutdown(self):
+        if self._pool is not None:
+            for job in self.jobs.values():
+                if not job['future'].done():
+                    job['stop_event'].set()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._manager.shutdown()
+            self._pool = None
+            self._manager = None
+            self._started = None
+
+def _run_batch_store(data, stop_event):
+    # Stopped before this store got a process: skip it
+    if stop_event.is_set():
+        return None, None, None
+    started = time.time()
+    result = scheduler.solve_schedule(data, stop_event=stop_event)
+    return result, started, time.time()
+
+def solve_batch(stores, concurrency=None, stop_event=None, poll_seconds=0.2):
+    """
+    Solves many stores at once: stores is {store key: data dict}. Runs them in a pool of
+    `concurrency` processes (default SCHEDULER_BATCH_WORKERS, never more than one per store),
+    each leasing at most an equal share of the server's CPU budget (the stores lease from the
+    same scheduler.CPU_BUDGET as every other solve, so a store may wait for cores). Yields (key, outcome) as each store finishes,
+    in finishing order. outcome has status ('ERROR' if the solve raised, 'CANCELLED' if it was
+    stopped before it started), queued_seconds, solve_seconds, and the result or the error.
+    Setting stop_event stops the solves still running; they return what they have.
+    """
+    if not stores:
+        return
+    workers = max(1, min(concurrency or DEFAULT_BATCH_WORKERS, len(stores)))
+    ctx = multiprocessing.get_context('spawn')
+    cores = max(1, scheduler.CPU_BUDGET.total // workers)
+    budget = scheduler.CPU_BUDGET.limited(cores)
+    manager = ctx.Manager()
+    shared_stop = manager.Event()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                               initializer=_init_worker, initargs=(budget,))
+    pending = {}
+    try:
+        submitted = time.time()
+        pending = {pool.submit(_run_batch_store, data, shared_stop): key for key, data in stores.items()}
+        log.info("batch_started", stores=len(stores), workers=workers, cores_per_worker=cores)
+        while pending:
+            if stop_event is not None and stop_event.is_set() and not shared_stop.is_set():
+                shared_stop.set()
+            done, _ = wait(pending, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                outcome = {"status": None, "queued_seconds": None, "solve_seconds": None,
+                           "result": None, "error": None}
+                # The solve ran in a pool process, whose metrics nobody scrapes: count it here
+                if future.exception() is not None:
+                    telemetry.record_failure(stores[key].get('solver'))
+                    outcome.update(status="ERROR", error=str(future.exception()))
+                else:
+                    result, started, finished = future.result()
+                    if result is None:
+                        outcome["status"] = "CANCELLED"
+                    else:
+                        telemetry.record_solve(result)
+                        outcome.update(status=result["status"], result=result,
+                                       queued_seconds=started - submitted, solve_seconds=finished - started)
+                yield key, outcome
+    finally:
+        # Done, or the caller gave up on the rest: stop whatever still runs
+        if pending:
+            shared_stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        manager.shutdown()
+        # A worker that crashed mid-solve never released its lease
+        scheduler.CPU_BUDGET.reclaim()
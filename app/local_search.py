@@ -0,0 +1,428 @@
+import math
+import random
+import time
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+log = scheduler.telemetry.get_logger('local_search')
+
+# Weight of a broken staffing rule (headcount, min openers / closers, Monday manager).
+# The greedy start can leave a day short; the search treats that as a very expensive
+# soft term so it can walk out of it, and the result says how many are left.
+HARD_PENALTY = 1_000_000
+
+# Annealing temperature, in objective units: from about a fifth of an hour off target
+# (weight 1000 per tenth of an hour) down to below a single fairness point
+START_TEMPERATURE = 2000.0
+END_TEMPERATURE = 1.0
+
+def _weights(problem):
+    # build_problem resolved the defaults (scheduler.objective_weights)
+    weights = problem['weights']
+    return {
+        "hours": weights['work_hours'],
+        "shape": weights['day_shape'],
+        "cost": weights['shift_cost'],
+        "fair": weights['open_close_fairness'],
+        "clopen": weights['clopen'],
+    }
+
+class ScheduleState:
+    """
+    Array-backed schedule for the local search: assign[i][day] is a template index
+    (or -1 for a day off), with running per-employee hours / opens / closes and per-day
+    headcount / opener / closer / middle / manager counts, so a move touching one day and
+    two employees is scored by re-reading only their terms.
+
+    The terms are the ones build_model minimises, with the same weights and targets:
+    |hours - target| per employee (tenths of an hour), shift cost, day shape deviations,
+    open/close fairness per employee and clopens.
+    """
+    def __init__(self, problem):
+        self.problem = problem
+        employees = problem['employees']
+        self.num_employees = len(employees)
+        self.days = [day for day in problem['days'] if day in problem['staffing']]
+        self.open_days = set(self.days)
+        num_days = problem['num_days']
+        self.w = _weights(problem)
+        self.clopen_ban = problem['config'].get('enable_clopen_ban', True)
+
+        # Per-day template attributes, indexed [day][t]
+        size = num_days + 2
+        self.templates = [[] for _ in range(size)]
+        self.dur = [[] for _ in range(size)]
+        self.cost = [[] for _ in range(size)]
+        self.opens_t = [[] for _ in range(size)]
+        self.closes_t = [[] for _ in range(size)]
+        self.flex_t = [[] for _ in range(size)]
+        self.by_length = [{} for _ in range(size)]
+        for day in self.days:
+            templates = problem['day_templates'][day]
+            self.templates[day] = templates
+            for t in templates:
+                kinds = scheduler.TEMPLATE_KINDS[t['type']]
+                self.dur[day].append(int(t['duration'] * 10))
+                self.cost[day].append(t.get('cost', 0))
+                self.opens_t[day].append(int('OPEN' in kinds))
+                self.closes_t[day].append(int('CLOSE' in kinds))
+                self.flex_t[day].append(int('FLEX' in kinds))
+            # Templates by length, for moves that leave the hours where they are
+            self.by_length[day] = {}
+            for t, duration in enumerate(self.dur[day]):
+                self.by_length[day].setdefault(duration, []).append(t)
+
+        # Targets, as in build_model
+        paid_hours = problem['paid_hours']
+        self.hours_target = [int((emp['hours_fund'] - paid_hours[i]) * 10) for i, emp in enumerate(employees)]
+        self.ops_target = [int(round(emp['hours_fund'] / 9.5 / 2)) for emp in employees]
+
+        staffing = problem['staffing']
+        self.req = [0] * size
+        self.min_open = [0] * size
+        self.min_close = [0] * size
+        self.target = [(0, 0, 0)] * size
+        self.needs_manager = [False] * size
+        managers = set(problem['manager_ids'])
+        self.is_manager = [i in managers for i in range(self.num_employees)]
+        self.available = [[] for _ in range(size)]
+        for (i, day) in problem['available']:
+            if day in self.open_days:
+                self.available[day].append(i)
+        for day in self.days:
+            s = staffing[day]
+            self.available[day].sort()
+            self.req[day] = s['req_staff']
+            self.min_open[day] = s['min_openers']
+            self.min_close[day] = s['min_closers']
+            self.target[day] = (s['target_open'], s['target_close'], s['target_middle'])
+            # build_model only asks for a manager when one can work that Monday
+            self.needs_manager[day] = (problem['day_contexts'][day].weekday == 0
+                                       and bool(managers.intersection(self.available[day])))
+
+        self.assign = [[-1] * size for _ in range(self.num_employees)]
+        self.hours = [0] * self.num_employees
+        self.opens = [0] * self.num_employees
+        self.closes = [0] * self.num_employees
+        self.count = [0] * size
+        self.day_open = [0] * size
+        self.day_close = [0] * size
+        self.day_middle = [0] * size
+        self.day_managers = [0] * size
+        self.total_cost = 0
+
+    def load(self, assignment):
+        """Sets the schedule from an assignment {(i, day): template}."""
+        for (i, day), template in assignment.items():
+            if day in self.open_days:
+                self.set(i, day, self.templates[day].index(template))
+
+    def to_assignment(self, assign=None):
+        assign = self.assign if assign is None else assign
+        return {
+            (i, day): self.templates[day][assign[i][day]]
+            for i in range(self.num_employees) for day in self.days
+            if assign[i][day] >= 0
+        }
+
+    def set(self, i, day, t):
+        """Puts employee i on template t (or off, for -1) on day, keeping the counts in step."""
+        old = self.assign[i][day]
+        if old >= 0:
+            self._account(i, day, old, -1)
+        self.assign[i][day] = t
+        if t >= 0:
+            self._account(i, day, t, 1)
+
+    def _account(self, i, day, t, sign):
+        o = self.opens_t[day][t]
+        c = self.closes_t[day][t]
+        self.hours[i] += sign * self.dur[day][t]
+        self.opens[i] += sign * o
+        self.closes[i] += sign * c
+        self.total_cost += sign * self.cost[day][t]
+        self.count[day] += sign
+        self.day_open[day] += sign * o
+        self.day_close[day] += sign * c
+        self.day_middle[day] += sign * self.flex_t[day][t]
+        if self.is_manager[i]:
+            self.day_managers[day] += sign
+
+    # Terms -----------------------------------------------------------------
+
+    def employee_term(self, i):
+        w = self.w
+        o, c, t = self.opens[i], self.closes[i], self.ops_target[i]
+        return (w['hours'] * abs(self.hours[i] - self.hours_target[i])
+                + w['fair'] * (abs(o - c) + abs(o - t) + abs(c - t)))
+
+    def day_violations(self, day):
+        return (abs(self.count[day] - self.req[day])
+                + max(0, self.min_open[day] - self.day_open[day])
+                + max(0, self.min_close[day] - self.day_close[day])
+                + (self.needs_manager[day] and self.day_managers[day] == 0))
+
+    def day_term(self, day):
+        target_open, target_close, target_middle = self.target[day]
+        shape = (abs(self.day_open[day] - target_open)
+                 + abs(self.day_close[day] - target_close)
+                 + abs(self.day_middle[day] - target_middle))
+        return self.w['shape'] * shape + HARD_PENALTY * self.day_violations(day)
+
+    def clopen(self, i, day):
+        # Closing on day and opening on day + 1 (assign rows are padded, so day + 1 always exists)
+        if not self.clopen_ban:
+            return 0
+        today = self.assign[i][day]
+        tomorrow = self.assign[i][day + 1]
+        return int(today >= 0 and tomorrow >= 0
+                   and self.closes_t[day][today] and self.opens_t[day + 1][tomorrow])
+
+    def local_term(self, employees, days):
+        """Every term a move on these days for these employees can change (cost is tracked separately)."""
+        total = 0
+        for day in days:
+            total += self.day_term(day)
+        # Each (day, day + 1) pair once, even when the days are neighbours
+        pairs = {d for day in days for d in (day - 1, day)}
+        for i in employees:
+            total += self.employee_term(i)
+            for day in pairs:
+                total += self.w['clopen'] * self.clopen(i, day)
+        return total
+
+    def energy(self):
+        """Objective plus HARD_PENALTY per broken staffing rule, recomputed from the counts."""
+        total = self.w['cost'] * self.total_cost
+        for i in range(self.num_employees):
+            total += self.employee_term(i)
+            total += self.w['clopen'] * sum(self.clopen(i, day) for day in self.days)
+        for day in self.days:
+            total += self.day_term(day)
+        return total
+
+    def fits_run(self, i, day):
+        """Whether working on day keeps employee i within 4 days in any 5."""
+        row = self.assign[i]
+        first = max(0, day - 4)
+        last = min(len(row) - 1, day + 4)
+        streak = 0
+        for d in range(first, last + 1):
+            streak = streak + 1 if (d == day or row[d] >= 0) else 0
+            if streak == 5:
+                return False
+        return True
+
+def evaluate_assignment(problem, assignment):
+    """
+    Scores an assignment {(i, day): template} against the objective build_model minimises.
+    Returns {objective, hours, cost, day_shape, fairness, clopens, staffing_violations}
+    (the components unweighted; staffing_violations counts broken headcount, min opener /
+    closer and Monday manager rules, which the CP-SAT model treats as hard).
+    """
+    state = ScheduleState(problem)
+    state.load(assignment)
+    w = state.w
+    hours = sum(abs(state.hours[i] - state.hours_target[i]) for i in range(state.num_employees))
+    fairness = 0
+    clopens = 0
+    for i in range(state.num_employees):
+        o, c, t = state.opens[i], state.closes[i], state.ops_target[i]
+        fairness += abs(o - c) + abs(o - t) + abs(c - t)
+        clopens += sum(state.clopen(i, day) for day in state.days)
+    day_shape = 0
+    violations = 0
+    for day in state.days:
+        target_open, target_close, target_middle = state.target[day]
+        day_shape += (abs(state.day_open[day] - target_open)
+                      + abs(state.day_close[day] - target_close)
+                      + abs(state.day_middle[day] - target_middle))
+        violations += state.day_violations(day)
+    objective = (w['hours'] * hours + w['cost'] * state.total_cost + w['shape'] * day_shape
+                 + w['fair'] * fairness + w['clopen'] * clopens)
+    return {
+        "objective": objective,
+        "hours": hours,
+        "cost": state.total_cost,
+        "day_shape": day_shape,
+        "fairness": fairness,
+        "clopens": clopens,
+        "staffing_violations": violations,
+    }
+
+def anneal(state, budget_ms, rng, stop_event=None):
+    """
+    Simulated annealing over the state for budget_ms milliseconds. Each step picks an
+    open day and one of:
+      - change: a worker switches to another of the day's templates (often one of the same length)
+      - pair: a worker changes shift on two days at once, the second making up the hours of the first
+      - transfer: a worker's shift goes to someone off that day (template kept or redrawn)
+      - swap: two workers trade templates
+      - add: someone off fills a day that is short
+    A step that would put anyone on a fifth day in a row is never taken.
+    Keeps the best schedule seen; returns its energy and the move counters.
+    """
+    days = state.days
+    assign = state.assign
+    w_cost = state.w['cost']
+    stats = {"iterations": 0, "accepted": 0, "improved": 0}
+    if not days:
+        return state.energy(), stats
+
+    energy = state.energy()
+    best = energy
+    best_assign = [row[:] for row in assign]
+
+    started = time.perf_counter()
+    budget = budget_ms / 1000.0
+    temperature = START_TEMPERATURE
+    cooling = math.log(END_TEMPERATURE / START_TEMPERATURE)
+
+    while True:
+        stats["iterations"] += 1
+        if stats["iterations"] % 256 == 0:
+            elapsed = time.perf_counter() - started
+            if elapsed >= budget or (stop_event is not None and stop_event.is_set()):
+                break
+            temperature = START_TEMPERATURE * math.exp(cooling * elapsed / budget)
+
+        day = rng.choice(days)
+        available = state.available[day]
+        if not available:
+            continue
+        lengths = state.dur[day]
+        i = rng.choice(available)
+        t_i = assign[i][day]
+        move = rng.random()
+        if t_i < 0 and state.count[day] >= state.req[day]:
+            # Nothing to fill: look at it from a worker's side (a transfer to i)
+            j = rng.choice(available)
+            if assign[j][day] < 0:
+                continue
+            i, t_i = j, assign[j][day]
+            move = max(move, 0.55)
+
+        # (employee, day, new template)
+        if t_i < 0:
+            if not state.fits_run(i, day):
+                continue
+            changes = ((i, day, rng.randrange(len(lengths))),)
+        elif move < 0.2:
+            t_new = rng.choice(state.by_length[day][lengths[t_i]])
+            if t_new == t_i:
+                continue
+            changes = ((i, day, t_new),)
+        elif move < 0.4:
+            t_new = rng.randrange(len(lengths))
+            if t_new == t_i:
+                continue
+            changes = ((i, day, t_new),)
+        elif move < 0.55:
+            other = rng.choice(days)
+            t_other = assign[i][other]
+            if other == day or t_other < 0:
+                continue
+            t_new = rng.randrange(len(lengths))
+            make_up = state.dur[other][t_other] - (lengths[t_new] - lengths[t_i])
+            candidates = state.by_length[other].get(make_up)
+            if not candidates or t_new == t_i:
+                continue
+            changes = ((i, day, t_new), (i, other, rng.choice(candidates)))
+        else:
+            j = rng.choice(available)
+            t_j = assign[j][day]
+            if j == i:
+                continue
+            if t_j >= 0:
+                if t_j == t_i:
+                    continue
+                changes = ((i, day, t_j), (j, day, t_i))
+            else:
+                if not state.fits_run(j, day):
+                    continue
+                t_new = t_i if move < 0.8 else rng.randrange(len(lengths))
+                changes = ((i, day, -1), (j, day, t_new))
+
+        employees = {e for e, _, _ in changes}
+        touched = {d for _, d, _ in changes}
+        before = state.local_term(employees, touched) + w_cost * state.total_cost
+        undo = [(e, d, assign[e][d]) for e, d, _ in changes]
+        for e, d, t in changes:
+            state.set(e, d, t)
+        delta = state.local_term(employees, touched) + w_cost * state.total_cost - before
+
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            energy += delta
+            stats["accepted"] += 1
+            if energy < best:
+                best = energy
+                stats["improved"] += 1
+                best_assign = [row[:] for row in assign]
+        else:
+            for e, d, t in reversed(undo):
+                state.set(e, d, t)
+
+    # Back to the best schedule seen
+    for i, row in enumerate(best_assign):
+        for day in days:
+            if assign[i][day] != row[day]:
+                state.set(i, day, row[day])
+    stats["search_time_seconds"] = time.perf_counter() - started
+    return best, stats
+
+def solve_local_search(data, profile, stop_event=None, timer=None):
+    """
+    Solves with the greedy schedule improved by simulated annealing for
+    profile['local_search_ms'] milliseconds, instead of CP-SAT.
+    Returns a result dict in the same shape as scheduler.solve_schedule.
+    """
+    timer = timer or scheduler.telemetry.PhaseTimer()
+    started = time.perf_counter()
+    timer.mark()
+    problem = scheduler.build_problem(data, pruning=scheduler.get_template_pruning(profile), timer=timer)
+    greedy_module = scheduler._sibling('greedy')
+    start, greedy_stats = greedy_module.build_greedy_schedule(problem)
+
+    seed = profile["random_seed"] if profile["random_seed"] is not None else 0
+    start_score = evaluate_assignment(problem, start)
+    state = ScheduleState(problem)
+    state.load(start)
+    timer.lap("warm_start")
+    log.info("local_search_started", budget_ms=profile['local_search_ms'], start_objective=start_score["objective"])
+    with timer.phase("solve"):
+        _, stats = anneal(state, profile["local_search_ms"], random.Random(seed), stop_event)
+
+    assignment = state.to_assignment()
+    score = evaluate_assignment(problem, assignment)
+    status_name = "FEASIBLE" if score["staffing_violations"] == 0 else "FALLBACK"
+    log.info("local_search_finished", moves=stats['iterations'], objective=score['objective'],
+             staffing_violations=score['staffing_violations'])
+
+    result = {
+        "status": status_name,
+        "solver_status": "LOCAL_SEARCH",
+        "solve_time_seconds": time.perf_counter() - started,
+        "best_bound": None,
+        "objective_value": float(score["objective"]),
+        "schedule": {},
+        "employees": [],
+        "understaffed": scheduler.format_understaffed(problem['understaff_info']),
+        "solver_profile": dict(profile, num_workers=1),
+        "greedy": dict(greedy_stats, used_as_fallback=False),
+        "local_search": dict(
+            stats,
+            start_objective=float(start_score["objective"]),
+            staffing_violations=score["staffing_violations"],
+        ),
+    }
+    if problem['pruning']:
+        result["pruning"] = dict(problem['pruning'], fallback=False)
+
+    open_days = [day for day in problem['days'] if not problem['day_contexts'][day].closed]
+    result["schedule"], result["employees"] = scheduler.format_assignment(
+        problem['employees'], assignment, open_days, problem['paid_hours'])
+    timer.lap("extraction")
+    return result
@@ -1,10 +1,31 @@
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import datetime
+import queue
+import threading
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Optional, Any, Literal, Union
+from contextlib import asynccontextmanager
 from . import scheduler
+from . import jobs
+from . import result_cache
+from . import schedule_metrics
+from . import telemetry
 
-app = FastAPI()
+telemetry.configure_logging()
+
+job_manager = jobs.JobManager()
+results = result_cache.ResultCache()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    job_manager.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,8 +35,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/jobs/{job_id}), not by the raw path, to keep the series few.
+    # A streamed response is timed to its headers; the solve itself shows up in the solve metrics.
+    route = request.scope.get("route")
+    telemetry.REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method, path=route.path if route is not None else "unmatched",
+        status=response.status_code)
+    return response
+
+# Days are days of the request month; a horizon request may also give ISO dates ("2026-02-14")
+def request_day(value, horizon):
+    """A request day as the solver takes it: an int, or (horizon requests only) an ISO date string."""
+    if isinstance(value, int):
+        return value
+    if value.isdigit():
+        return int(value)
+    if horizon:
+        try:
+            datetime.date.fromisoformat(value)
+            return value
+        except ValueError:
+            pass
+        raise ValueError(f"'{value}' is neither a day of the month nor an ISO date")
+    raise ValueError(f"'{value}' is not a day of the month (ISO dates need a horizon)")
+
 class SpecialDayInput(BaseModel):
-    day: int
+    day: Union[int, str]
     type: str  # "normal", "busy", "holiday_closed", "holiday_open", "holiday_short"
     openTime: Optional[str] = None
     closeTime: Optional[str] = None
@@ -26,13 +76,62 @@ class EmployeeInput(BaseModel):
     name: str
     role: str
     contractFte: float
-    unavailableDays: List[int]
-    vacationDays: List[int]
+    unavailableDays: List[Union[int, str]]
+    vacationDays: List[Union[int, str]]
 
 class ConfigInput(BaseModel):
     autoStaffing: bool
     busyWeekends: bool
 
+class SolverProfileInput(BaseModel):
+    numWorkers: Optional[int] = Field(None, ge=1)
+    timeLimitSeconds: Optional[float] = Field(None, gt=0)
+    relativeGapLimit: Optional[float] = Field(None, ge=0)
+    randomSeed: Optional[int] = None
+    # "rolling" solves the month as overlapping weekly windows, "aggregate" groups
+    # interchangeable employees into classes (both for large stores)
+    mode: Optional[Literal["full", "rolling", "aggregate"]] = None
+    windowDays: Optional[int] = Field(None, ge=1)
+    overlapDays: Optional[int] = Field(None, ge=0)
+    encoding: Optional[Literal["standard", "compact"]] = None
+    pruneDominated: Optional[bool] = None
+    templateCostCeiling: Optional[int] = Field(None, ge=0)
+    greedy: Optional[bool] = None
+    # "local_search" anneals the greedy schedule for localSearchMs instead of running CP-SAT
+    engine: Optional[Literal["cpsat", "local_search"]] = None
+    localSearchMs: Optional[int] = Field(None, ge=1)
+    # "staged" minimises hours, day shape, cost, fairness and clopens one after another
+    objective: Optional[Literal["weighted", "staged"]] = None
+    stageTolerance: Optional[float] = Field(None, ge=0)
+    # Adds a "debug" block with the CP-SAT search log and statistics to the result
+    debug: Optional[bool] = None
+    # Extra CP-SAT parameters by name; presets=false skips the tuned preset for the store's size
+    satParameters: Optional[Dict[str, Any]] = None
+    presets: Optional[bool] = None
+
+class HorizonInput(BaseModel):
+    start: str  # YYYY-MM-DD
+    days: int = Field(..., ge=7, le=92)
+
+class CarryOverInput(BaseModel):
+    trailingWorkedDays: int = Field(0, ge=0)
+    lastShiftType: Optional[Literal["OPEN", "CLOSE", "FLEX", "FIXED"]] = None
+    hoursBalance: float = 0.0
+
+# Staff needed on the floor from start to end ("HH:MM", on the half hour)
+class DemandSlotInput(BaseModel):
+    start: str
+    end: str
+    staff: int = Field(..., ge=0)
+
+# A day uses its own curve (days, keyed like specialDays), else its weekday's ("mon".."sun"), else default
+class DemandInput(BaseModel):
+    default: Optional[List[DemandSlotInput]] = None
+    weekdays: Optional[Dict[Literal["mon", "tue", "wed", "thu", "fri", "sat", "sun"], List[DemandSlotInput]]] = None
+    days: Optional[Dict[str, List[DemandSlotInput]]] = None
+    # Objective weight per staff member missing from a half-hour slot (default 40)
+    weight: Optional[int] = Field(None, ge=0)
+
 class ScheduleShift(BaseModel):
     employee_id: str
     start_time: str
@@ -63,6 +162,39 @@ class SolveRequest(BaseModel):
     employees: List[EmployeeInput]
     specialDays: List[SpecialDayInput]
     config: ConfigInput
+    solver: Optional[SolverProfileInput] = None
+    # A previous result's 'schedule' block, used to warm-start the solver
+    previousSchedule: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+    # Solve a date range (a week to a quarter) instead of month/year
+    horizon: Optional[HorizonInput] = None
+    # A previous result's 'carry_over' block: each employee's streak, last shift and hours balance
+    carryOver: Optional[Dict[str, CarryOverInput]] = None
+    # Adds a "metrics" block (fairness, open/close spread, clopens, FLEX quality, understaffing)
+    metrics: Optional[bool] = None
+    # Staff needed per half hour; the schedule covers it where it can and the result gets a "coverage" block
+    demand: Optional[DemandInput] = None
+    
+    @model_validator(mode="after")
+    def check_days(self):
+        # Days reach the solver as numbers: "5" is day 5, and ISO dates only mean something in a horizon
+        horizon = self.horizon is not None
+        for sd in self.specialDays:
+            sd.day = request_day(sd.day, horizon)
+        for e in self.employees:
+            e.unavailableDays = [request_day(day, horizon) for day in e.unavailableDays]
+            e.vacationDays = [request_day(day, horizon) for day in e.vacationDays]
+        if self.demand and self.demand.days:
+            self.demand.days = {str(request_day(day, horizon)): slots for day, slots in self.demand.days.items()}
+        return self
+
+class BatchStoreInput(SolveRequest):
+    # Echoed back on the store's events; the store's position in the batch is always sent too
+    storeId: Optional[str] = None
+
+class BatchSolveRequest(BaseModel):
+    stores: List[BatchStoreInput] = Field(..., min_length=1)
+    # Stores solved at once (default SCHEDULER_BATCH_WORKERS, at most the CPU budget)
+    concurrency: Optional[int] = Field(None, ge=1)
 
 class SolveResponse(BaseModel):
     status: str
@@ -137,15 +269,34 @@ def transform_request(req: SolveRequest) -> Dict[str, Any]:
     }
     
     # 4. Weights (Defaults)
-    weights = {
-        "work_hours": 1000,
-        "day_shape": 80,
-        "shift_cost": 5,
-        "open_close_fairness": 3,
-        "clopen": 15
-    }
+    weights = dict(scheduler.DEFAULT_WEIGHTS)
+    
+    # 5. Solver Profile (only what the client set; the scheduler fills in defaults)
+    solver = {}
+    if req.solver:
+        solver = {
+            "num_workers": req.solver.numWorkers,
+            "time_limit_seconds": req.solver.timeLimitSeconds,
+            "relative_gap_limit": req.solver.relativeGapLimit,
+            "random_seed": req.solver.randomSeed,
+            "mode": req.solver.mode,
+            "window_days": req.solver.windowDays,
+            "overlap_days": req.solver.overlapDays,
+            "encoding": req.solver.encoding,
+            "prune_dominated": req.solver.pruneDominated,
+            "template_cost_ceiling": req.solver.templateCostCeiling,
+            "greedy": req.solver.greedy,
+            "engine": req.solver.engine,
+            "local_search_ms": req.solver.localSearchMs,
+            "objective": req.solver.objective,
+            "stage_tolerance": req.solver.stageTolerance,
+            "debug": req.solver.debug,
+            "sat_parameters": req.solver.satParameters,
+            "presets": req.solver.presets
+        }
+        solver = {k: v for k, v in solver.items() if v is not None}
 
-    return {
+    data = {
         "year": req.year,
         "month": req.month,
         "full_time_hours": req.fulltimeHours,
@@ -155,24 +306,238 @@ def transform_request(req: SolveRequest) -> Dict[str, Any]:
         "closed_holidays": closed_holidays,
         "open_holidays": open_holidays,
         "config": backend_config,
-        "weights": weights
+        "weights": weights,
+        "solver": solver,
+        "previous_schedule": req.previousSchedule
     }
+    
+    # 6. Horizon, carry-over and demand (only when sent, so other requests keep their cache keys)
+    if req.horizon:
+        data["horizon"] = {"start": req.horizon.start, "days": req.horizon.days}
+    if req.carryOver:
+        data["carry_over"] = {
+            name: {
+                "trailing_worked_days": state.trailingWorkedDays,
+                "last_shift_type": state.lastShiftType,
+                "hours_balance": state.hoursBalance
+            }
+            for name, state in req.carryOver.items()
+        }
+    if req.demand:
+        def curve(slots):
+            return [{"start": slot.start, "end": slot.end, "staff": slot.staff} for slot in slots]
+        demand = {}
+        if req.demand.default is not None:
+            demand["default"] = curve(req.demand.default)
+        if req.demand.weekdays:
+            demand["weekdays"] = {name: curve(slots) for name, slots in req.demand.weekdays.items()}
+        if req.demand.days:
+            demand["days"] = {day: curve(slots) for day, slots in req.demand.days.items()}
+        data["demand"] = demand
+        if req.demand.weight is not None:
+            weights["coverage"] = req.demand.weight
+    return data
 
+def check_request(data: Dict[str, Any], label: str = "") -> None:
+    # Options the solver would refuse are the client's mistake: 422 up front, not a 500 from the solve
+    try:
+        scheduler.validate_request(data)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"{label}{e}")
+
+# Plain def: FastAPI runs it in a worker thread, so a long solve does not block the event loop
 @app.post("/solve")
-async def solve_schedule(request: SolveRequest):
+def solve_schedule(request: SolveRequest, response: Response):
     data = transform_request(request)
+    check_request(data)
+    
+    # Identical requests (same employees, days, config, weights and solver profile) reuse the earlier answer;
+    # a debug request wants to watch the search, so it always solves
+    cache_key = result_cache.request_key(data)
+    response.headers["X-Cache-Key"] = cache_key
+    cached, tier = (None, None) if result_cache.wants_debug(data) else results.get(cache_key)
+    if cached is not None:
+        response.headers["X-Cache"] = f"HIT-{tier.upper()}"
+        return schedule_metrics.with_metrics(cached, request.metrics)
+    response.headers["X-Cache"] = "MISS"
     
     try:
         result = scheduler.solve_schedule(data)
-        if result.get("status") not in ("OPTIMAL", "FEASIBLE"):
+        if result.get("status") in ("OPTIMAL", "FEASIBLE"):
+            results.put(cache_key, result)
+        else:
              # Return result even if not optimal, so user sees the error
              # But if it's INFEASIBLE, we might want to show that.
              # Frontend expects 200 OK with result object.
              pass 
-        return result
+        return schedule_metrics.with_metrics(result, request.metrics)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Seconds between keep-alive comments while the solver has nothing new to report
+SSE_KEEPALIVE_SECONDS = 15
+
+def format_sse(event: str, payload: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.post("/solve/stream")
+def solve_schedule_stream(request: SolveRequest):
+    """
+    Server-Sent Events: one 'solution' event per improving schedule while the solver runs,
+    then a final 'result' event (same shape as POST /solve) or an 'error' event.
+    """
+    data = transform_request(request)
+    check_request(data)
+    events = queue.Queue()
+    stop_event = threading.Event()
+    
+    def run():
+        try:
+            result = scheduler.solve_schedule(
+                data,
+                stop_event=stop_event,
+                on_solution=lambda solution: events.put(("solution", solution))
+            )
+            events.put(("result", schedule_metrics.with_metrics(result, request.metrics)))
+        except Exception as e:
+            events.put(("error", {"detail": str(e)}))
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    def stream():
+        try:
+            while True:
+                try:
+                    event, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, payload)
+                if event != "solution":
+                    break
+        finally:
+            # Finished, or the client went away: either way stop searching
+            stop_event.set()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/solve/batch")
+def solve_schedule_batch(request: BatchSolveRequest):
+    """
+    Server-Sent Events: solves every store in a process pool and sends one 'store' event per
+    store as soon as it finishes (cached stores first), each with its index, storeId, status,
+    timing and result (or error), then a 'done' event with the batch totals.
+    """
+    stores = [transform_request(store) for store in request.stores]
+    for index, data in enumerate(stores):
+        check_request(data, label=f"Store {index}: ")
+    concurrency = min(request.concurrency or jobs.DEFAULT_BATCH_WORKERS, scheduler.CPU_BUDGET.total)
+    # Every batch starts a process pool: only SCHEDULER_MAX_BATCHES run at once
+    if not jobs.BATCH_SLOTS.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail=f"Too many batches running ({jobs.DEFAULT_MAX_BATCHES} at most)")
+    events = queue.Queue()
+    stop_event = threading.Event()
+    
+    def store_event(index, outcome, cached=False):
+        if outcome["result"] is not None:
+            result = schedule_metrics.with_metrics(outcome["result"], request.stores[index].metrics)
+            outcome = dict(outcome, result=result)
+        return {"index": index, "storeId": request.stores[index].storeId, "cached": cached, **outcome}
+    
+    def run():
+        started = time.time()
+        statuses = []
+        try:
+            # Stores solved before come straight from the result cache
+            keys = {}
+            todo = {}
+            for index, data in enumerate(stores):
+                keys[index] = result_cache.request_key(data)
+                cached, _ = (None, None) if result_cache.wants_debug(data) else results.get(keys[index])
+                if cached is None:
+                    todo[index] = data
+                    continue
+                statuses.append(cached["status"])
+                events.put(("store", store_event(index, {
+                    "status": cached["status"], "queued_seconds": 0.0, "solve_seconds": 0.0,
+                    "result": cached, "error": None}, cached=True)))
+            for index, outcome in jobs.solve_batch(todo, concurrency, stop_event):
+                if outcome["status"] in ("OPTIMAL", "FEASIBLE"):
+                    results.put(keys[index], outcome["result"])
+                statuses.append(outcome["status"])
+                events.put(("store", store_event(index, outcome)))
+            events.put(("done", {
+                "stores": len(stores),
+                "solved": sum(1 for status in statuses if status in ("OPTIMAL", "FEASIBLE")),
+                "statuses": {status: statuses.count(status) for status in sorted(set(statuses))},
+                "concurrency": max(1, min(concurrency, len(todo))) if todo else 0,
+                "wall_seconds": time.time() - started,
+            }))
+        except Exception as e:
+            events.put(("error", {"detail": str(e)}))
+        finally:
+            jobs.BATCH_SLOTS.release()
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    def stream():
+        try:
+            while True:
+                try:
+                    event, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, payload)
+                if event != "store":
+                    break
+        finally:
+            # Finished, or the client went away: either way stop the solves still running
+            stop_event.set()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/jobs", status_code=202)
+def create_job(request: SolveRequest):
+    data = transform_request(request)
+    check_request(data)
+    try:
+        job_id = job_manager.submit(data, metrics=bool(request.metrics))
+    except jobs.QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job_manager.describe(job_id)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.describe(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/cache/stats")
+def cache_stats():
+    return results.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: request latency, solve outcomes and durations, model sizes, solves in flight."""
+    return PlainTextResponse(telemetry.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "Scheduler API is running"}
@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Bump when the model or the result shape changes in a way that makes old cached results stale
+CACHE_FORMAT = 2
+
+DEFAULT_MEMORY_ENTRIES = int(os.environ.get('SCHEDULER_RESULT_CACHE_ENTRIES', 128))
+DEFAULT_DISK_DIR = os.environ.get(
+    'SCHEDULER_RESULT_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'scheduler-result-cache')
+)
+DEFAULT_DISK_BYTES = int(os.environ.get('SCHEDULER_RESULT_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+
+def request_key(data):
+    """
+    Canonical hash of a transformed request (employees, days, config, weights, solver profile...).
+    Key order and whitespace don't matter; any value that does changes the key.
+    """
+    solver = data.get('solver') or {}
+    if 'debug' in solver:
+        # Debug only adds a report to the result, which the cache drops (see cacheable)
+        data = dict(data, solver={k: v for k, v in solver.items() if k != 'debug'})
+    canonical = json.dumps(
+        {"format": CACHE_FORMAT, "data": data},
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def wants_debug(data):
+    """True if the request asks for the search log, which only a fresh solve has."""
+    return bool((data.get('solver') or {}).get('debug'))
+
+def _without_debug(value):
+    if isinstance(value, dict):
+        return {k: _without_debug(v) for k, v in value.items() if not (k == "debug" and isinstance(v, dict))}
+    if isinstance(value, list):
+        return [_without_debug(v) for v in value]
+    return value
+
+def cacheable(result):
+    """
+    The result as the cache keeps it: without the 'debug' blocks (search log and statistics)
+    a debug solve attaches to the result, its stages, windows or months.
+    """
+    if not (result.get("solver_profile") or {}).get("debug"):
+        return result
+    result = _without_debug(result)
+    result["solver_profile"] = dict(result["solver_profile"], debug=False)
+    return result
+
+class ResultCache:
+    """
+    Two-tier cache of solve results keyed by request_key:
+    an in-memory LRU in front of a directory of JSON files evicted oldest-first by total size.
+    A disk_dir of None disables the disk tier.
+    """
+    def __init__(self, max_entries=DEFAULT_MEMORY_ENTRIES, disk_dir=DEFAULT_DISK_DIR,
+                 max_disk_bytes=DEFAULT_DISK_BYTES):
+        self.max_entries = max(0, max_entries)
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions_memory = 0
+        self.evictions_disk = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remember(self, key, result):
+        # Caller holds the lock
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions_memory += 1
+
+    def get(self, key):
+        """Returns (result, tier) with tier 'memory' or 'disk', or (None, None) on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return self._memory[key], 'memory'
+
+        if self.disk_dir:
+            path = self._path(key)
+            try:
+                with open(path, 'r') as f:
+                    result = json.load(f)
+                # Touch so disk eviction stays least-recently-used
+                os.utime(path)
+            except (OSError, ValueError):
+                result = None
+            if result is not None:
+                with self._lock:
+                    self.hits_disk += 1
+                    self._remember(key, result)
+                return result, 'disk'
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def put(self, key, result):
+        result = cacheable(result)
+        with self._lock:
+            self._remember(key, result)
+        if self.disk_dir:
+            path = self._path(key)
+            # Write then rename, so a reader never sees a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(result, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.disk_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _evict_disk(self):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions_disk += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir:
+            for _, _, name in self._disk_entries():
+                try:
+                    os.remove(os.path.join(self.disk_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        disk = self._disk_entries() if self.disk_dir else []
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_max_entries": self.max_entries,
+                "disk_entries": len(disk),
+                "disk_bytes": sum(size for _, size, _ in disk),
+                "disk_max_bytes": self.max_disk_bytes if self.disk_dir else 0,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                "evictions_memory": self.evictions_memory,
+                "evictions_disk": self.evictions_disk,
+            }
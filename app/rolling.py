@@ -0,0 +1,229 @@
+import time
+import calendar
+from ortools.sat.python import cp_model
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+log = scheduler.telemetry.get_logger('rolling')
+
+def plan_windows(num_days, window_days, overlap_days):
+    """
+    Splits the month into overlapping windows: [(first_day, commit_through, last_day)].
+    Each window is solved over first_day..last_day but only first_day..commit_through is kept;
+    the overlap lets a window see what is coming before committing its last days.
+    """
+    windows = []
+    start = 1
+    while start <= num_days:
+        commit_through = min(start + window_days - 1, num_days)
+        last_day = min(commit_through + overlap_days, num_days)
+        windows.append((start, commit_through, last_day))
+        start = commit_through + 1
+    return windows
+
+def build_carry_in(employees, day_contexts, assignment, paid_hours, first_day, last_day, num_days):
+    """
+    Fixed context for a window from what earlier windows committed: the last four days worked
+    (4-in-5 rule), a close the day before (clopen), and the share of the remaining hours fund
+    and open/close target that falls inside the window.
+    """
+    # Days each employee can work: available and the store open
+    workable = scheduler.availability_matrix(employees, num_days)
+    workable[:, [day for day, dc in day_contexts.items() if dc.closed]] = False
+    window_workable = workable[:, first_day:last_day + 1].sum(axis=1)
+    remaining_workable = workable[:, first_day:].sum(axis=1)
+
+    # Hours and opens committed so far, per employee (one pass over the assignment)
+    worked_hours = [0.0] * len(employees)
+    opens = [0] * len(employees)
+    for (i, _), template in assignment.items():
+        worked_hours[i] += template['duration']
+        if 'OPEN' in scheduler.TEMPLATE_KINDS[template['type']]:
+            opens[i] += 1
+
+    carry_in = {}
+    for i, emp in enumerate(employees):
+        worked_before = {d: (i, d) in assignment for d in range(first_day - 4, first_day)}
+        previous = assignment.get((i, first_day - 1))
+        closed_before = previous is not None and 'CLOSE' in scheduler.TEMPLATE_KINDS[previous['type']]
+
+        # Spread what is left of the fund over the days the employee can still work
+        share = float(window_workable[i] / remaining_workable[i]) if remaining_workable[i] else 0.0
+
+        remaining_hours = emp['hours_fund'] - paid_hours[i] - worked_hours[i]
+        target_ops = int(round(emp['hours_fund'] / 9.5 / 2))
+
+        carry_in[i] = {
+            "worked_before": worked_before,
+            "closed_before": closed_before,
+            "hours_target": max(0.0, remaining_hours) * share,
+            "open_target": int(round(max(0, target_ops - opens[i]) * share)),
+        }
+    return carry_in
+
+def solve_rolling(data, profile, stop_event=None, timer=None):
+    """
+    Solves the month as overlapping windows of profile['window_days'] days (plus
+    profile['overlap_days'] of look-ahead), each with a slice of the overall time limit.
+    With profile['greedy'] a greedy schedule for the month hints every window (unless a
+    previous_schedule does), and a window that finds nothing in time (or a cancelled solve)
+    keeps the greedy schedule for its days instead; the status is then FALLBACK.
+    Returns a result dict in the same shape as scheduler.solve_schedule.
+    timer (a telemetry.PhaseTimer) adds up each phase over all windows.
+    """
+    timer = timer or scheduler.telemetry.PhaseTimer()
+    employees = data['employees']
+    year = data.get('year', 2025)
+    month = data.get('month', 12)
+    num_days = calendar.monthrange(year, month)[1]
+    config = data.get('config', {})
+    closed_holidays = data.get('closed_holidays', [])
+    special_days = data.get('special_days', {})
+    heavy_days = data.get('heavy_days', {})
+    previous_schedule = data.get('previous_schedule')
+    timer.mark()
+
+    day_contexts = scheduler.build_day_contexts(year, month, config, closed_holidays, special_days)
+    paid_hours = {
+        i: scheduler.get_paid_hours(emp, closed_holidays, special_days)[0]
+        for i, emp in enumerate(employees)
+    }
+    # One staffing allocation for the whole month, shared by every window
+    staff_reqs = scheduler.calculate_monthly_staffing(employees, year, month, config, heavy_days)
+    windows = plan_windows(num_days, profile["window_days"], profile["overlap_days"])
+    pruning = scheduler.get_template_pruning(profile)
+    timer.lap("staffing_allocation")
+
+    greedy_module = scheduler._sibling('greedy')
+    greedy = problem = None
+    if profile["greedy"]:
+        # One greedy schedule for the month, on the same staffing and templates as the windows
+        problem = scheduler.build_problem(data, staff_reqs=staff_reqs, pruning=pruning)
+        greedy = greedy_module.build_greedy_schedule(problem)
+        log.info("greedy_built", build_ms=round(greedy[1]['build_time_seconds'] * 1000, 1),
+                 understaffed_slots=greedy[1]['understaffed_slots'])
+        timer.lap("warm_start")
+
+    started = time.time()
+    assignment = {}
+    understaff_info = {}
+    window_stats = []
+    status_name = "FEASIBLE"
+    objective_total = 0.0
+    fell_back = False
+
+    def fall_back(first_day, through):
+        # Commit the greedy schedule for first_day..through
+        for (i, day), template in greedy[0].items():
+            if first_day <= day <= through:
+                assignment[(i, day)] = template
+        for day, info in problem['understaff_info'].items():
+            if first_day <= day <= through:
+                understaff_info[day] = info
+
+    with scheduler.CPU_BUDGET.lease(profile["num_workers"]) as num_workers:
+        log.info("rolling_started", windows=len(windows), window_days=profile['window_days'],
+                 overlap_days=profile['overlap_days'], workers=num_workers)
+
+        for n, (first_day, commit_through, last_day) in enumerate(windows):
+            if stop_event is not None and stop_event.is_set():
+                if greedy is not None:
+                    # Cancelled: the rest of the month keeps the greedy schedule
+                    fall_back(first_day, num_days)
+                    fell_back = True
+                else:
+                    status_name = "UNKNOWN"
+                break
+
+            carry_in = build_carry_in(employees, day_contexts, assignment, paid_hours,
+                                      first_day, last_day, num_days)
+            ctx = scheduler.build_model(data, days=range(first_day, last_day + 1),
+                                        carry_in=carry_in, staff_reqs=staff_reqs,
+                                        compact=profile["encoding"] == "compact",
+                                        pruning=pruning, timer=timer)
+            if previous_schedule:
+                scheduler.apply_schedule_hints(ctx, previous_schedule)
+                timer.lap("warm_start")
+            elif greedy is not None:
+                greedy_module.hint_assignment(ctx, greedy[0])
+                timer.lap("warm_start")
+
+            # Each window gets an equal slice of whatever time is left
+            remaining = profile["time_limit_seconds"] - (time.time() - started)
+            window_limit = max(0.1, remaining / (len(windows) - n))
+
+            solver = cp_model.CpSolver()
+            scheduler.apply_solver_profile(solver, dict(profile, time_limit_seconds=window_limit), num_workers)
+            watcher = scheduler.watch_stop_event(solver, stop_event) if stop_event is not None else None
+            try:
+                with timer.phase("solve"):
+                    status = solver.Solve(ctx['model'])
+            finally:
+                if watcher is not None:
+                    watcher.set()
+
+            solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+            window_stats.append({
+                "first_day": first_day,
+                "commit_through": commit_through,
+                "last_day": last_day,
+                "status": solver.StatusName(status),
+                "time_limit_seconds": window_limit,
+                "solve_time_seconds": solver.WallTime(),
+                "objective_value": solver.ObjectiveValue() if solved else None,
+                "model": scheduler.model_size(ctx['model'])
+            })
+            if profile["debug"]:
+                window_stats[-1]["debug"] = scheduler.search_debug(solver, profile)
+
+            if not solved and status == cp_model.UNKNOWN and greedy is not None:
+                # Out of time (or cancelled) before any solution: these days keep the greedy schedule
+                log.warning("window_fallback", first_day=first_day, last_day=last_day,
+                            action="using the greedy schedule")
+                window_stats[-1]["used_greedy"] = True
+                fall_back(first_day, commit_through)
+                fell_back = True
+                continue
+            if not solved:
+                status_name = solver.StatusName(status)
+                log.warning("window_failed", first_day=first_day, last_day=last_day, status=status_name)
+                break
+
+            objective_total += solver.ObjectiveValue()
+            for (i, day), template in scheduler.read_assignment(ctx, solver).items():
+                if day <= commit_through:
+                    assignment[(i, day)] = template
+            for day, info in ctx['understaff_info'].items():
+                if day <= commit_through:
+                    understaff_info[day] = info
+            timer.lap("extraction")
+
+    solver_status = status_name
+    if fell_back and status_name == "FEASIBLE":
+        status_name, solver_status = "FALLBACK", "UNKNOWN"
+    result = {
+        "status": status_name,
+        "solver_status": solver_status,
+        "solve_time_seconds": time.time() - started,
+        "best_bound": None,
+        # Sum of the window objectives; not comparable with a full-model objective
+        "objective_value": objective_total,
+        "schedule": {},
+        "employees": [],
+        "understaffed": scheduler.format_understaffed(understaff_info),
+        "solver_profile": dict(profile, num_workers=num_workers),
+        "decomposition": {"mode": "rolling", "windows": window_stats}
+    }
+    if greedy is not None:
+        result["greedy"] = dict(greedy[1], used_as_fallback=fell_back)
+
+    if status_name in ("FEASIBLE", "FALLBACK"):
+        open_days = [day for day in range(1, num_days + 1) if not day_contexts[day].closed]
+        result["schedule"], result["employees"] = scheduler.format_assignment(
+            employees, assignment, open_days, paid_hours)
+        timer.lap("extraction")
+
+    return result
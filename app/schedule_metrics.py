@@ -0,0 +1,202 @@
+import datetime
+import operator
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from . import scheduler
+except ImportError:
+    import scheduler
+
+# Shift type codes in the day arrays; 0 is a day off (or a day the store is closed)
+OFF = 0
+TYPE_CODES = {'OPEN': 1, 'CLOSE': 2, 'FLEX': 3, 'FIXED': 4}
+# Codes that open or close the store (FIXED, a short day's single shift, does both)
+OPENING = np.array([TYPE_CODES['OPEN'], TYPE_CODES['FIXED']])
+CLOSING = np.array([TYPE_CODES['CLOSE'], TYPE_CODES['FIXED']])
+
+# A FLEX shift inside these hours covers the middle of the day, where the model wants it
+GOLDEN_HOURS = (scheduler.DEFAULT_TEMPLATE_RULES.ideal_flex_start, scheduler.DEFAULT_TEMPLATE_RULES.ideal_flex_end)
+
+# One result as dense employee x day arrays. Days run from the schedule's first day to its
+# last with closed days left empty, so the column after day d is always day d + 1.
+#   names:    employee names, in the result's 'employees' order (the rows)
+#   days:     the schedule keys of the columns ("1".."31", or ISO dates for a horizon)
+#   type:     int8 shift type code (TYPE_CODES, OFF)
+#   start, end, duration: hours (0.0 on a day off)
+#   diff:     each employee's hours against their target (the result's employee stats)
+ScheduleArrays = namedtuple('ScheduleArrays', ['names', 'days', 'type', 'start', 'end', 'duration', 'diff'])
+
+# Many results stacked (see stack): type, start, end and duration are (schedules, employees, days),
+# diff is (schedules, employees). Padding rows and columns are days off, employees are masked out
+# of the per-employee figures by 'employed'. understaffed_days and deficit are per schedule.
+ScheduleBatch = namedtuple('ScheduleBatch', ['type', 'start', 'end', 'duration', 'diff', 'employed',
+                                             'understaffed_days', 'deficit'])
+
+def _day_numbers(keys):
+    """Schedule keys as consecutive day numbers: days of the month, or ordinals for ISO dates."""
+    if all(key.isdigit() for key in keys):
+        return [int(key) for key in keys]
+    return [datetime.date.fromisoformat(key).toordinal() for key in keys]
+
+# The fields that make one shift; a shift table row per distinct combination
+_shift_key = operator.itemgetter('type', 'start', 'end', 'duration')
+
+class _ShiftIds(dict):
+    """{(type, start, end, duration): shift id}, numbering shifts as they turn up."""
+    def __missing__(self, key):
+        self[key] = len(self)
+        return self[key]
+
+def _cells(result, shift_ids, cells):
+    """
+    Appends one result's assigned cells to cells, three flat lists (rows, columns, shift ids),
+    and returns its (names, days). Per-cell work goes through map, keeping the Python loop per day.
+    """
+    names = [emp['name'] for emp in result.get('employees', [])]
+    rows = {name: i for i, name in enumerate(names)}
+    schedule = result.get('schedule') or {}
+    numbers = _day_numbers(list(schedule))
+    first = min(numbers, default=0)
+    days = [None] * (max(numbers, default=first - 1) - first + 1)
+
+    row_ids, col_ids, ids = cells
+    for (key, shifts), number in zip(schedule.items(), numbers):
+        days[number - first] = key
+        if not rows.keys() >= shifts.keys():
+            # Names only in the schedule (no stats) get rows after the others
+            for name in shifts:
+                if name not in rows:
+                    rows[name] = len(names)
+                    names.append(name)
+        row_ids.extend(map(rows.__getitem__, shifts))
+        col_ids.extend([number - first] * len(shifts))
+        ids.extend(map(shift_ids.__getitem__, map(_shift_key, shifts.values())))
+    return names, days
+
+def _shift_table(shift_ids):
+    """(type code, start, end, duration) arrays indexed by shift id."""
+    shifts = sorted(shift_ids, key=shift_ids.get)
+    codes = np.array([TYPE_CODES[kind] for kind, _, _, _ in shifts], dtype=np.int8)
+    start = np.array([scheduler.parse_time(text) for _, text, _, _ in shifts], dtype=float)
+    end = np.array([scheduler.parse_time(text) for _, _, text, _ in shifts], dtype=float)
+    duration = np.array([hours for _, _, _, hours in shifts], dtype=float)
+    return codes, start, end, duration
+
+def _scatter(shape, index, shift_ids, ids):
+    """type, start, end and duration arrays of shape, with each shift's values at its cell in index."""
+    cells = np.ravel_multi_index(tuple(np.asarray(axis, dtype=np.int64) for axis in index), shape)
+    ids = np.array(ids, dtype=np.int64)
+    arrays = (np.zeros(shape, dtype=np.int8), np.zeros(shape), np.zeros(shape), np.zeros(shape))
+    for array, values in zip(arrays, _shift_table(shift_ids)):
+        array.reshape(-1)[cells] = values[ids]
+    return arrays
+
+def _diffs(result, num_rows):
+    diff = np.full(num_rows, np.nan)
+    employees = result.get('employees', [])
+    diff[:len(employees)] = [emp['diff'] for emp in employees]
+    return diff
+
+def schedule_arrays(result):
+    """Converts a result's schedule (and employee stats) into ScheduleArrays."""
+    shift_ids = _ShiftIds()
+    row_ids, col_ids, ids = [], [], []
+    names, days = _cells(result, shift_ids, (row_ids, col_ids, ids))
+    arrays = _scatter((len(names), len(days)), (row_ids, col_ids), shift_ids, ids)
+    return ScheduleArrays(names, days, *arrays, _diffs(result, len(names)))
+
+def stack(results):
+    """Stacks many results into one ScheduleBatch, padded to the largest roster and date range."""
+    shift_ids = _ShiftIds()
+    row_ids, col_ids, ids = [], [], []
+    sizes, rosters = [], []
+    for result in results:
+        before = len(ids)
+        names, days = _cells(result, shift_ids, (row_ids, col_ids, ids))
+        rosters.append((names, days))
+        sizes.append(len(ids) - before)
+    shape = (len(results), max((len(names) for names, _ in rosters), default=0),
+             max((len(days) for _, days in rosters), default=0))
+    # All schedules' cells in one scatter
+    schedule_ids = np.repeat(np.arange(len(results)), sizes)
+    type_codes, start, end, duration = _scatter(shape, (schedule_ids, row_ids, col_ids), shift_ids, ids)
+
+    diff = np.full(shape[:2], np.nan)
+    employed = np.zeros(shape[:2], dtype=bool)
+    for n, (result, (names, _)) in enumerate(zip(results, rosters)):
+        diff[n, :len(names)] = _diffs(result, len(names))
+        employed[n, :len(names)] = True
+    understaffed = [result.get('understaffed') or [] for result in results]
+    return ScheduleBatch(
+        type_codes, start, end, duration, diff, employed,
+        np.array([len(days) for days in understaffed], dtype=np.int64),
+        np.array([sum(u['deficit'] for u in days) for days in understaffed], dtype=float),
+    )
+
+def _spread(counts, employed):
+    """(min, max, mean) of per-employee counts, ignoring padding rows; one value per schedule."""
+    low = np.where(employed, counts, np.iinfo(np.int64).max).min(axis=1, initial=np.iinfo(np.int64).max)
+    high = np.where(employed, counts, 0).max(axis=1, initial=0)
+    mean = counts.sum(axis=1) / np.maximum(employed.sum(axis=1), 1)
+    return np.where(employed.any(axis=1), low, 0), high, mean
+
+def batch_metrics(batch):
+    """
+    Quality metrics for every schedule in a ScheduleBatch, as {name: array with one value per schedule}:
+      mean_abs_diff, max_abs_diff   hours away from target, over employees (fairness)
+      opens_min/max/mean/spread, closes_min/max/mean/spread   per-employee open and close counts
+      clopens                       closing one day and opening the next (FIXED counts as both)
+      flex_shifts, golden_flex, golden_flex_share   FLEX shifts inside GOLDEN_HOURS (share NaN without FLEX)
+      understaffed_days, total_deficit
+    """
+    codes = batch.type
+    opens = np.isin(codes, OPENING)
+    closes = np.isin(codes, CLOSING)
+    open_counts = opens.sum(axis=2)
+    close_counts = closes.sum(axis=2)
+
+    # Employees without stats (padding, or names only in the schedule) are NaN
+    known = ~np.isnan(batch.diff)
+    abs_diff = np.where(known, np.abs(batch.diff), 0.0)
+    with_stats = known.sum(axis=1)
+    mean_abs_diff = np.where(with_stats > 0, abs_diff.sum(axis=1) / np.maximum(with_stats, 1), np.nan)
+    max_abs_diff = np.where(with_stats > 0, abs_diff.max(axis=1, initial=0.0), np.nan)
+
+    flex = codes == TYPE_CODES['FLEX']
+    golden = flex & (batch.start >= GOLDEN_HOURS[0]) & (batch.end <= GOLDEN_HOURS[1])
+    flex_shifts = flex.sum(axis=(1, 2))
+    golden_flex = golden.sum(axis=(1, 2))
+
+    metrics = {"mean_abs_diff": mean_abs_diff, "max_abs_diff": max_abs_diff}
+    for kind, counts in (("opens", open_counts), ("closes", close_counts)):
+        low, high, mean = _spread(counts, batch.employed)
+        metrics.update({f"{kind}_min": low, f"{kind}_max": high, f"{kind}_mean": mean, f"{kind}_spread": high - low})
+    metrics.update({
+        "clopens": (closes[:, :, :-1] & opens[:, :, 1:]).sum(axis=(1, 2)),
+        "flex_shifts": flex_shifts,
+        "golden_flex": golden_flex,
+        "golden_flex_share": np.where(flex_shifts > 0, golden_flex / np.maximum(flex_shifts, 1), np.nan),
+        "understaffed_days": batch.understaffed_days,
+        "total_deficit": batch.deficit,
+    })
+    return metrics
+
+def metrics_at(metrics, n):
+    """Schedule n's entries of batch_metrics output, as plain numbers (None where undefined)."""
+    values = {name: array[n].item() for name, array in metrics.items()}
+    return {name: None if isinstance(value, float) and np.isnan(value) else value for name, value in values.items()}
+
+def result_metrics(result):
+    """The metrics of one result: the API's 'metrics' block."""
+    return metrics_at(batch_metrics(stack([result])), 0)
+
+def with_metrics(result, wanted):
+    """
+    The result with a 'metrics' block if wanted (and it has a schedule), else the result itself.
+    The API adds it on the way out, so a cached result is shared by requests with and without it.
+    """
+    if not wanted or not result.get('schedule'):
+        return result
+    return dict(result, metrics=result_metrics(result))
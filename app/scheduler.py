@@ -1,8 +1,29 @@
 import json
 import calendar
+import importlib
 import math
+import copy
+import os
 import time
+import threading
+import multiprocessing
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
 from ortools.sat.python import cp_model
+from ortools.sat import sat_parameters_pb2
+from google.protobuf import text_format
+
+def _sibling(name):
+    """Imports another app module, whether we were loaded as app.scheduler or with app/ on sys.path."""
+    if __package__:
+        return importlib.import_module(f"{__package__}.{name}")
+    return importlib.import_module(name)
+
+telemetry = _sibling('telemetry')
+log = telemetry.EventLogger('scheduler')
 
 def load_data(filename):
     with open(filename, 'r') as f:
@@ -18,6 +39,7 @@ def prepare_data(data):
             emp['hours_fund'] = full_time * ctype
     return data
 
+@lru_cache(maxsize=256)
 def parse_time(t_str):
     h, m = map(int, t_str.split(':'))
     return h + m / 60.0
@@ -57,10 +79,25 @@ def get_paid_hours(employee, closed_holidays, special_days):
             
     return paid_hours, paid_days, credit
 
-def calculate_monthly_staffing(employees, year, month, config, heavy_days):
+def availability_matrix(employees, num_days):
+    """
+    Who can work when, as an employees x (num_days + 1) bool array indexed by day
+    (column 0 is unused): False on an employee's unavailable and vacation days.
+    Built once per request; per-day counts are column sums.
+    """
+    available = np.ones((len(employees), num_days + 1), dtype=bool)
+    available[:, 0] = False
+    for i, emp in enumerate(employees):
+        off = [day for day in list(emp.get('unavailable_days', [])) + list(emp.get('vacation_days', []))
+               if 1 <= day <= num_days]
+        available[i, off] = False
+    return available
+
+def calculate_monthly_staffing(employees, year, month, config, heavy_days, availability=None):
     """
     Calculates staff needs for the entire month to ensure total hours fund is utilized.
     Uses Largest Remainder Method to distribute shifts.
+    availability (see availability_matrix) is built from employees if not given.
     """
     # 1. Calculate Total Shifts Needed
     total_hours_fund = sum(emp.get('hours_fund', 0) for emp in employees)
@@ -94,14 +131,9 @@ def calculate_monthly_staffing(employees, year, month, config, heavy_days):
     current_total = 0
     
     # Calculate available staff per day to avoid artificial deficits
-    available_per_day = {}
-    for day in range(1, num_days + 1):
-        count = 0
-        for emp in employees:
-            # Check if employee is available
-            if day not in emp.get('unavailable_days', []) and day not in emp.get('vacation_days', []):
-                count += 1
-        available_per_day[day] = count
+    if availability is None:
+        availability = availability_matrix(employees, num_days)
+    available_per_day = availability.sum(axis=0)
     
     for day in range(1, num_days + 1):
         share = total_shifts * (day_weights[day] / total_weight)
@@ -120,66 +152,23 @@ def calculate_monthly_staffing(employees, year, month, config, heavy_days):
     
     sorted_days = sorted(days_list, key=lambda d: remainders[d], reverse=True)
     
-    # Try to assign to days that have headroom (allocation < available)
-    assigned_count = 0
+    # Headroom: days where one more shift does not exceed who is available.
+    # A first pass gives the `missing` shifts to the highest-remainder days with headroom;
+    # whatever headroom is left after it decides the final order.
+    base = np.zeros(num_days + 1, dtype=int)
+    base[1:] = [allocations[day] for day in range(1, num_days + 1)]
+    order = np.array(sorted_days)
+    first_pass = order[base[order] < available_per_day[order]][:missing]
+    after_first_pass = base.copy()
+    after_first_pass[first_pass] += 1
+    headroom = after_first_pass < available_per_day
     
-    # Pass 1: Fill days with headroom first
-    for day in sorted_days:
-        if assigned_count >= missing:
-            break
-        
-        # Check if we have room to add a shift without creating a deficit
-        # (unless the base allocation already exceeds availability, which we can't help)
-        if allocations[day] < available_per_day[day]:
-            allocations[day] += 1
-            assigned_count += 1
-            
-    # Pass 2: If we still have missing shifts (because all days are full?), force assign
-    # This ensures we burn the hours fund even if it causes a deficit (which is true understaffing)
-    if assigned_count < missing:
-        remaining_missing = missing - assigned_count
-        # We just loop again and force assign to the highest remainders that weren't picked?
-        # Or just simple round-robin on sorted_days
-        for i in range(remaining_missing):
-            day = sorted_days[i % num_days]
-            # We already incremented some in Pass 1, so we need to be careful not to double dip 
-            # if we iterate blindly. 
-            # Actually, simpler logic:
-            # We need to pick 'missing' indices from sorted_days.
-            # We prefer indices where allocations[day] < available.
-            # Let's re-sort or just pick intelligently.
-            pass
-            
-    # Refined Logic for Pass 2:
-    # Let's restart the distribution with a smarter list.
-    # We want to pick 'missing' number of days.
-    # Priority 1: High Remainder AND Headroom.
-    # Priority 2: High Remainder (Force).
-    
-    # Let's build a priority score: remainder + (10 if headroom else 0)
-    # This prioritizes headroom above all else, then remainder.
-    
-    priority_scores = []
-    for day in days_list:
-        score = remainders[day]
-        if allocations[day] < available_per_day[day]:
-            score += 10.0
-        priority_scores.append((day, score))
+    # Priority: headroom above all else, then remainder
+    priority_scores = [(day, remainders[day] + (10.0 if headroom[day] else 0.0)) for day in days_list]
         
     # Sort by score descending
     priority_scores.sort(key=lambda x: x[1], reverse=True)
     
-    # Reset allocations to base and apply top N
-    # Wait, we modified allocations in Pass 1 above. Let's revert/clean up logic.
-    # Re-calculating cleanly:
-    
-    current_total = 0
-    for day in range(1, num_days + 1):
-        allocations[day] = int(total_shifts * (day_weights[day] / total_weight))
-        current_total += allocations[day]
-        
-    missing = total_shifts - current_total
-    
     for i in range(missing):
         day = priority_scores[i][0]
         allocations[day] += 1
@@ -200,21 +189,70 @@ def calculate_monthly_staffing(employees, year, month, config, heavy_days):
     
     return allocations
 
-def generate_shift_templates(day, special_days, default_open=8.5, default_close=21.0):
-    # Define possible shifts for a given day
+# Template generation rules. Part of the template cache key, so a different rule set
+# never reuses tables built for another one.
+TemplateRules = namedtuple('TemplateRules', [
+    'open_durations',    # OPEN: start at open_time
+    'close_durations',   # CLOSE: end at close_time
+    'flex_durations',    # FLEX: start on the hour, end before close_time
+    'short_day_hours',   # days this short get a single FIXED shift
+    'ideal_flex_start',
+    'ideal_flex_end',
+])
+
+DEFAULT_TEMPLATE_RULES = TemplateRules(
+    open_durations=(6.0, 6.5, 7.0, 7.5, 8.0, 8.5, 9.0, 9.5, 10.0, 10.5),
+    close_durations=(6.0, 6.5, 7.0, 7.5, 8.0, 8.5, 9.0, 9.5, 10.0, 10.5, 11.0),
+    flex_durations=(6.0, 7.0, 8.0, 9.0, 10.0, 11.0),
+    short_day_hours=6.0,
+    ideal_flex_start=10.0,
+    ideal_flex_end=19.0,
+)
+
+# Bound on distinct (open_time, close_time, rules) tables kept in memory
+TEMPLATE_CACHE_SIZE = 64
+
+# Everything known about one calendar day before any variable is created.
+# 'templates' is the shared, immutable table for the day's opening hours;
+# 'pruned' lists the (template, reason) pairs a TemplatePruning removed from it.
+DayContext = namedtuple('DayContext', ['day', 'weekday', 'closed', 'open_time', 'close_time', 'templates', 'pruned'],
+                        defaults=((),))
+
+# Template pruning before variables are created.
+#   dominance:    without a demand curve the model only sees a template's kind, duration
+#                 and cost, so of several templates with the same type and duration only the
+#                 cheapest can be in an optimal schedule (e.g. FLEX 11-19 vs 10-18). Dropping
+#                 the rest is lossless. A demand curve (demand.py) also counts each template's
+#                 start and end, so get_solver_profile refuses pruning with one.
+#   cost_ceiling: drop templates costing more than this (lossy: solve_schedule falls back
+#                 to the full table if the reduced model is infeasible). The cheapest
+#                 template of each type is always kept.
+TemplatePruning = namedtuple('TemplatePruning', ['dominance', 'cost_ceiling'])
+
+# Template ids come from the shift itself, so the same shift (type, start, end, cost) gets
+# the same id whichever day or request it appears in, with no process-wide registry to grow:
+# a template lives exactly as long as the lru_cache'd tables that hold it.
+def get_template_id(t_type, start, end, cost):
+    return f"{t_type} {fmt_time(start)}-{fmt_time(end)} {cost}"
+
+def _make_template(t_type, start, end, duration, cost):
+    return MappingProxyType({
+        'id': get_template_id(t_type, start, end, cost),
+        'type': t_type, 'start': start, 'end': end, 'duration': duration, 'cost': cost
+    })
+
+def get_template_table(open_time, close_time, rules=DEFAULT_TEMPLATE_RULES):
+    """
+    Returns the read-only tuple of shift templates for a day open from open_time to close_time.
+    Memoized, so every day (and every request) with the same hours shares one table.
+    """
+    # Always pass all three arguments so the cache key does not depend on how we were called
+    return _build_template_table(float(open_time), float(close_time), rules)
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _build_template_table(open_time, close_time, rules):
     templates = []
     
-    # Determine open/close times for this specific day
-    open_time = default_open
-    close_time = default_close
-    
-    if str(day) in special_days:
-        sd = special_days[str(day)]
-        if 'close' in sd:
-            close_time = parse_time(sd['close'])
-        if 'open' in sd:
-            open_time = parse_time(sd['open'])
-            
     # Special Short Day Logic (Fairness)
     # If day is significantly shorter than normal, maybe use FIXED shifts?
     # For now, let's stick to generating OPEN/CLOSE/FLEX based on the actual open/close times.
@@ -223,19 +261,17 @@ def generate_shift_templates(day, special_days, default_open=8.5, default_close=
     day_length = close_time - open_time
     
     if day_length <= 0:
-        return [] # Should not happen if data is valid
+        return () # Should not happen if data is valid
 
     # If day is very short (e.g. < 6 hours), maybe just one shift type covering whole day?
-    if day_length <= 6.0:
-        templates.append({
-            'type': 'FIXED', 'start': open_time, 'end': close_time, 'duration': day_length, 'cost': 0
-        })
-        return templates
+    if day_length <= rules.short_day_hours:
+        templates.append(_make_template('FIXED', open_time, close_time, day_length, 0))
+        return tuple(templates)
 
     # Standard Shifts
     
     # Openers: Start at open_time. Lengths 6.0 to 10.5
-    for duration in [6.0, 6.5, 7.0, 7.5, 8.0, 8.5, 9.0, 9.5, 10.0, 10.5]:
+    for duration in rules.open_durations:
         end = open_time + duration
         if end <= close_time:
             # Gold Standard: ~9.5h
@@ -249,10 +285,10 @@ def generate_shift_templates(day, special_days, default_open=8.5, default_close=
             # If it ends at close_time, it's technically a closer too, but let's keep it as OPEN 
             # if it starts at open_time. Or maybe FIXED? 
             # Current logic: OPEN starts at open_time.
-            templates.append({'type': 'OPEN', 'start': open_time, 'end': end, 'duration': duration, 'cost': cost})
+            templates.append(_make_template('OPEN', open_time, end, duration, cost))
             
     # Closers: End at close_time. Lengths 6.0 to 11.0
-    for duration in [6.0, 6.5, 7.0, 7.5, 8.0, 8.5, 9.0, 9.5, 10.0, 10.5, 11.0]:
+    for duration in rules.close_durations:
         start = close_time - duration
         
         # Constraint: Closer usually starts after noon or late morning.
@@ -277,7 +313,7 @@ def generate_shift_templates(day, special_days, default_open=8.5, default_close=
              # We already added OPENs above. If an OPEN shift ends at close_time, it's fine to be called OPEN 
              # (it's the opener who stays till end). 
              # But here we generate specific CLOSE shifts.
-             templates.append({'type': 'CLOSE', 'start': start, 'end': close_time, 'duration': duration, 'cost': cost})
+             templates.append(_make_template('CLOSE', start, close_time, duration, cost))
                  
     # Flex: Start later than open, end before close
     # Start every 1 hour from open_time + 1.5h up to close_time - 6h
@@ -287,7 +323,7 @@ def generate_shift_templates(day, special_days, default_open=8.5, default_close=
     
     if start_hour_max >= start_hour_min:
         for start in range(start_hour_min, start_hour_max + 1):
-            for duration in [6.0, 7.0, 8.0, 9.0, 10.0, 11.0]:
+            for duration in rules.flex_durations:
                 end = start + duration
                 
                 # STRICT RULE: FLEX shift must NOT end at close_time.
@@ -301,298 +337,589 @@ def generate_shift_templates(day, special_days, default_open=8.5, default_close=
                     # Time Preference: Bias towards 10:00 - 19:00
                     # Penalty = weight * (abs(start - 10) + abs(end - 19))
                     # Let's use a weight of 5 per hour deviation
-                    ideal_start = 10.0
-                    ideal_end = 19.0
-                    
-                    dev_start = abs(start - ideal_start)
-                    dev_end = abs(end - ideal_end)
+                    dev_start = abs(start - rules.ideal_flex_start)
+                    dev_end = abs(end - rules.ideal_flex_end)
                     
                     time_penalty = 5 * (dev_start + dev_end)
                     
                     cost = base_cost + int(time_penalty)
                     
-                    templates.append({'type': 'FLEX', 'start': float(start), 'end': end, 'duration': duration, 'cost': cost})
+                    templates.append(_make_template('FLEX', float(start), end, duration, cost))
     
-    return templates
+    return tuple(templates)
 
-def solve_schedule(data_input):
-    if isinstance(data_input, str):
-        print("Loading data...")
-        data = load_data(data_input)
-    else:
-        data = data_input
+def get_pruned_template_table(open_time, close_time, rules=DEFAULT_TEMPLATE_RULES, pruning=None):
+    """
+    Returns (kept, pruned) for a day's template table: kept is the read-only tuple the
+    model uses, pruned the (template, reason) pairs removed by pruning (a TemplatePruning).
+    """
+    if pruning is None:
+        return get_template_table(open_time, close_time, rules), ()
+    return _prune_template_table(float(open_time), float(close_time), rules, pruning)
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _prune_template_table(open_time, close_time, rules, pruning):
+    templates = _build_template_table(open_time, close_time, rules)
+    pruned = []
+    
+    cheapest_type = {}
+    cheapest_shape = {}
+    for t in templates:
+        if t['type'] not in cheapest_type or t['cost'] < cheapest_type[t['type']]['cost']:
+            cheapest_type[t['type']] = t
+        shape = (t['type'], t['duration'])
+        if shape not in cheapest_shape or t['cost'] < cheapest_shape[shape]['cost']:
+            cheapest_shape[shape] = t
+    
+    kept = []
+    for t in templates:
+        if pruning.dominance and cheapest_shape[(t['type'], t['duration'])] is not t:
+            pruned.append((t, 'dominated'))
+        elif (pruning.cost_ceiling is not None and t['cost'] > pruning.cost_ceiling
+                and cheapest_type[t['type']] is not t):
+            pruned.append((t, 'cost_ceiling'))
+        else:
+            kept.append(t)
+    return tuple(kept), tuple(pruned)
+
+def get_template_pruning(profile):
+    """TemplatePruning from a solver profile, or None when pruning is off."""
+    if not profile.get("prune_dominated") and profile.get("template_cost_ceiling") is None:
+        return None
+    return TemplatePruning(bool(profile.get("prune_dominated")), profile.get("template_cost_ceiling"))
+
+def summarize_pruning(day_contexts, days):
+    """
+    Per-model pruning report: template counts over the modelled days before and after,
+    and each distinct dropped template with the reason it was dropped.
+    """
+    before = after = 0
+    dropped = {}
+    for day in days:
+        dc = day_contexts[day]
+        if dc.closed: continue
+        before += len(dc.templates) + len(dc.pruned)
+        after += len(dc.templates)
+        for t, reason in dc.pruned:
+            dropped.setdefault(t['id'], {
+                "type": t['type'], "start": fmt_time(t['start']), "end": fmt_time(t['end']),
+                "duration": t['duration'], "cost": t['cost'], "reason": reason
+            })
+    return {
+        "templates_before": before,
+        "templates_after": after,
+        "dropped": sorted(dropped.values(), key=lambda d: (d['type'], d['start'], d['duration']))
+    }
+
+def get_day_hours(day, special_days, default_open=8.5, default_close=21.0):
+    # Determine open/close times for this specific day
+    open_time = default_open
+    close_time = default_close
+    
+    if str(day) in special_days:
+        sd = special_days[str(day)]
+        if 'close' in sd:
+            close_time = parse_time(sd['close'])
+        if 'open' in sd:
+            open_time = parse_time(sd['open'])
+    
+    return open_time, close_time
 
-    # Ensure data is prepared (hours_fund calculated)
-    data = prepare_data(data)
+def generate_shift_templates(day, special_days, default_open=8.5, default_close=21.0):
+    # Define possible shifts for a given day
+    open_time, close_time = get_day_hours(day, special_days, default_open, default_close)
+    return list(get_template_table(open_time, close_time))
+
+def build_day_contexts(year, month, config, closed_holidays, special_days, rules=DEFAULT_TEMPLATE_RULES, pruning=None):
+    """
+    Resolves every day of the month to a DayContext (weekday, closed flag, hours and shared template table).
+    pruning (a TemplatePruning) trims each table before any variable sees it.
+    """
+    default_open = parse_time(config.get('default_open_time', '08:30'))
+    default_close = parse_time(config.get('default_close_time', '21:00'))
+    _, num_days = calendar.monthrange(year, month)
+    
+    contexts = {}
+    for day in range(1, num_days + 1):
+        weekday = calendar.weekday(year, month, day)
+        
+        # Check for special day type
+        day_type = 'normal'
+        if str(day) in special_days:
+            day_type = special_days[str(day)].get('type', 'normal')
+        
+        # Fully closed holidays have no shifts at all
+        # (listed in closed_holidays usually, but check the type too)
+        if day in closed_holidays or day_type == 'holiday_closed':
+            contexts[day] = DayContext(day, weekday, True, None, None, ())
+            continue
+        
+        open_time, close_time = get_day_hours(day, special_days, default_open, default_close)
+        templates, pruned = get_pruned_template_table(open_time, close_time, rules, pruning)
+        contexts[day] = DayContext(day, weekday, False, open_time, close_time, templates, pruned)
+    
+    return contexts
+
+# FIXED shifts cover the whole (short) day, so they count as both an opener and a closer.
+TEMPLATE_KINDS = {
+    'OPEN': ('OPEN',),
+    'CLOSE': ('CLOSE',),
+    'FIXED': ('OPEN', 'CLOSE'),
+    'FLEX': ('FLEX',),
+}
 
+def build_work_index(work, day_templates):
+    """
+    Groups the work variables once so every constraint family reads its own slice
+    instead of re-probing (i, day, s_idx) in work and re-comparing template types.
+
+    Keys:
+      emp_day      (i, day)        -> [var]
+      day          day             -> [var]
+      day_kind     (day, kind)     -> [var]   kind in OPEN / CLOSE / FLEX
+      emp_kind     (i, kind)       -> [var]
+      emp_day_kind (i, day, kind)  -> [var]
+      day_template (day, s_idx)    -> [var]
+      emp_hours    i               -> [(var, duration * 10)]
+      costs                        -> [(var, cost)] for templates with a positive cost
+    """
+    index = {
+        'emp_day': defaultdict(list),
+        'day': defaultdict(list),
+        'day_kind': defaultdict(list),
+        'emp_kind': defaultdict(list),
+        'emp_day_kind': defaultdict(list),
+        'day_template': defaultdict(list),
+        'emp_hours': defaultdict(list),
+        'costs': [],
+    }
+    emp_day = index['emp_day']
+    day_vars = index['day']
+    day_kind = index['day_kind']
+    emp_kind = index['emp_kind']
+    emp_day_kind = index['emp_day_kind']
+    day_template = index['day_template']
+    emp_hours = index['emp_hours']
+    costs = index['costs']
+    
+    # Template attributes are resolved once per day, not once per variable
+    day_info = {}
+    for day, templates in day_templates.items():
+        day_info[day] = [
+            (TEMPLATE_KINDS[t['type']], int(t['duration'] * 10), t.get('cost', 0))
+            for t in templates
+        ]
+    
+    for (i, day, s_idx), var in work.items():
+        kinds, duration_int, cost = day_info[day][s_idx]
+        emp_day[(i, day)].append(var)
+        day_vars[day].append(var)
+        day_template[(day, s_idx)].append(var)
+        for kind in kinds:
+            day_kind[(day, kind)].append(var)
+            emp_kind[(i, kind)].append(var)
+            emp_day_kind[(i, day, kind)].append(var)
+        emp_hours[i].append((var, duration_int))
+        if cost > 0:
+            costs.append((var, cost))
+    
+    return index
+
+def resolve_day_staffing(day, available_count, staff_reqs, special_days, config):
+    """
+    Staff needed on a day and its open / close / middle split.
+    available_count is how many employees can work that day (a column sum of availability_matrix).
+    Returns a dict with req_staff (capped at who is available), understaffed
+    ({needed, available, deficit} or None), min_openers, min_closers and the three targets.
+    """
+    req_staff = staff_reqs.get(day, 2)
+    if str(day) in special_days:
+        req_staff = special_days[str(day)].get('staff', req_staff)
+        
+    # Cap at available employees (to avoid infeasibility)
+    available_count = int(available_count)
+    
+    understaffed = None
+    if req_staff > available_count:
+        deficit = req_staff - available_count
+        understaffed = {
+            "needed": req_staff,
+            "available": available_count,
+            "deficit": deficit
+        }
+        req_staff = available_count
+        
+    # Day Shape Targets (Proportional)
+    open_ratio = config.get('open_ratio', 0.4)
+    close_ratio = config.get('close_ratio', 0.4)
+    min_openers = config.get('min_openers', 1)
+    min_closers = config.get('min_closers', 1)
+    
+    # Safety: Ensure min constraints don't exceed total staff
+    if min_openers > req_staff: min_openers = req_staff
+    if min_closers > req_staff: min_closers = req_staff
+    
+    target_open = max(min_openers, int(round(req_staff * open_ratio)))
+    target_close = max(min_closers, int(round(req_staff * close_ratio)))
+    target_middle = req_staff - target_open - target_close
+    
+    # Overflow handling if middle < 0
+    if target_middle < 0:
+        overflow = -target_middle
+        
+        # Reduce closes first, but not below min
+        reducible_close = max(0, target_close - min_closers)
+        reduce_c = min(overflow, reducible_close)
+        target_close -= reduce_c
+        overflow -= reduce_c
+        
+        if overflow > 0:
+            # Reduce opens next
+            reducible_open = max(0, target_open - min_openers)
+            reduce_o = min(overflow, reducible_open)
+            target_open -= reduce_o
+            overflow -= reduce_o
+            
+        target_middle = req_staff - target_open - target_close
+        if target_middle < 0:
+            target_middle = 0
+    
+    return {
+        "req_staff": req_staff,
+        "understaffed": understaffed,
+        "min_openers": min_openers,
+        "min_closers": min_closers,
+        "target_open": target_open,
+        "target_close": target_close,
+        "target_middle": target_middle,
+    }
+
+def add_deviation(model, expr, low, high, name):
+    """
+    |expr| for an expression known to lie in [low, high], as one variable bounded by
+    the larger end and two inequalities (enough when the deviation is only minimised).
+    """
+    dev = model.NewIntVar(0, max(abs(low), abs(high)), name)
+    model.Add(dev >= expr)
+    model.Add(dev >= -expr)
+    return dev
+
+def add_day_staffing(model, day, staffing, day_shifts, openers, closers, middles, management_vars=None):
+    """
+    Adds a day's staffing constraints over any linear terms (per-employee BoolVars or
+    per-class counters): exact headcount, a manager when management_vars is given,
+    minimum openers / closers, and the soft day shape.
+    Returns the [open, close, middle] deviation variables for the objective.
+    """
+    req_staff = staffing['req_staff']
+    target_open = staffing['target_open']
+    target_close = staffing['target_close']
+    target_middle = staffing['target_middle']
+    
+    # Total Staff
+    model.Add(sum(day_shifts) == req_staff)
+    
+    if management_vars:
+        model.Add(sum(management_vars) >= 1)
+    
+    # Min Openers/Closers (Hard Constraint)
+    model.Add(sum(openers) >= staffing['min_openers'])
+    model.Add(sum(closers) >= staffing['min_closers'])
+    
+    # Day Shape Soft Constraints
+    o_day = model.NewIntVar(0, req_staff, f'openers_day_{day}')
+    c_day = model.NewIntVar(0, req_staff, f'closers_day_{day}')
+    m_day = model.NewIntVar(0, req_staff, f'middles_day_{day}')
+    
+    model.Add(o_day == sum(openers))
+    model.Add(c_day == sum(closers))
+    # Middle count is remainder (to handle Fixed shifts correctly if they are neither open nor close in some future logic, 
+    # though currently Fixed are both. But for day shape, we want the structural middle).
+    # Actually, user requested: m_day = req_staff - o_day - c_day
+    # But wait, Fixed shifts are added to BOTH openers and closers lists above.
+    # So o_day + c_day > req_staff if there are fixed shifts.
+    # Let's stick to the user's request: "m_day = model.NewIntVar... model.Add(m_day == req_staff - o_day - c_day)"
+    # BUT if Fixed shifts are counted as both, then o+c > req.
+    # Let's use the explicit 'middles' list (FLEX shifts) which I collected above.
+    # This is safer and semantically cleaner.
+    model.Add(m_day == sum(middles))
+    
+    # Open deviation
+    o_dev = model.NewIntVar(0, req_staff, f'o_dev_{day}')
+    # model.Add(o_dev >= o_day - target_open)
+    # model.Add(o_dev >= target_open - o_day)
+    # Using AddAbsEquality is cleaner if we have a diff var, but user suggested >= style.
+    # Let's use the >= style for direct deviation.
+    model.Add(o_dev >= o_day - target_open)
+    model.Add(o_dev >= target_open - o_day)
+    
+    # Close deviation
+    c_dev = model.NewIntVar(0, req_staff, f'c_dev_{day}')
+    model.Add(c_dev >= c_day - target_close)
+    model.Add(c_dev >= target_close - c_day)
+    
+    # Middle deviation
+    m_dev = model.NewIntVar(0, req_staff, f'm_dev_{day}')
+    model.Add(m_dev >= m_day - target_middle)
+    model.Add(m_dev >= target_middle - m_day)
+    
+    return [o_dev, c_dev, m_dev]
+
+# Objective weight per unit of each term (data['weights'] overrides any of them;
+# the demand coverage weight defaults to demand.DEFAULT_COVERAGE_WEIGHT)
+DEFAULT_WEIGHTS = MappingProxyType({
+    "work_hours": 1000,
+    "day_shape": 80,
+    "shift_cost": 5,
+    "open_close_fairness": 3,
+    "clopen": 15,
+})
+
+def objective_weights(weights=None):
+    """The objective weights for a request: the defaults, with whatever weights sets on top."""
+    resolved = dict(DEFAULT_WEIGHTS, coverage=_sibling('demand').DEFAULT_COVERAGE_WEIGHT)
+    resolved.update(weights or {})
+    return resolved
+
+def build_problem(data, days=None, staff_reqs=None, pruning=None, timer=None):
+    """
+    Everything about a scheduling request that does not depend on the solver:
+    day contexts and templates, who is available when, each day's staffing, managers
+    and paid hours. build_model turns it into a CP-SAT model; the greedy builder and
+    the local search engine work on it directly.
+    timer (a telemetry.PhaseTimer) collects the time spent on each step.
+    """
+    timer = timer or telemetry.PhaseTimer()
     employees = data['employees']
     year = data.get('year', 2025)
     month = data.get('month', 12)
     _, num_days = calendar.monthrange(year, month)
+    days = list(range(1, num_days + 1)) if days is None else sorted(days)
     
     config = data.get('config', {})
     closed_holidays = data.get('closed_holidays', [])
     special_days = data.get('special_days', {})
     heavy_days = data.get('heavy_days', {})
-    weights = data.get('weights', {})
     
-    print("Building model...")
+    # Day contexts share one cached template table per distinct opening hours
+    day_contexts = build_day_contexts(year, month, config, closed_holidays, special_days, pruning=pruning)
+    day_templates = {day: dc.templates for day, dc in day_contexts.items()}
+        
+    log.info("templates_generated", max_per_day=max((len(t) for t in day_templates.values() if t), default=0))
+    pruning_summary = summarize_pruning(day_contexts, days) if pruning is not None else None
+    if pruning_summary:
+        log.info("templates_pruned", before=pruning_summary['templates_before'],
+                 after=pruning_summary['templates_after'], dropped=len(pruning_summary['dropped']))
+    timer.lap("template_generation")
+    
+    # Who can work when (employees x days), and the (i, day) pairs that are also open modelled days
+    availability = availability_matrix(employees, num_days)
+    schedulable = np.zeros_like(availability)
+    open_days = [day for day in days if not day_contexts[day].closed]
+    schedulable[:, open_days] = availability[:, open_days]
+    available_per_day = availability.sum(axis=0)
+    available = set(zip(*(axis.tolist() for axis in np.nonzero(schedulable))))
+    timer.lap("availability")
+    
+    # Required staff per half-hour slot, for the days with a demand curve (see demand.py)
+    demand = _sibling('demand').day_demand(data.get('demand'), day_contexts, days) if data.get('demand') else {}
+    
+    # Pre-calculate staffing for the whole month
+    if staff_reqs is None:
+        staff_reqs = calculate_monthly_staffing(employees, year, month, config, heavy_days, availability)
+    
+    staffing = {}
+    understaff_info = {} # day -> {needed, available, deficit}
+    for day in open_days:
+        staffing[day] = resolve_day_staffing(day, available_per_day[day], staff_reqs, special_days, config)
+        if staffing[day]['understaffed']:
+            understaff_info[day] = staffing[day]['understaffed']
+    
+    # Manager roles
+    manager_roles = config.get('manager_roles', ["manager", "deputy", "supervisor"])
+    manager_ids = [i for i, emp in enumerate(employees) if emp.get('role') in manager_roles]
+    
+    paid_hours = {}
+    for i, emp in enumerate(employees):
+        paid_hours[i], _, _ = get_paid_hours(emp, closed_holidays, special_days)
+    timer.lap("staffing_allocation")
+    
+    return {
+        "employees": employees,
+        "num_days": num_days,
+        "days": days,
+        "config": config,
+        "closed_holidays": closed_holidays,
+        "special_days": special_days,
+        "weights": objective_weights(data.get('weights')),
+        "day_contexts": day_contexts,
+        "day_templates": day_templates,
+        "availability": availability,
+        "schedulable": schedulable,
+        "available": available,
+        "staffing": staffing,
+        "understaff_info": understaff_info,
+        "demand": demand,
+        "manager_ids": manager_ids,
+        "paid_hours": paid_hours,
+        "pruning": pruning_summary,
+    }
+
+def build_model(data, days=None, carry_in=None, staff_reqs=None, compact=False, pruning=None, timer=None):
+    """
+    Builds the CP-SAT model for a prepared data dict.
+    Returns a context dict with the model, the work variables, the day templates and
+    everything solve_schedule needs to turn a solver response back into a result.
+    
+    days restricts the model to a consecutive run of days (default: the whole month).
+    carry_in fixes what happened before the first modelled day, per employee index:
+      worked_before  {day: bool} for the days just before the window (4-in-5 rule)
+      closed_before  True if the employee closed the day before the window (clopen)
+      hours_target   worked hours to aim for inside the window (replaces fund - paid)
+      open_target    opens (and closes) to aim for inside the window
+    staff_reqs reuses a calculate_monthly_staffing allocation instead of computing one.
+    compact selects the lean encoding: the same optimal schedules with fewer auxiliary
+    variables (one worked literal per employee-day doubling as the one-shift rule, clopen
+    as a single linear implication, deviations as two inequalities on tightly bounded vars).
+    pruning (a TemplatePruning) drops shift templates before variables are created.
+    timer (a telemetry.PhaseTimer) collects the time spent on each phase and constraint group.
+    """
+    timer = timer or telemetry.PhaseTimer()
+    timer.mark()
+    problem = build_problem(data, days=days, staff_reqs=staff_reqs, pruning=pruning, timer=timer)
+    employees = problem['employees']
+    num_days = problem['num_days']
+    days = problem['days']
+    carry_in = carry_in or {}
+    
+    config = problem['config']
+    closed_holidays = problem['closed_holidays']
+    weights = problem['weights']
+    day_contexts = problem['day_contexts']
+    day_templates = problem['day_templates']
+    schedulable = problem['schedulable']
+    
     model = cp_model.CpModel()
     
     # Variables
     # work[emp, day, shift_idx] -> Bool
     work = {}
     
-    # Pre-calculate templates for each day
-    day_templates = {}
-    
-    default_open_str = config.get('default_open_time', '08:30')
-    default_close_str = config.get('default_close_time', '21:00')
-    default_open = parse_time(default_open_str)
-    default_close = parse_time(default_close_str)
-    
-    for day in range(1, num_days + 1):
-        # Skip fully closed holidays
-        if day in closed_holidays:
-            day_templates[day] = []
-            continue
-            
-        # Check for special day type
-        day_type = 'normal'
-        if str(day) in special_days:
-            day_type = special_days[str(day)].get('type', 'normal')
-            
-        # If it's a closed holiday (handled by closed_holidays list usually, but check type too)
-        if day_type == 'holiday_closed':
-            day_templates[day] = []
-            continue
-            
-        day_templates[day] = generate_shift_templates(day, special_days, default_open, default_close)
-        
-    print(f"Generated templates. Max templates per day: {max(len(t) for t in day_templates.values() if t)}")
-    
     # Create variables
     for i, emp in enumerate(employees):
-        for day in range(1, num_days + 1):
-            if day in closed_holidays: continue
-            
-            # Check availability
-            if day in emp.get('unavailable_days', []) or day in emp.get('vacation_days', []):
-                continue
+        for day in days:
+            if not schedulable[i, day]: continue
                 
             for s_idx, template in enumerate(day_templates[day]):
                 work[(i, day, s_idx)] = model.NewBoolVar(f'work_{i}_{day}_{s_idx}')
+    # Created back to back, so the literals' variable ids are one contiguous range (see read_assignment)
+    first_id = next(iter(work.values())).Index() if work else 0
+    work_ids = np.arange(first_id, first_id + len(work), dtype=np.int64)
                 
-    print(f"Created {len(work)} variables.")
+    # Every constraint group below reads from this index
+    index = build_work_index(work, day_templates)
+    emp_day_vars = index['emp_day']
+    day_kind_vars = index['day_kind']
+    timer.lap("variable_creation")
     
     # Constraints
     
     # 1. Max one shift per day per employee
-    for i in range(len(employees)):
-        for day in range(1, num_days + 1):
-            if day in closed_holidays: continue
-            
-            shifts = []
-            for s_idx in range(len(day_templates[day])):
-                if (i, day, s_idx) in work:
-                    shifts.append(work[(i, day, s_idx)])
-            
-            if shifts:
-                model.Add(sum(shifts) <= 1)
+    worked_days = {} # (i, day) -> BoolVar
+    if compact:
+        # Exactly one of: a shift, or the day off. The worked literal is reused by the 4-in-5 rule.
+        for (i, day), shifts in emp_day_vars.items():
+            wd = model.NewBoolVar(f'worked_{i}_{day}')
+            model.AddExactlyOne(shifts + [wd.Not()])
+            worked_days[(i, day)] = wd
+    else:
+        for shifts in emp_day_vars.values():
+            model.Add(sum(shifts) <= 1)
+    timer.lap("constraints.one_shift_per_day")
                 
     # 2. Daily Staffing Requirements
     day_shape_vars = []
-    understaff_info = {} # day -> {needed, available, deficit}
-    
-    # Pre-calculate staffing for the whole month
-    monthly_staff_reqs = calculate_monthly_staffing(employees, year, month, config, heavy_days)
+    manager_ids = problem['manager_ids']
     
-    # Manager roles
-    manager_roles = config.get('manager_roles', ["manager", "deputy", "supervisor"])
-    manager_ids = [i for i, emp in enumerate(employees) if emp.get('role') in manager_roles]
-    
-    for day in range(1, num_days + 1):
-        if day in closed_holidays: continue
-        
-        req_staff = monthly_staff_reqs.get(day, 2)
-        if str(day) in special_days:
-            req_staff = special_days[str(day)].get('staff', req_staff)
-            
-        # Cap at available employees (to avoid infeasibility)
-        available_count = 0
-        for i, emp in enumerate(employees):
-             if day not in emp.get('unavailable_days', []) and day not in emp.get('vacation_days', []):
-                 available_count += 1
-        
-        if req_staff > available_count:
-            deficit = req_staff - available_count
-            understaff_info[day] = {
-                "needed": req_staff,
-                "available": available_count,
-                "deficit": deficit
-            }
-            req_staff = available_count
-            
-        # Day Shape Targets (Proportional)
-        open_ratio = config.get('open_ratio', 0.4)
-        close_ratio = config.get('close_ratio', 0.4)
-        min_openers = config.get('min_openers', 1)
-        min_closers = config.get('min_closers', 1)
-        
-        # Safety: Ensure min constraints don't exceed total staff
-        if min_openers > req_staff: min_openers = req_staff
-        if min_closers > req_staff: min_closers = req_staff
-        
-        target_open = max(min_openers, int(round(req_staff * open_ratio)))
-        target_close = max(min_closers, int(round(req_staff * close_ratio)))
-        target_middle = req_staff - target_open - target_close
+    for day in days:
+        if day_contexts[day].closed: continue
         
-        # Overflow handling if middle < 0
-        if target_middle < 0:
-            overflow = -target_middle
-            
-            # Reduce closes first, but not below min
-            reducible_close = max(0, target_close - min_closers)
-            reduce_c = min(overflow, reducible_close)
-            target_close -= reduce_c
-            overflow -= reduce_c
-            
-            if overflow > 0:
-                # Reduce opens next
-                reducible_open = max(0, target_open - min_openers)
-                reduce_o = min(overflow, reducible_open)
-                target_open -= reduce_o
-                overflow -= reduce_o
-                
-            target_middle = req_staff - target_open - target_close
-            if target_middle < 0:
-                target_middle = 0
-                
-        # Total Staff
-        day_shifts = []
-        openers = []
-        closers = []
-        middles = [] # Track middles for day shape
-        
-        for i in range(len(employees)):
-            for s_idx, template in enumerate(day_templates[day]):
-                if (i, day, s_idx) in work:
-                    var = work[(i, day, s_idx)]
-                    day_shifts.append(var)
-                    if template['type'] == 'OPEN' or template['type'] == 'FIXED': 
-                        openers.append(var)
-                    if template['type'] == 'CLOSE' or template['type'] == 'FIXED':
-                        closers.append(var)
-                    if template['type'] == 'FLEX':
-                        middles.append(var)
-                        
-        model.Add(sum(day_shifts) == req_staff)
+        staffing = problem['staffing'][day]
         
         # Manager on Mondays
-        weekday = calendar.weekday(year, month, day)
-        if weekday == 0: # Monday
+        management_vars = None
+        if day_contexts[day].weekday == 0: # Monday
             management_vars = []
             for i in manager_ids:
-                for s_idx, template in enumerate(day_templates[day]):
-                    if (i, day, s_idx) in work:
-                        management_vars.append(work[(i, day, s_idx)])
-            
-            if management_vars:
-                model.Add(sum(management_vars) >= 1)
-        
-        # Min Openers/Closers (Hard Constraint)
-        model.Add(sum(openers) >= min_openers)
-        model.Add(sum(closers) >= min_closers)
-        
-        # Day Shape Soft Constraints
-        o_day = model.NewIntVar(0, req_staff, f'openers_day_{day}')
-        c_day = model.NewIntVar(0, req_staff, f'closers_day_{day}')
-        m_day = model.NewIntVar(0, req_staff, f'middles_day_{day}')
-        
-        model.Add(o_day == sum(openers))
-        model.Add(c_day == sum(closers))
-        # Middle count is remainder (to handle Fixed shifts correctly if they are neither open nor close in some future logic, 
-        # though currently Fixed are both. But for day shape, we want the structural middle).
-        # Actually, user requested: m_day = req_staff - o_day - c_day
-        # But wait, Fixed shifts are added to BOTH openers and closers lists above.
-        # So o_day + c_day > req_staff if there are fixed shifts.
-        # Let's stick to the user's request: "m_day = model.NewIntVar... model.Add(m_day == req_staff - o_day - c_day)"
-        # BUT if Fixed shifts are counted as both, then o+c > req.
-        # Let's use the explicit 'middles' list (FLEX shifts) which I collected above.
-        # This is safer and semantically cleaner.
-        model.Add(m_day == sum(middles))
-        
-        # Open deviation
-        o_dev = model.NewIntVar(0, req_staff, f'o_dev_{day}')
-        # model.Add(o_dev >= o_day - target_open)
-        # model.Add(o_dev >= target_open - o_day)
-        # Using AddAbsEquality is cleaner if we have a diff var, but user suggested >= style.
-        # Let's use the >= style for direct deviation.
-        model.Add(o_dev >= o_day - target_open)
-        model.Add(o_dev >= target_open - o_day)
-        
-        # Close deviation
-        c_dev = model.NewIntVar(0, req_staff, f'c_dev_{day}')
-        model.Add(c_dev >= c_day - target_close)
-        model.Add(c_dev >= target_close - c_day)
-        
-        # Middle deviation
-        m_dev = model.NewIntVar(0, req_staff, f'm_dev_{day}')
-        model.Add(m_dev >= m_day - target_middle)
-        model.Add(m_dev >= target_middle - m_day)
-        
-        day_shape_vars.extend([o_dev, c_dev, m_dev])
+                management_vars.extend(emp_day_vars.get((i, day), []))
+        
+        day_shape_vars.extend(add_day_staffing(
+            model, day, staffing,
+            index['day'].get(day, []),
+            day_kind_vars.get((day, 'OPEN'), []),
+            day_kind_vars.get((day, 'CLOSE'), []),
+            day_kind_vars.get((day, 'FLEX'), []), # Track middles for day shape
+            management_vars
+        ))
+    timer.lap("constraints.daily_staffing")
+    
+    # 2b. Half-hour coverage of the demand curve (soft: shortfall is penalised)
+    coverage_vars = []
+    if problem['demand']:
+        coverage_vars = _sibling('demand').add_coverage(model, index['day_template'], day_templates, problem['demand'])
+        timer.lap("constraints.coverage")
         
     # 3. Consecutive Days (Max 4)
     # Optimization: Create worked_day variables once
-    worked_days = {} # (i, day) -> BoolVar
-    
-    for i in range(len(employees)):
-        for day in range(1, num_days + 1):
-            if day in closed_holidays:
-                continue
-                
-            day_vars = []
-            for s_idx in range(len(day_templates[day])):
-                if (i, day, s_idx) in work:
-                    day_vars.append(work[(i, day, s_idx)])
-            
-            if day_vars:
-                wd = model.NewBoolVar(f'worked_{i}_{day}')
-                model.Add(sum(day_vars) == wd)
-                worked_days[(i, day)] = wd
+    if not compact:
+        for (i, day), day_vars in emp_day_vars.items():
+            wd = model.NewBoolVar(f'worked_{i}_{day}')
+            model.Add(sum(day_vars) == wd)
+            worked_days[(i, day)] = wd
 
+    # Windows may reach back before the first modelled day; those days are fixed by carry_in
     for i in range(len(employees)):
-        for day in range(1, num_days - 3): 
+        worked_before = carry_in.get(i, {}).get('worked_before', {})
+        for day in range(days[0] - 4, days[-1] - 3): 
             window_vars = []
+            fixed_worked = 0
             for d in range(day, day + 5):
                 if (i, d) in worked_days:
                     window_vars.append(worked_days[(i, d)])
+                elif worked_before.get(d):
+                    fixed_worked += 1
             
-            if len(window_vars) == 5:
-                model.Add(sum(window_vars) <= 4)
+            if window_vars and len(window_vars) + fixed_worked == 5:
+                model.Add(sum(window_vars) <= 4 - fixed_worked)
+    timer.lap("constraints.consecutive_days")
                 
     # 4. Soft Clopen Ban
     clopen_vars = []
     if config.get('enable_clopen_ban', True):
+        emp_day_kind_vars = index['emp_day_kind']
         for i in range(len(employees)):
-            for day in range(1, num_days):
-                if day in closed_holidays or (day+1) in closed_holidays:
-                    continue
-                    
-                close_vars = []
-                for s_idx, t in enumerate(day_templates[day]):
-                    if t['type'] in ('CLOSE', 'FIXED'):
-                        if (i, day, s_idx) in work:
-                            close_vars.append(work[(i, day, s_idx)])
-                            
-                open_vars_next = []
-                for s_idx, t in enumerate(day_templates.get(day+1, [])):
-                    if t['type'] in ('OPEN', 'FIXED'):
-                        if (i, day+1, s_idx) in work:
-                            open_vars_next.append(work[(i, day+1, s_idx)])
+            closed_before = carry_in.get(i, {}).get('closed_before', False)
+            for day in range(days[0] - 1, days[-1]):
+                close_vars = emp_day_kind_vars.get((i, day, 'CLOSE'))
+                open_vars_next = emp_day_kind_vars.get((i, day + 1, 'OPEN'))
+                
+                if day < days[0] and closed_before and open_vars_next:
+                    # Closed the day before the window: opening on its first day is a clopen
+                    clopen = model.NewBoolVar(f'clopen_{i}_{day}')
+                    if compact:
+                        model.Add(clopen >= sum(open_vars_next))
+                    else:
+                        model.AddMaxEquality(clopen, open_vars_next)
+                    clopen_vars.append(clopen)
+                
+                elif close_vars and open_vars_next and compact:
+                    # At most one shift a day, so each sum is 0/1: close and open next => clopen
+                    # (clopen is only penalised, so the lower bound is enough)
+                    clopen = model.NewBoolVar(f'clopen_{i}_{day}')
+                    model.Add(clopen >= sum(close_vars) + sum(open_vars_next) - 1)
+                    clopen_vars.append(clopen)
                             
-                if close_vars and open_vars_next:
+                elif close_vars and open_vars_next:
                     has_close = model.NewBoolVar(f'has_close_{i}_{day}')
                     model.AddMaxEquality(has_close, close_vars)
                     
@@ -604,24 +931,32 @@ def solve_schedule(data_input):
                     model.AddBoolOr([has_close.Not(), has_open_next.Not(), clopen])
                     
                     clopen_vars.append(clopen)
+    timer.lap("constraints.clopen")
 
     # Fairness
     fairness_vars = []
     open_counts = []
     close_counts = []
+    emp_kind_vars = index['emp_kind']
+    
+    # Days each employee can work, the most that any count or hours term can reach
+    workable_days = defaultdict(list)
+    for (i, day) in emp_day_vars:
+        workable_days[i].append(day)
     
     for i, emp in enumerate(employees):
-        emp_opens = []
-        emp_closes = []
-        for day in range(1, num_days + 1):
-            if day in closed_holidays: continue
-            for s_idx, template in enumerate(day_templates[day]):
-                if (i, day, s_idx) in work:
-                    var = work[(i, day, s_idx)]
-                    if template['type'] == 'OPEN' or template['type'] == 'FIXED':
-                        emp_opens.append(var)
-                    if template['type'] == 'CLOSE' or template['type'] == 'FIXED':
-                        emp_closes.append(var)
+        emp_opens = emp_kind_vars.get((i, 'OPEN'), [])
+        emp_closes = emp_kind_vars.get((i, 'CLOSE'), [])
+        
+        if compact:
+            n = len(workable_days[i])
+            target_ops = carry_in.get(i, {}).get('open_target', int(round(emp['hours_fund'] / 9.5 / 2)))
+            o_count = sum(emp_opens)
+            c_count = sum(emp_closes)
+            fairness_vars.append(add_deviation(model, o_count - c_count, -n, n, f'abs_diff_oc_{i}'))
+            fairness_vars.append(add_deviation(model, o_count - target_ops, -target_ops, n - target_ops, f'abs_diff_o_t_{i}'))
+            fairness_vars.append(add_deviation(model, c_count - target_ops, -target_ops, n - target_ops, f'abs_diff_c_t_{i}'))
+            continue
                         
         o_count = model.NewIntVar(0, num_days, f'open_count_{i}')
         c_count = model.NewIntVar(0, num_days, f'close_count_{i}')
@@ -641,6 +976,7 @@ def solve_schedule(data_input):
         fund = emp['hours_fund']
         target_shifts = fund / 9.5
         target_ops = int(round(target_shifts / 2))
+        target_ops = carry_in.get(i, {}).get('open_target', target_ops)
         
         diff_o_t = model.NewIntVar(-num_days, num_days, f'diff_o_t_{i}')
         abs_diff_o_t = model.NewIntVar(0, num_days, f'abs_diff_o_t_{i}')
@@ -653,26 +989,23 @@ def solve_schedule(data_input):
         model.Add(diff_c_t == c_count - target_ops)
         model.AddAbsEquality(abs_diff_c_t, diff_c_t)
         fairness_vars.append(abs_diff_c_t)
+    timer.lap("constraints.fairness")
 
     # Objective
-    paid_hours = {}
-    targets = {}
-    for i, emp in enumerate(employees):
-        ph, _, _ = get_paid_hours(emp, closed_holidays, special_days)
-        paid_hours[i] = ph
-        targets[i] = emp['hours_fund']
+    paid_hours = problem['paid_hours']
+    targets = {i: emp['hours_fund'] for i, emp in enumerate(employees)}
         
     obj_vars = []
+    emp_hours = index['emp_hours']
+    longest_shift = {day: max((int(t['duration'] * 10) for t in templates), default=0)
+                     for day, templates in day_templates.items()}
     for i in range(len(employees)):
-        worked_terms = []
-        for day in range(1, num_days + 1):
-            if day in closed_holidays: continue
-            for s_idx, template in enumerate(day_templates[day]):
-                if (i, day, s_idx) in work:
-                    duration_int = int(template['duration'] * 10)
-                    worked_terms.append(work[(i, day, s_idx)] * duration_int)
-        total_worked = sum(worked_terms)
-        target_int = int((targets[i] - paid_hours[i]) * 10)
+        total_worked = sum(var * duration_int for var, duration_int in emp_hours.get(i, []))
+        target_int = int(carry_in.get(i, {}).get('hours_target', targets[i] - paid_hours[i]) * 10)
+        if compact:
+            most_hours = sum(longest_shift[day] for day in workable_days[i])
+            obj_vars.append(add_deviation(model, total_worked - target_int, -target_int, most_hours - target_int, f'abs_diff_{i}'))
+            continue
         diff = model.NewIntVar(-10000, 10000, f'diff_{i}')
         abs_diff = model.NewIntVar(0, 10000, f'abs_diff_{i}')
         model.Add(diff == total_worked - target_int)
@@ -680,44 +1013,727 @@ def solve_schedule(data_input):
         model.Add(abs_diff >= -diff)
         obj_vars.append(abs_diff)
         
-    cost_vars = []
-    for day in range(1, num_days + 1):
-        if day in closed_holidays: continue
-        for i in range(len(employees)):
-            for s_idx, template in enumerate(day_templates[day]):
-                if (i, day, s_idx) in work:
-                    cost = template.get('cost', 0)
-                    if cost > 0:
-                        cost_vars.append(work[(i, day, s_idx)] * cost)
+    cost_vars = [var * cost for var, cost in index['costs']]
                         
-    # Weighting
-    w_hours = weights.get('work_hours', 1000)
-    w_shape = weights.get('day_shape', 80)
-    w_cost = weights.get('shift_cost', 5)
-    w_fair = weights.get('open_close_fairness', 3) # Was 5
-    w_clopen = weights.get('clopen', 15)
-    
-    model.Minimize(
-        sum(obj_vars) * w_hours + 
-        sum(cost_vars) * w_cost + 
-        sum(day_shape_vars) * w_shape + 
-        sum(fairness_vars) * w_fair +
-        sum(clopen_vars) * w_clopen
+    # Weighting (build_problem resolved the defaults, see objective_weights)
+    objective = (
+        sum(obj_vars) * weights['work_hours'] + 
+        sum(cost_vars) * weights['shift_cost'] + 
+        sum(day_shape_vars) * weights['day_shape'] + 
+        sum(fairness_vars) * weights['open_close_fairness'] +
+        sum(clopen_vars) * weights['clopen']
     )
+    if coverage_vars:
+        objective += sum(coverage_vars) * weights['coverage']
+    model.Minimize(objective)
+    
+    # The model on top of everything build_problem worked out. The unweighted terms are kept
+    # in priority order for the staged objective (see staged.py).
+    objective_terms = [
+        ("work_hours", obj_vars),
+        ("day_shape", day_shape_vars),
+        ("coverage", coverage_vars),
+        ("shift_cost", cost_vars),
+        ("open_close_fairness", fairness_vars),
+        ("clopen", clopen_vars),
+    ]
+    objective_terms = [(name, sum(terms)) for name, terms in objective_terms if terms]
+    timer.lap("objective")
+    log.info("model_built", work_variables=len(work), compact=compact)
+    return dict(problem, model=model, work=work, work_ids=work_ids, index=index, objective=objective,
+                objective_terms=objective_terms)
+
+# Solver profile: per-request CP-SAT settings. Anything not given falls back to these.
+DEFAULT_NUM_WORKERS = int(os.environ.get('SCHEDULER_DEFAULT_NUM_WORKERS', 8))
+DEFAULT_RELATIVE_GAP_LIMIT = 0.05
+SOLVE_MODES = ('full', 'rolling', 'aggregate')
+ENCODINGS = ('standard', 'compact')
+ENGINES = ('cpsat', 'local_search')
+OBJECTIVES = ('weighted', 'staged')
+
+# Tuned per-size-class settings (see tests/tune_solver.py). Instances are classed by the
+# first bound at or above their employee count and day count, e.g. 'e30_d31'.
+SOLVER_PRESETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_presets.json')
+SIZE_CLASS_EMPLOYEES = (10, 30, 75, 200)
+SIZE_CLASS_DAYS = (7, 31, 92)
+
+def size_class(num_employees, num_days):
+    def bound(value, bounds):
+        return next((str(b) for b in bounds if value <= b), 'max')
+    return f"e{bound(num_employees, SIZE_CLASS_EMPLOYEES)}_d{bound(num_days, SIZE_CLASS_DAYS)}"
+
+_presets_cache = {}
+
+def load_solver_presets(path=None):
+    """
+    {size class: {num_workers, sat_parameters, ...}} from the presets file
+    (SCHEDULER_SOLVER_PRESETS, default app/solver_presets.json), or {} if there is none.
+    Re-read when the file changes, so a new tuning run applies without a restart.
+    """
+    path = path or os.environ.get('SCHEDULER_SOLVER_PRESETS', SOLVER_PRESETS_PATH)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = _presets_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r') as f:
+            cached = (mtime, json.load(f).get('presets', {}))
+        _presets_cache[path] = cached
+    return cached[1]
+
+def validate_sat_parameters(parameters):
+    """
+    Checks CP-SAT parameter names and values ({name: value}, enums by name), so a bad
+    preset or request fails when the profile is resolved rather than inside the solve.
+    """
+    sat_parameters_text(parameters)
+    return dict(parameters)
+
+def sat_parameters_text(parameters):
+    """{name: value} as SatParameters text format, which solver.parameters can merge."""
+    fields = sat_parameters_pb2.SatParameters.DESCRIPTOR.fields_by_name
+    message = sat_parameters_pb2.SatParameters()
+    for name, value in parameters.items():
+        field = fields.get(name)
+        if field is None:
+            raise ValueError(f"Unknown CP-SAT parameter '{name}'")
+        try:
+            if field.enum_type is not None and isinstance(value, str):
+                value = field.enum_type.values_by_name[value].number
+            setattr(message, name, value)
+        except (TypeError, ValueError, KeyError):
+            raise ValueError(f"Bad value {value!r} for CP-SAT parameter '{name}'")
+    return text_format.MessageToString(message, as_one_line=True)
+
+def model_size(model):
+    """Variable and constraint counts of a built model, for comparing encodings."""
+    proto = model.Proto()
+    return {"variables": len(proto.variables), "constraints": len(proto.constraints)}
+
+def get_solver_profile(data, overrides=None):
+    """
+    Resolves the solver profile for a request from data['solver'] (and optional overrides).
+    Keys: num_workers, time_limit_seconds, relative_gap_limit, random_seed,
+    mode ('full' month model, 'rolling' weekly windows or 'aggregate' employee classes),
+    window_days, overlap_days, encoding ('standard' or 'compact' model encoding),
+    prune_dominated and template_cost_ceiling (template pruning, see TemplatePruning),
+    greedy (build a greedy schedule to hint the solver and to fall back on if it finds nothing),
+    engine ('cpsat', or 'local_search' for a quick annealing pass over the full month)
+    and local_search_ms (the local search time budget, in milliseconds),
+    objective ('weighted' sum, or 'staged' to minimise one term at a time, see staged.py)
+    and stage_tolerance (how far above its optimum a staged term may end up, relative),
+    debug (capture the CP-SAT search log and statistics in the result, see search_stats.py),
+    sat_parameters (any other CP-SAT parameters, {name: value}) and presets (take num_workers
+    and sat_parameters from the tuned preset for the instance's size class unless given).
+    Requests with a horizon or a carry_over block (see horizon.py) need mode 'full' and the cpsat engine;
+    requests with a demand curve (see demand.py) need mode 'full' or 'rolling', the cpsat engine
+    and no template pruning,
+    and requests with a previous_schedule to warm-start from need mode 'full' or 'rolling'.
+    """
+    profile = {
+        "num_workers": DEFAULT_NUM_WORKERS,
+        "time_limit_seconds": float(os.environ.get('SCHEDULER_SOLVER_TIME_LIMIT_SECONDS', 300)),
+        # Stop if within 5% of optimal
+        "relative_gap_limit": DEFAULT_RELATIVE_GAP_LIMIT,
+        "random_seed": None,
+        "mode": "full",
+        "window_days": 7,
+        "overlap_days": 3,
+        "encoding": "standard",
+        "prune_dominated": False,
+        "template_cost_ceiling": None,
+        "greedy": True,
+        "engine": "cpsat",
+        "local_search_ms": 500,
+        "objective": "weighted",
+        "stage_tolerance": 0.02,
+        "debug": False,
+        "sat_parameters": {},
+        "presets": True,
+    }
+    given = set()
+    for source in (data.get('solver') or {}, overrides or {}):
+        for key, value in source.items():
+            if key in profile and value is not None:
+                profile[key] = value
+                given.add(key)
+    
+    _, num_days = calendar.monthrange(data.get('year', 2025), data.get('month', 12))
+    if data.get('horizon'):
+        # A horizon is solved a calendar month at a time: size it by its longest month
+        horizon = _sibling('horizon')
+        segments = horizon.plan_segments(*horizon.parse_horizon(data))
+        num_days = max(last_day - first_day + 1 for _, _, first_day, last_day in segments)
+    profile["size_class"] = size_class(len(data.get('employees', [])), num_days)
+    preset = load_solver_presets().get(profile["size_class"]) if profile["presets"] else None
+    profile["preset_applied"] = preset is not None
+    if preset is not None:
+        # Settings given with the request win over the preset's
+        if "num_workers" not in given and preset.get("num_workers") is not None:
+            profile["num_workers"] = preset["num_workers"]
+        profile["sat_parameters"] = dict(preset.get("sat_parameters", {}), **profile["sat_parameters"])
+    
+    profile["num_workers"] = max(1, int(profile["num_workers"]))
+    profile["time_limit_seconds"] = max(0.0, float(profile["time_limit_seconds"]))
+    profile["relative_gap_limit"] = max(0.0, float(profile["relative_gap_limit"]))
+    if profile["random_seed"] is not None:
+        profile["random_seed"] = int(profile["random_seed"])
+    if profile["mode"] not in SOLVE_MODES:
+        raise ValueError(f"Unknown solve mode '{profile['mode']}' (expected one of {', '.join(SOLVE_MODES)})")
+    profile["window_days"] = max(1, int(profile["window_days"]))
+    profile["overlap_days"] = max(0, int(profile["overlap_days"]))
+    profile["prune_dominated"] = bool(profile["prune_dominated"])
+    profile["greedy"] = bool(profile["greedy"])
+    if profile["template_cost_ceiling"] is not None:
+        profile["template_cost_ceiling"] = int(profile["template_cost_ceiling"])
+    if profile["encoding"] not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{profile['encoding']}' (expected one of {', '.join(ENCODINGS)})")
+    if profile["engine"] not in ENGINES:
+        raise ValueError(f"Unknown engine '{profile['engine']}' (expected one of {', '.join(ENGINES)})")
+    if profile["engine"] == "local_search" and profile["mode"] != "full":
+        raise ValueError("The local_search engine only solves in mode 'full'")
+    profile["local_search_ms"] = max(1, int(profile["local_search_ms"]))
+    if profile["objective"] not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{profile['objective']}' (expected one of {', '.join(OBJECTIVES)})")
+    if profile["objective"] == "staged" and (profile["mode"] != "full" or profile["engine"] != "cpsat"):
+        raise ValueError("The staged objective only solves in mode 'full' with the cpsat engine")
+    profile["stage_tolerance"] = max(0.0, float(profile["stage_tolerance"]))
+    if (data.get('horizon') or data.get('carry_over')) and (profile["mode"] != "full" or profile["engine"] != "cpsat"):
+        raise ValueError("Horizons and carry_over only solve in mode 'full' with the cpsat engine")
+    if data.get('horizon') and profile["objective"] == "staged":
+        raise ValueError("The staged objective does not solve horizons")
+    if data.get('demand') and (profile["mode"] == "aggregate" or profile["engine"] != "cpsat"):
+        raise ValueError("Demand curves only solve in mode 'full' or 'rolling' with the cpsat engine")
+    if data.get('demand') and (profile["prune_dominated"] or profile["template_cost_ceiling"] is not None):
+        # Coverage is soft: a pruned table stays feasible, it just cannot staff the slots the
+        # dropped templates covered, and the full-table fallback never runs
+        raise ValueError("Template pruning (prune_dominated, template_cost_ceiling) does not apply with a demand curve")
+    if data.get('previous_schedule') and profile["mode"] == "aggregate":
+        # Class counters do not know who worked which shift, so there is nothing to warm-start
+        raise ValueError("previous_schedule hints only apply in mode 'full' or 'rolling'")
+    profile["debug"] = bool(profile["debug"])
+    profile["presets"] = bool(profile["presets"])
+    profile["sat_parameters"] = validate_sat_parameters(profile["sat_parameters"])
+    return profile
+
+def validate_request(data):
+    """
+    Raises ValueError for a request the solver would refuse: an unknown or contradictory solver
+    profile, unknown sat_parameters, a malformed horizon or demand curve. Builds and solves nothing,
+    so the API can answer 422 before it starts.
+    """
+    get_solver_profile(data)
+    if data.get('demand'):
+        _sibling('demand').validate_demand(data['demand'])
+
+# Processes that can hold leases at once (the API process plus job and batch workers)
+LEASE_HOLDER_SLOTS = 64
+# How often a blocked lease looks for cores held by processes that have died
+LEASE_RECLAIM_SECONDS = 1.0
+
+def _process_alive(pid):
+    """False once pid has exited, including a crashed child its parent has not reaped yet."""
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # 'pid (name) state ...': a zombie holds nothing any more
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except (OSError, IndexError):
+        return True
+
+class CpuBudget:
+    """
+    Server-wide pool of solver cores. Each solve leases workers from it, so concurrent
+    requests split the cores between them instead of each starting a full set of workers.
+    A lease blocks only while no core at all is free; otherwise it gets what is left.
+    The count lives in shared memory: the job and batch pools (jobs.py) hand the API
+    process's budget to their processes, so every solve on the server leases the same cores.
+    Leases are also counted per process, so the cores of a worker that dies mid-solve
+    (and never releases) go back to the budget (see reclaim).
+    """
+    def __init__(self, total):
+        self.total = max(1, int(total))
+        # Cap on a single lease (see limited)
+        self.max_lease = self.total
+        context = multiprocessing.get_context('spawn')
+        self._in_use = context.RawValue('i', 0)
+        # pid, cores pairs, one per process holding a lease (pid 0: free slot)
+        self._holders = context.RawArray('i', 2 * LEASE_HOLDER_SLOTS)
+        self._cond = context.Condition()
+
+    @property
+    def in_use(self):
+        return self._in_use.value
+
+    def limited(self, max_lease):
+        """The same budget (same cores, same count) with each lease capped at max_lease cores."""
+        view = copy.copy(self)
+        view.max_lease = max(1, min(int(max_lease), self.total))
+        return view
+
+    def _hold(self, cores):
+        # Adds cores to this process's slot (negative to give them back); caller holds _cond.
+        # With every slot taken the lease still counts, it just cannot be reclaimed.
+        pid = os.getpid()
+        holders = self._holders
+        free = None
+        for slot in range(0, len(holders), 2):
+            if holders[slot] == pid:
+                holders[slot + 1] += cores
+                if holders[slot + 1] <= 0:
+                    holders[slot] = holders[slot + 1] = 0
+                return
+            if free is None and holders[slot] == 0:
+                free = slot
+        if free is not None and cores > 0:
+            holders[free] = pid
+            holders[free + 1] = cores
+
+    def _reclaim(self):
+        # Caller holds _cond
+        holders = self._holders
+        reclaimed = 0
+        for slot in range(0, len(holders), 2):
+            pid = holders[slot]
+            if pid and not _process_alive(pid):
+                reclaimed += holders[slot + 1]
+                holders[slot] = holders[slot + 1] = 0
+        if reclaimed:
+            self._in_use.value -= reclaimed
+            self._cond.notify_all()
+        return reclaimed
+
+    def reclaim(self):
+        """Returns the cores leased by processes that have exited without releasing them; returns how many."""
+        with self._cond:
+            return self._reclaim()
+
+    def acquire(self, requested):
+        requested = max(1, min(int(requested), self.max_lease))
+        with self._cond:
+            while self._in_use.value >= self.total:
+                # Nothing free: a worker that crashed mid-solve may still hold cores
+                if not self._reclaim():
+                    self._cond.wait(LEASE_RECLAIM_SECONDS)
+            granted = min(requested, self.total - self._in_use.value)
+            self._in_use.value += granted
+            self._hold(granted)
+            return granted
+
+    def release(self, granted):
+        with self._cond:
+            self._in_use.value -= granted
+            self._hold(-granted)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, requested):
+        granted = self.acquire(requested)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+CPU_BUDGET = CpuBudget(int(os.environ.get('SCHEDULER_CPU_BUDGET', os.cpu_count() or 1)))
+
+def apply_solver_profile(solver, profile, num_workers):
+    if profile["sat_parameters"]:
+        # Applied first, so the profile's own settings below always win
+        solver.parameters.merge_text_format(sat_parameters_text(profile["sat_parameters"]))
+    solver.parameters.max_time_in_seconds = profile["time_limit_seconds"]
+    solver.parameters.relative_gap_limit = profile["relative_gap_limit"]
+    solver.parameters.num_workers = num_workers
+    if profile["random_seed"] is not None:
+        solver.parameters.random_seed = profile["random_seed"]
+    if profile["debug"]:
+        _sibling('search_stats').capture_search_log(solver)
+
+def search_debug(solver, profile):
+    """The result's 'debug' block for a finished solve, or None unless profile['debug'] is on."""
+    if not profile["debug"]:
+        return None
+    return _sibling('search_stats').summarize(solver)
+
+def watch_stop_event(solver, stop_event, poll_seconds=0.2):
+    """
+    Stops the running search as soon as stop_event (anything with is_set()) is set.
+    Returns the threading.Event that ends the watcher once the solve is over.
+    """
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(poll_seconds):
+            if stop_event.is_set():
+                solver.StopSearch()
+                return
+
+    threading.Thread(target=watch, daemon=True).start()
+    return done
+
+def apply_schedule_hints(ctx, previous_schedule):
+    """
+    Warm start: maps a previous result's 'schedule' block back onto the work variables
+    and hints them. Employees are matched by name and shifts by start/end/type.
+    An employee-day from the previous schedule is hinted as a whole (1 on the matching
+    template, 0 on the others), so an employee who was off stays off.
+    Returns hint statistics for the response.
+    """
+    model = ctx['model']
+    work = ctx['work']
+    employees = ctx['employees']
+    day_templates = ctx['day_templates']
+    emp_day_vars = ctx['index']['emp_day']
+    
+    emp_ids = {}
+    for i, emp in enumerate(employees):
+        emp_ids.setdefault(emp['name'], i)
+    
+    previous_shifts = 0
+    matched = 0
+    hinted = 0
+    
+    for day_str, shifts in previous_schedule.items():
+        day = int(day_str)
+        templates = day_templates.get(day)
+        if not templates:
+            continue
+        
+        lookup = {}
+        for s_idx, t in enumerate(templates):
+            lookup.setdefault((fmt_time(t['start']), fmt_time(t['end']), t['type']), s_idx)
+        
+        for i, emp in enumerate(employees):
+            shift = shifts.get(emp['name'])
+            s_idx = None
+            if shift is not None:
+                previous_shifts += 1
+                s_idx = lookup.get((shift.get('start'), shift.get('end'), shift.get('type')))
+                if s_idx is not None and (i, day, s_idx) not in work:
+                    s_idx = None  # now unavailable that day
+                if s_idx is not None:
+                    matched += 1
+                else:
+                    # Shift no longer possible; let the solver choose freely for this employee-day
+                    continue
+            
+            if (i, day) not in emp_day_vars:
+                continue
+            for t_idx in range(len(templates)):
+                var = work.get((i, day, t_idx))
+                if var is not None:
+                    model.AddHint(var, 1 if t_idx == s_idx else 0)
+                    hinted += 1
+    
+    # Names in the previous schedule that are no longer on the roster count as misses too
+    for day_str, shifts in previous_schedule.items():
+        for name in shifts:
+            if name not in emp_ids:
+                previous_shifts += 1
+    
+    return {
+        "previous_shifts": previous_shifts,
+        "matched_shifts": matched,
+        "hit_rate": matched / previous_shifts if previous_shifts else 0.0,
+        "hinted_variables": hinted
+    }
+
+def format_understaffed(understaff_info):
+    return [
+        {
+            "day": day,
+            "needed": info['needed'],
+            "available": info['available'],
+            "deficit": info['deficit']
+        }
+        for day, info in sorted(understaff_info.items())
+    ]
+
+def solution_values(solution):
+    """
+    Every variable's value in a solution, as one int array indexed by variable id.
+    solution is the CpSolver after a solve, or a solution callback inside OnSolutionCallback.
+    """
+    if isinstance(solution, cp_model.CpSolverSolutionCallback):
+        response = solution.Response()
+    else:
+        response = solution.ResponseProto()
+    return np.array(response.solution, dtype=np.int64)
+
+def extraction_index(ctx):
+    """
+    The work literals of a built model as flat arrays: var_ids (variable id of each literal)
+    and keys ((i, day, s_idx) of each literal, in the same order).
+    Built on first use and kept in ctx, so streaming many solutions builds it once.
+    """
+    if 'extraction' not in ctx:
+        work = ctx['work']
+        var_ids = ctx.get('work_ids')
+        if var_ids is None:
+            var_ids = np.fromiter((var.Index() for var in work.values()), dtype=np.int64, count=len(work))
+        ctx['extraction'] = {"var_ids": var_ids, "keys": list(work)}
+    return ctx['extraction']
+
+def read_assignment(ctx, solution):
+    """
+    Reads the chosen shift of every employee-day from a solution: {(i, day): template}.
+    solution is the CpSolver after a solve, or a solution callback inside OnSolutionCallback;
+    all work literals are read from its response at once.
+    """
+    index = extraction_index(ctx)
+    day_templates = ctx['day_templates']
+    keys = index['keys']
+    chosen = np.flatnonzero(solution_values(solution)[index['var_ids']])
+    return {(keys[k][0], keys[k][1]): day_templates[keys[k][1]][keys[k][2]]
+            for k in sorted(chosen.tolist(), key=lambda k: (keys[k][1], keys[k][0]))}
+
+# Shift type -> (opens, closes, middles) it counts towards in the employee stats
+TYPE_COUNTS = {
+    'OPEN': (1, 0, 0),
+    'CLOSE': (0, 1, 0),
+    'FIXED': (1, 1, 0),
+}
+MIDDLE_COUNTS = (0, 0, 1)
+
+def format_assignment(employees, assignment, days, paid_hours):
+    """
+    Turns an assignment {(i, day): template} into the result's 'schedule' and 'employees' blocks.
+    days lists the days the schedule covers (every open day gets an entry, even if nobody works).
+    """
+    # Build schedule dict
+    # We need a JSON serializable format.
+    # Structure: { day: { employee_name: { start, end, type, duration } } }
+    shifts = sorted(assignment.items(), key=lambda item: item[0])
+    schedule_output = {str(day): {} for day in days}
+    for (i, day), template in shifts:
+        schedule_output[str(day)][employees[i]['name']] = {
+            "start": fmt_time(template['start']),
+            "end": fmt_time(template['end']),
+            "type": template['type'],
+            "duration": template['duration']
+        }
+        
+    # Employee Stats: worked hours and open / close / middle counts, summed per employee
+    num_employees = len(employees)
+    emp_ids = np.array([i for (i, _), _ in shifts], dtype=np.int64)
+    durations = np.array([template['duration'] for _, template in shifts], dtype=float)
+    counts = np.array([TYPE_COUNTS.get(template['type'], MIDDLE_COUNTS) for _, template in shifts],
+                      dtype=np.int64).reshape(-1, 3)
+    worked_hours = np.bincount(emp_ids, weights=durations, minlength=num_employees)
+    type_counts = np.zeros((num_employees, 3), dtype=np.int64)
+    np.add.at(type_counts, emp_ids, counts)
+    
+    emp_stats = []
+    for i, emp in enumerate(employees):
+        worked = float(worked_hours[i])
+        paid = paid_hours[i]
+        total = worked + paid
+        target = emp['hours_fund']
+        diff = total - target
+        opens, closes, middle = type_counts[i].tolist()
+        
+        emp_stats.append({
+            "name": emp['name'],
+            "worked": worked,
+            "paid_off": paid,
+            "total": total,
+            "target": target,
+            "diff": diff,
+            "opens": opens,
+            "closes": closes,
+            "middle": middle
+        })
+        
+    return schedule_output, emp_stats
+
+def extract_solution(ctx, solution):
+    """
+    Turns a solution into the result's 'schedule' and 'employees' blocks.
+    solution is the CpSolver after a solve, or a solution callback inside OnSolutionCallback.
+    """
+    open_days = [day for day in ctx['days'] if not ctx['day_contexts'][day].closed]
+    assignment = read_assignment(ctx, solution)
+    return format_assignment(ctx['employees'], assignment, open_days, ctx['paid_hours'])
+
+class SolutionStreamer(cp_model.CpSolverSolutionCallback):
+    """
+    Hands every improving solution to on_solution as it is found, in the same
+    schedule/employees shape as the final result, plus objective, bound and elapsed time.
+    """
+    def __init__(self, ctx, on_solution):
+        super().__init__()
+        self.ctx = ctx
+        self.on_solution = on_solution
+        self.best_objective = None
+        self.solution_count = 0
+
+    def OnSolutionCallback(self):
+        objective = self.ObjectiveValue()
+        if self.best_objective is not None and objective >= self.best_objective:
+            return
+        self.best_objective = objective
+        self.solution_count += 1
+        
+        schedule, emp_stats = extract_solution(self.ctx, self)
+        self.on_solution({
+            "solution_index": self.solution_count,
+            "objective_value": objective,
+            "best_bound": self.BestObjectiveBound(),
+            "elapsed_seconds": self.WallTime(),
+            "schedule": schedule,
+            "employees": emp_stats,
+            "understaffed": format_understaffed(self.ctx['understaff_info'])
+        })
+
+def _solve_built_model(ctx, data, profile, stop_event=None, on_solution=None, timer=None):
+    """
+    Applies warm-start hints and solves a built model.
+    Returns (solver, status, num_workers, hint_stats, greedy) where greedy is
+    (assignment, stats) from the greedy builder, or None when profile['greedy'] is off.
+    timer (a telemetry.PhaseTimer) gets the warm start and the solve as two phases.
+    """
+    timer = timer or telemetry.PhaseTimer()
+    timer.mark()
+    greedy = None
+    if profile["greedy"]:
+        greedy_module = _sibling('greedy')
+        greedy = greedy_module.build_greedy_schedule(ctx)
+        log.info("greedy_built", build_ms=round(greedy[1]['build_time_seconds'] * 1000, 1),
+                 understaffed_slots=greedy[1]['understaffed_slots'])
+    
+    # Warm start from a previous result, if the caller sent one; otherwise from the greedy schedule
+    hint_stats = None
+    if data.get('previous_schedule'):
+        hint_stats = apply_schedule_hints(ctx, data['previous_schedule'])
+        log.info("hints_applied", matched=hint_stats['matched_shifts'], previous=hint_stats['previous_shifts'])
+    elif greedy is not None:
+        greedy_module.hint_assignment(ctx, greedy[0])
+    timer.lap("warm_start")
     
     # Solve
-    print("Solving...")
     solver = cp_model.CpSolver()
+    callback = SolutionStreamer(ctx, on_solution) if on_solution is not None else None
     
-    # Configurable time limit
-    import os
-    time_limit = int(os.environ.get('SCHEDULER_SOLVER_TIME_LIMIT_SECONDS', 300))
-    solver.parameters.max_time_in_seconds = float(time_limit)
+    with CPU_BUDGET.lease(profile["num_workers"]) as num_workers, timer.phase("solve"):
+        log.info("solve_started", workers=num_workers, time_limit_seconds=profile["time_limit_seconds"])
+        # Plain hints, no repair_hint: OR-Tools 9.15 aborts the process (fixed_search check) when
+        # the time limit runs out while it repairs a hint, which is exactly when FALLBACK is needed
+        apply_solver_profile(solver, profile, num_workers)
+        watcher = watch_stop_event(solver, stop_event) if stop_event is not None else None
+        try:
+            status = solver.Solve(ctx['model'], callback)
+        finally:
+            if watcher is not None:
+                watcher.set()
+    return solver, status, num_workers, hint_stats, greedy
+
+def add_carry_over(result, data):
+    """Adds the 'carry_over' state a month's schedule leaves for the next month (see horizon.py)."""
+    if not result["schedule"]:
+        return
+    _, num_days = calendar.monthrange(data.get('year', 2025), data.get('month', 12))
+    result["carry_over"] = _sibling('horizon').carry_over_from_schedule(
+        data['employees'], result["schedule"], list(range(1, num_days + 1)), result["employees"],
+        data.get('carry_over'))
+
+def add_coverage_report(result, data):
+    """Adds the 'coverage' block (the schedule against the demand curve, see demand.py) if data has one."""
+    if not data.get('demand') or not result["schedule"]:
+        return
+    demand = _sibling('demand')
+    result["coverage"] = demand.coverage_report(demand.month_demand(data), result["schedule"])
+
+def solve_schedule(data_input, solver_profile=None, stop_event=None, on_solution=None):
+    """
+    Builds and solves the schedule for a data dict (or a JSON file path).
+    on_solution, if given, is called with every improving solution while the search runs.
+    The result's 'timings' block has the seconds spent in each phase, plus the total, and
+    'carry_over' the state the schedule leaves for the next period (see horizon.py).
+    A data dict with a 'demand' curve also gets a 'coverage' block (see demand.py).
+    A data dict with a 'horizon' is solved over that date range instead of one month.
+    """
+    telemetry.SOLVES_IN_FLIGHT.inc()
+    try:
+        result = _solve_schedule(data_input, solver_profile, stop_event, on_solution)
+    except Exception:
+        # Label it with what was asked for: the request's settings, then the caller's overrides
+        requested = data_input.get('solver') if isinstance(data_input, dict) else None
+        telemetry.record_failure(dict(requested or {}, **(solver_profile or {})))
+        raise
+    finally:
+        telemetry.SOLVES_IN_FLIGHT.dec()
+    telemetry.record_solve(result)
+    log.info("solve_finished", status=result["status"], objective=result["objective_value"],
+             total_seconds=round(result["timings"]["total"], 3))
+    return result
+
+def _solve_schedule(data_input, solver_profile, stop_event, on_solution):
+    timer = telemetry.PhaseTimer()
+    with timer.phase("prepare_data"):
+        if isinstance(data_input, str):
+            data = load_data(data_input)
+        else:
+            data = data_input
+
+        # Ensure data is prepared (hours_fund calculated); a horizon prepares each month itself
+        if not data.get('horizon'):
+            data = prepare_data(data)
+        profile = get_solver_profile(data, solver_profile)
+    
+    result = None
+    if data.get('horizon'):
+        result = _sibling('horizon').solve_horizon(data, profile, stop_event=stop_event, timer=timer)
+        result["timings"] = timer.summary()
+        return result
+    if profile["engine"] == "local_search":
+        result = _sibling('local_search').solve_local_search(data, profile, stop_event=stop_event, timer=timer)
+    elif profile["mode"] == "rolling":
+        result = _sibling('rolling').solve_rolling(data, profile, stop_event=stop_event, timer=timer)
+    elif profile["mode"] == "aggregate":
+        result = _sibling('aggregate').solve_aggregated(data, profile, stop_event=stop_event, timer=timer)
+    if result is not None:
+        add_carry_over(result, data)
+        add_coverage_report(result, data)
+        result["timings"] = timer.summary()
+        return result
+
+    compact = profile["encoding"] == "compact"
+    pruning = get_template_pruning(profile)
+    started = time.time()
+    
+    def solve(ctx, profile):
+        # -> (solver, status, num_workers, hint_stats, greedy, stages); stages is None unless staged
+        if profile["objective"] == "staged":
+            # Stage objectives are single terms, so intermediate solutions are not streamed
+            return _sibling('staged').solve_staged(ctx, data, profile, stop_event, timer=timer)
+        return _solve_built_model(ctx, data, profile, stop_event, on_solution, timer=timer) + (None,)
+    
+    # State the previous month left (streak, last shift, hours balance), if the caller sent it
+    carry_in = _sibling('horizon').month_carry_in(data) if data.get('carry_over') else None
+    ctx = build_model(data, carry_in=carry_in, compact=compact, pruning=pruning, timer=timer)
+    solver, status, num_workers, hint_stats, greedy, stages = solve(ctx, profile)
+    pruning_summary = ctx['pruning']
     
-    # Stop if within 5% of optimal
-    solver.parameters.relative_gap_limit = 0.05
+    # Cost-ceiling pruning can cut away the only feasible shifts: retry with the full tables
+    if status == cp_model.INFEASIBLE and pruning_summary and pruning_summary['dropped']:
+        log.warning("pruned_model_infeasible", action="retrying with all shift templates")
+        pruning_summary = dict(pruning_summary, fallback=True, pruned_solve_time_seconds=solver.WallTime())
+        remaining = max(0.1, profile["time_limit_seconds"] - (time.time() - started))
+        ctx = build_model(data, carry_in=carry_in, compact=compact, timer=timer)
+        solver, status, num_workers, hint_stats, greedy, stages = solve(
+            ctx, dict(profile, time_limit_seconds=remaining))
+    elif pruning_summary:
+        pruning_summary = dict(pruning_summary, fallback=False)
     
-    status = solver.Solve(model)
+    model = ctx['model']
+    understaff_info = ctx['understaff_info']
     
     result = {
         "status": solver.StatusName(status),
@@ -727,99 +1743,51 @@ def solve_schedule(data_input):
         "objective_value": solver.ObjectiveValue(),
         "schedule": {},
         "employees": [],
-        "understaffed": []
+        "understaffed": [],
+        "solver_profile": dict(profile, num_workers=num_workers),
+        "model": model_size(model)
     }
+    if hint_stats is not None:
+        result["hints"] = hint_stats
+    if pruning_summary:
+        result["pruning"] = pruning_summary
+    if greedy is not None:
+        result["greedy"] = dict(greedy[1], used_as_fallback=False)
+    if stages is not None:
+        # The solver only knows the last stage's term: report the weighted objective of the final schedule
+        result["solve_time_seconds"] = sum(stage["solve_time_seconds"] for stage in stages)
+        result["best_bound"] = None
+        result["objective_value"] = float(solver.Value(ctx['objective'])) if status == cp_model.FEASIBLE else 0.0
+        result["stages"] = stages
+    if profile["debug"] and stages is None:
+        # (staged solves report each stage's search in its stage entry)
+        result["debug"] = search_debug(solver, profile)
 
+    timer.mark()
     if understaff_info:
-        print("\n=== WARNING: Understaffed Days ===")
         for day, info in sorted(understaff_info.items()):
-            print(f"Day {day}: needed {info['needed']} but only {info['available']} available, deficit {info['deficit']}")
-            result["understaffed"].append({
-                "day": day,
-                "needed": info['needed'],
-                "available": info['available'],
-                "deficit": info['deficit']
-            })
+            log.warning("understaffed_day", day=day, needed=info['needed'],
+                        available=info['available'], deficit=info['deficit'])
+        result["understaffed"] = format_understaffed(understaff_info)
 
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        print(f"Solution found! Status: {solver.StatusName(status)}")
-        print(f"Objective Value: {solver.ObjectiveValue()}")
-        
-        # Build schedule dict
-        schedule = {}
-        employee_work_hours = {i: 0.0 for i in range(len(employees))}
-        
-        for day in range(1, num_days + 1):
-            if day in closed_holidays: continue
-            
-            daily_shifts = {}
-            for i in range(len(employees)):
-                for s_idx, template in enumerate(day_templates[day]):
-                    if (i, day, s_idx) in work:
-                        if solver.Value(work[(i, day, s_idx)]):
-                            daily_shifts[i] = template
-                            employee_work_hours[i] += template['duration']
-                            
-            schedule[day] = daily_shifts
-            
-        # Format schedule for return
-        # We need a JSON serializable format.
-        # Structure: { day: { employee_name: { start, end, type, duration } } }
-        
-        schedule_output = {}
-        for day, shifts in schedule.items():
-            day_data = {}
-            for i, template in shifts.items():
-                emp_name = employees[i]['name']
-                day_data[emp_name] = {
-                    "start": fmt_time(template['start']),
-                    "end": fmt_time(template['end']),
-                    "type": template['type'],
-                    "duration": template['duration']
-                }
-            schedule_output[str(day)] = day_data
-            
-        result["schedule"] = schedule_output
-        
-        # Employee Stats
-        emp_stats = []
-        for i, emp in enumerate(employees):
-            worked = employee_work_hours[i]
-            paid = paid_hours[i]
-            total = worked + paid
-            target = emp['hours_fund']
-            diff = total - target
-            
-            opens = 0
-            closes = 0
-            middle = 0
-            for day, shifts in schedule.items():
-                if i in shifts:
-                    t = shifts[i]
-                    if t['type'] == 'OPEN': opens += 1
-                    elif t['type'] == 'CLOSE': closes += 1
-                    elif t['type'] == 'FIXED': 
-                        opens += 1
-                        closes += 1
-                    else: middle += 1
-            
-            emp_stats.append({
-                "name": emp['name'],
-                "worked": worked,
-                "paid_off": paid,
-                "total": total,
-                "target": target,
-                "diff": diff,
-                "opens": opens,
-                "closes": closes,
-                "middle": middle
-            })
-            
-        result["employees"] = emp_stats
+        result["schedule"], result["employees"] = extract_solution(ctx, solver)
+    
+    elif status == cp_model.UNKNOWN and greedy is not None:
+        # Out of time (or cancelled) before any solution: return the greedy schedule, labelled as such
+        log.warning("no_solution_in_time", action="returning the greedy schedule")
+        result["status"] = "FALLBACK"
+        result["greedy"]["used_as_fallback"] = True
+        open_days = [day for day in ctx['days'] if not ctx['day_contexts'][day].closed]
+        result["schedule"], result["employees"] = format_assignment(
+            ctx['employees'], greedy[0], open_days, ctx['paid_hours'])
         
     else:
-        print("No solution found.")
-        
+        log.warning("no_solution", status=solver.StatusName(status))
+    add_carry_over(result, data)
+    add_coverage_report(result, data)
+    timer.lap("extraction")
+    result["timings"] = timer.summary()
     return result
 
 def print_schedule(result):
@@ -847,5 +1815,6 @@ def print_schedule(result):
         print(f"{emp['name']:<10} | {emp['worked']:<8.1f} | {emp['paid_off']:<8.1f} | {emp['total']:<8.1f} | {emp['target']:<8} | {emp['diff']:<+8.1f} | {emp['opens']:<5} | {emp['closes']:<5} | {emp['middle']:<5}")
 
 if __name__ == "__main__":
+    telemetry.configure_logging()
     res = solve_schedule('data_scalable.json')
     print_schedule(res)
@@ -0,0 +1,112 @@
+import os
+import re
+import weakref
+
+# solver -> the log lines it has written so far (see capture_search_log)
+_LOGS = weakref.WeakKeyDictionary()
+# The result keeps only the last lines of the raw log (the parsed fields read all of it):
+# a long solve logs thousands, and debug results are kept by the result cache and the job queue
+SEARCH_LOG_LINES = int(os.environ.get('SCHEDULER_SEARCH_LOG_LINES', 500))
+
+# '#12      3.00s best:226710 next:[200,226705] rnd_cst_lns (d=5.00e-01 ...)'
+_SOLUTION_LINE = re.compile(r"^#(\d+)\s+([\d.]+)s\s+best:(\S+)\s+next:\S+\s+(\S+)")
+# "  - rule 'linear: empty' was applied 73 times."
+_RULE_LINE = re.compile(r"^\s+- rule '(.+)' was applied ([\d']+) times?\.")
+# '#kLinearN: 524 (#terms: 29'186)' or '#Variables: 5'286 (#bools: ...)'
+_COUNT_LINE = re.compile(r"^#(k\w+|Variables): ([\d']+)")
+
+def capture_search_log(solver):
+    """
+    Turns on the CP-SAT search log for solver and collects it in memory instead of
+    printing it to stdout. summarize reads it back after the solve.
+    """
+    lines = []
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    # A message can hold several lines (a model summary comes as one)
+    solver.log_callback = lambda message: lines.extend(message.split("\n"))
+    _LOGS[solver] = lines
+    return lines
+
+def _count(text):
+    return int(text.replace("'", ""))
+
+def parse_presolve(lines):
+    """Model size before and after presolve, and how often each presolve rule fired."""
+    sizes = {}
+    rules = {}
+    section = None
+    for line in lines:
+        if line.startswith("Initial optimization model"):
+            section = "before"
+        elif line.startswith("Presolved optimization model"):
+            section = "after"
+        elif not line.startswith("#") and not line.startswith("  -"):
+            section = None if line.strip() == "" else section
+        match = _RULE_LINE.match(line)
+        if match:
+            rules[match.group(1)] = _count(match.group(2))
+            continue
+        match = _COUNT_LINE.match(line)
+        if match and section:
+            size = sizes.setdefault(section, {"variables": 0, "constraints": 0})
+            if match.group(1) == "Variables":
+                size["variables"] = _count(match.group(2))
+            else:
+                size["constraints"] += _count(match.group(2))
+    if not sizes:
+        return None
+    before = sizes.get("before", {})
+    after = sizes.get("after", {})
+    return {
+        "variables_before": before.get("variables"),
+        "variables_after": after.get("variables"),
+        "constraints_before": before.get("constraints"),
+        "constraints_after": after.get("constraints"),
+        "rules_applied": sum(rules.values()),
+        "rules": dict(sorted(rules.items(), key=lambda item: -item[1])),
+    }
+
+def parse_solutions(lines):
+    """[{index, elapsed_seconds, objective, subsolver}] for every solution the log reports."""
+    solutions = []
+    for line in lines:
+        match = _SOLUTION_LINE.match(line)
+        if match:
+            solutions.append({
+                "index": int(match.group(1)),
+                "elapsed_seconds": float(match.group(2)),
+                "objective": float(match.group(3)),
+                "subsolver": match.group(4),
+            })
+    return solutions
+
+def summarize(solver):
+    """
+    The result's 'debug' block for a finished solve: search counters from the response,
+    which subsolver found the best solution, every improving solution, presolve
+    reductions, plus ResponseStats() and the last SEARCH_LOG_LINES lines of the raw
+    search log (search_log_dropped counts the earlier ones).
+    """
+    lines = _LOGS.get(solver, [])
+    response = solver.ResponseProto()
+    solution_info = response.solution_info
+    solutions = parse_solutions(lines)
+    kept = lines[len(lines) - min(len(lines), max(0, SEARCH_LOG_LINES)):]
+    return {
+        "solutions_found": len(solutions),
+        "best_solution_subsolver": solution_info.split(" ")[0] if solution_info else None,
+        "solution_info": solution_info,
+        "conflicts": response.num_conflicts,
+        "branches": response.num_branches,
+        "propagations": response.num_binary_propagations,
+        "integer_propagations": response.num_integer_propagations,
+        "restarts": response.num_restarts,
+        "lp_iterations": response.num_lp_iterations,
+        "deterministic_time": response.deterministic_time,
+        "presolve": parse_presolve(lines),
+        "solutions": solutions,
+        "response_stats": solver.ResponseStats(),
+        "search_log": kept,
+        "search_log_dropped": len(lines) - len(kept),
+    }
@@ -0,0 +1,97 @@
+import time
+from ortools.sat.python import cp_model
+
+try:
+    from . import scheduler
+except ImportError:  # loaded with app/ on sys.path (tests, scripts)
+    import scheduler
+
+log = scheduler.telemetry.get_logger('staged')
+
+def _hint_solution(model, solver):
+    # Every variable at its value in the previous stage's solution (it stays feasible:
+    # the lock it adds holds for it), so the next stage starts from a full solution
+    model.ClearHints()
+    for k in range(len(model.Proto().variables)):
+        var = model.GetIntVarFromProtoIndex(k)
+        model.AddHint(var, solver.Value(var))
+
+def solve_staged(ctx, data, profile, stop_event=None, timer=None):
+    """
+    Solves a built model lexicographically over ctx['objective_terms'] (hours deviation,
+    day shape, demand coverage if any, shift cost, open/close fairness, clopens) instead of
+    their weighted sum.
+    Each stage minimises one term, then locks it at its value plus profile['stage_tolerance']
+    (relative) before the next. A stage gets an equal share of the time still left and is
+    hinted with the previous stage's solution; the first one gets the usual warm start.
+    Staging stops at the first stage that finds nothing (or when stop_event is set).
+
+    Returns (solver, status, num_workers, hint_stats, greedy, stages) like
+    scheduler._solve_built_model, where solver holds the last stage's solution (status
+    FEASIBLE once any stage solved) and stages lists each stage's name, status, time slice,
+    solve time, objective, bound and lock. timer adds every stage to the solve phase.
+    """
+    timer = timer or scheduler.telemetry.PhaseTimer()
+    model = ctx['model']
+    terms = ctx['objective_terms']
+    tolerance = profile['stage_tolerance']
+    started = time.time()
+
+    stages = []
+    best = None  # (solver, status) of the last stage that solved
+    hint_stats = greedy = None
+    num_workers = profile['num_workers']
+
+    for n, (name, term) in enumerate(terms):
+        if stop_event is not None and stop_event.is_set():
+            break
+        remaining = profile['time_limit_seconds'] - (time.time() - started)
+        stage_profile = dict(profile, time_limit_seconds=max(0.1, remaining / (len(terms) - n)))
+        model.Minimize(term)
+        log.info("stage_started", stage=n + 1, stages=len(terms), term=name,
+                 time_limit_seconds=round(stage_profile['time_limit_seconds'], 2))
+
+        if best is None:
+            solver, status, num_workers, hint_stats, greedy = scheduler._solve_built_model(
+                ctx, data, stage_profile, stop_event, timer=timer)
+        else:
+            _hint_solution(model, best[0])
+            solver = cp_model.CpSolver()
+            with scheduler.CPU_BUDGET.lease(profile['num_workers']) as num_workers, timer.phase("solve"):
+                scheduler.apply_solver_profile(solver, stage_profile, num_workers)
+                watcher = scheduler.watch_stop_event(solver, stop_event) if stop_event is not None else None
+                try:
+                    status = solver.Solve(model)
+                finally:
+                    if watcher is not None:
+                        watcher.set()
+
+        solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        stage = {
+            "name": name,
+            "status": solver.StatusName(status),
+            "time_limit_seconds": stage_profile['time_limit_seconds'],
+            "solve_time_seconds": solver.WallTime(),
+            "objective_value": solver.ObjectiveValue() if solved else None,
+            "best_bound": solver.BestObjectiveBound() if solved else None,
+            "locked_at": None,
+        }
+        if profile['debug']:
+            stage["debug"] = scheduler.search_debug(solver, profile)
+        stages.append(stage)
+        if not solved:
+            log.warning("stage_failed", term=name, status=solver.StatusName(status))
+            break
+
+        # Terms are integer sums, so the lock is an integer too
+        value = int(round(solver.ObjectiveValue()))
+        stage["locked_at"] = value + int(value * tolerance)
+        model.Add(term <= stage["locked_at"])
+        best = (solver, status)
+
+    if best is None:
+        if not stages:
+            # Cancelled before the first stage: nothing was solved
+            solver, status = cp_model.CpSolver(), cp_model.UNKNOWN
+        return solver, status, num_workers, hint_stats, greedy, stages
+    return best[0], cp_model.FEASIBLE, num_workers, hint_stats, greedy, stages
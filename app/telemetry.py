@@ -0,0 +1,278 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# --- Phase timings ---------------------------------------------------------
+
+class PhaseTimer:
+    """
+    Wall time per solve phase, in seconds. lap(name) charges the time since the previous
+    lap (or mark, or the start) to name; phase(name) times a with-block. Repeated
+    names add up, so a phase that runs once per window reports its total.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.timings = {}
+
+    def _add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def mark(self):
+        # Starts the next lap now, leaving the time since the last one uncharged
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self._add(name, now - self._last)
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._add(name, now - start)
+            self._last = now
+
+    def summary(self):
+        return dict(self.timings, total=time.perf_counter() - self.started)
+
+# --- Prometheus metrics ----------------------------------------------------
+# A small in-process registry rendered in the Prometheus text format (0.0.4), so the
+# API can expose /metrics without another dependency.
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.kind != "histogram":
+            # A single series is there from the start, at zero
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for k, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][k] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(state['sum'])}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "scheduler_http_request_duration_seconds", "HTTP request latency.",
+    LATENCY_BUCKETS, ("method", "path", "status")))
+SOLVES = REGISTRY.register(Counter(
+    "scheduler_solves_total", "Finished solves by outcome.", ("status", "mode", "engine")))
+SOLVE_SECONDS = REGISTRY.register(Histogram(
+    "scheduler_solve_duration_seconds", "Wall time of a solve, from raw data to result.",
+    LATENCY_BUCKETS, ("mode",)))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "scheduler_phase_duration_seconds", "Wall time of each solve phase (see the result's timings block).",
+    LATENCY_BUCKETS, ("phase",)))
+MODEL_VARIABLES = REGISTRY.register(Histogram(
+    "scheduler_model_variables", "Variables in each solved model.", SIZE_BUCKETS))
+MODEL_CONSTRAINTS = REGISTRY.register(Histogram(
+    "scheduler_model_constraints", "Constraints in each solved model.", SIZE_BUCKETS))
+SOLVES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "scheduler_solves_in_flight", "Solves running right now."))
+
+def record_solve(result):
+    """Counts a finished solve and observes its duration, phases and model size."""
+    profile = result.get("solver_profile") or {}
+    mode = profile.get("mode", "full")
+    SOLVES.inc(status=result.get("status", "UNKNOWN"), mode=mode, engine=profile.get("engine", "cpsat"))
+    timings = result.get("timings") or {}
+    if "total" in timings:
+        SOLVE_SECONDS.observe(timings["total"], mode=mode)
+    for phase, seconds in timings.items():
+        if phase != "total":
+            PHASE_SECONDS.observe(seconds, phase=phase)
+    model = result.get("model")
+    if model:
+        MODEL_VARIABLES.observe(model["variables"])
+        MODEL_CONSTRAINTS.observe(model["constraints"])
+
+def record_failure(solver):
+    """Counts a solve that raised, labelled from the solver settings it was asked for (data['solver'])."""
+    solver = solver or {}
+    SOLVES.inc(status="ERROR", mode=solver.get("mode") or "full", engine=solver.get("engine") or "cpsat")
+
+# --- Structured logging ----------------------------------------------------
+
+class EventLogger:
+    """
+    Logs events as a name plus key/value fields, e.g. log.info("model_built", variables=5286),
+    which the configured formatter renders as JSON or as key=value text.
+    """
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, event, fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+# Silent until configure_logging is called (the API and the CLI do; tests and library use don't)
+logging.getLogger("scheduler").addHandler(logging.NullHandler())
+
+def get_logger(name):
+    return EventLogger(f"scheduler.{name}")
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname.lower():<7} {record.name} {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+def configure_logging(fmt=None, level=None):
+    """
+    Sends the scheduler's events to stderr, as JSON lines or text
+    (SCHEDULER_LOG_FORMAT=json|text, SCHEDULER_LOG_LEVEL, default text at INFO).
+    Calling it again replaces the handler rather than adding another.
+    """
+    fmt = fmt or os.environ.get("SCHEDULER_LOG_FORMAT", "text")
+    level = level or os.environ.get("SCHEDULER_LOG_LEVEL", "INFO")
+    logger = logging.getLogger("scheduler")
+    for handler in list(logger.handlers):
+        if getattr(handler, "_scheduler_handler", False):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler._scheduler_handler = True
+    logger.addHandler(handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    return logger
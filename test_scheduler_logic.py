@@ -1,11 +1,44 @@
 import sys
 import os
 import json
+import tempfile
+import random
+import time
+import datetime
+import threading
+import subprocess
+import signal
+import multiprocessing
 
 # Add app directory to path so we can import scheduler
 sys.path.append(os.path.join(os.getcwd(), 'app'))
+sys.path.append(os.path.join(os.getcwd(), 'tests'))
 
-from scheduler import generate_shift_templates, get_paid_hours, parse_time
+from scheduler import generate_shift_templates, get_paid_hours, parse_time, get_template_table, build_day_contexts
+from scheduler import build_model, prepare_data, apply_schedule_hints, read_assignment, model_size
+from scheduler import TemplatePruning, get_pruned_template_table, solve_schedule, get_solver_profile
+from scheduler import apply_solver_profile, size_class, extract_solution, CpuBudget
+import scheduler
+import search_stats
+from scheduler import availability_matrix, calculate_monthly_staffing, resolve_day_staffing
+from rolling import plan_windows, build_carry_in
+from horizon import plan_segments, month_data, carry_in_from_state
+import horizon
+from aggregate import employee_classes, build_class_model, disaggregate, hint_counts
+from greedy import build_greedy_schedule, hint_assignment
+from local_search import ScheduleState, anneal, evaluate_assignment
+from staged import solve_staged
+from ortools.sat.python import cp_model
+from result_cache import ResultCache, request_key
+from generate_stress_data import DEFAULT_SPEC, generate_stores, write_scenario
+import telemetry
+from tune_solver import candidates
+from bench_extraction import legacy_extract
+import bench_suite
+from schedule_metrics import schedule_arrays, stack, batch_metrics, result_metrics, TYPE_CODES
+from demand import parse_curve, day_demand, coverage_matrix, coverage_report
+from fastapi.testclient import TestClient
+from app import main as api
 
 def test_flex_bias():
     print("\n=== Testing FLEX Shift Bias & Strict CLOSE ===")
@@ -105,6 +138,1294 @@ def test_holiday_logic():
     else:
         print(f"FAIL: Expected {expected_hours}, got {paid_hours}")
 
+def test_template_cache():
+    print("\n=== Testing Shared Template Tables ===")
+    
+    config = {"default_open_time": "08:30", "default_close_time": "21:00"}
+    special_days = {
+        "24": {"type": "holiday_short_paid", "open": "08:30", "close": "14:00"},
+        "25": {"type": "holiday_closed"}
+    }
+    contexts = build_day_contexts(2025, 12, config, [26], special_days)
+    
+    # 1. Normal days share one table object
+    shared = contexts[1].templates is contexts[2].templates
+    print("PASS: Normal days share one template table." if shared else "FAIL: Normal days got separate tables.")
+    assert shared
+    
+    # 2. Same hours in another request hit the same cached table
+    again = get_template_table(parse_time("08:30"), parse_time("21:00"))
+    print("PASS: Repeat request reuses cached table." if again is contexts[1].templates else "FAIL: Table was rebuilt.")
+    assert again is contexts[1].templates
+    
+    # 3. Closed days (by type or by list) have no templates
+    closed = contexts[25].closed and contexts[26].closed and not contexts[25].templates
+    print("PASS: Closed holidays flagged." if closed else "FAIL: Closed holidays not flagged.")
+    assert closed
+    
+    # 4. Short day gets its own table, template ids are stable across tables
+    short = contexts[24].templates
+    print(f"Short day templates: {[t['type'] for t in short]}")
+    assert [t['type'] for t in short] == ['FIXED']
+    ids = {t['id'] for t in contexts[1].templates}
+    assert len(ids) == len(contexts[1].templates)
+    assert generate_shift_templates(1, {}, parse_time("08:30"), parse_time("21:00"))[0]['id'] == contexts[1].templates[0]['id']
+    # Ids come from the shift, not a registry: a shift shared by two tables has one id,
+    # and a rebuilt table gets the same ids without anything kept outside the cache
+    shorter = {t['id']: t for t in get_template_table(parse_time("08:30"), parse_time("20:00"))}
+    shared = [t for t in contexts[1].templates if t['id'] in shorter]
+    assert shared and all(shorter[t['id']] == t for t in shared)
+    scheduler._build_template_table.cache_clear()
+    assert [t['id'] for t in get_template_table(parse_time("08:30"), parse_time("21:00"))] == [t['id'] for t in contexts[1].templates]
+    assert not hasattr(scheduler, '_template_ids')
+    print("PASS: Template ids are unique and stable.")
+
+def test_work_index():
+    print("\n=== Testing Work Variable Index ===")
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = prepare_data(json.load(f))
+    random.seed(0)
+    ctx = build_model(data)
+    work, day_templates, index = ctx['work'], ctx['day_templates'], ctx['index']
+    days = [day for day in ctx['days'] if day_templates.get(day)]
+
+    # Every slice the constraints read, probed the plain way: each (i, day, s_idx) and template type
+    def probe(employees, days, types=None, s_idxs=None):
+        return [work[(i, day, s_idx)].Index()
+                for i in employees for day in days for s_idx, t in enumerate(day_templates[day])
+                if (i, day, s_idx) in work and (types is None or t['type'] in types)
+                and (s_idxs is None or s_idx in s_idxs)]
+
+    def ids(key, group):
+        return [var.Index() for var in index[key].get(group, [])]
+
+    employees = range(len(ctx['employees']))
+    kinds = {'OPEN': ('OPEN', 'FIXED'), 'CLOSE': ('CLOSE', 'FIXED'), 'FLEX': ('FLEX',)}
+    checked = 0
+    for day in days:
+        assert ids('day', day) == probe(employees, [day])
+        for kind, types in kinds.items():
+            assert ids('day_kind', (day, kind)) == probe(employees, [day], types)
+        for s_idx in range(len(day_templates[day])):
+            assert ids('day_template', (day, s_idx)) == probe(employees, [day], s_idxs={s_idx})
+        for i in employees:
+            assert ids('emp_day', (i, day)) == probe([i], [day])
+            for kind, types in kinds.items():
+                assert ids('emp_day_kind', (i, day, kind)) == probe([i], [day], types)
+            checked += 1
+    for i in employees:
+        for kind, types in kinds.items():
+            assert ids('emp_kind', (i, kind)) == probe([i], days, types)
+        assert ([(var.Index(), hours) for var, hours in index['emp_hours'][i]]
+                == [(work[(i, day, s_idx)].Index(), int(t['duration'] * 10))
+                    for day in days for s_idx, t in enumerate(day_templates[day]) if (i, day, s_idx) in work])
+    assert sorted((var.Index(), cost) for var, cost in index['costs']) == sorted(
+        (var.Index(), day_templates[day][s_idx]['cost']) for (i, day, s_idx), var in work.items()
+        if day_templates[day][s_idx]['cost'] > 0)
+    assert sum(len(group) for group in index['emp_day'].values()) == len(work)
+    print(f"PASS: Index matches plain lookups on {checked} employee-days ({len(work)} variables).")
+
+def test_batch_extraction():
+    print("\n=== Testing Batch Extraction ===")
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = prepare_data(json.load(f))
+    random.seed(0)
+    ctx = build_model(data)
+    hint_assignment(ctx, build_greedy_schedule(ctx)[0])
+
+    # Every improving solution, read both ways inside the callback (counted, not asserted:
+    # an exception in a callback does not reach the caller)
+    class Compare(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            super().__init__()
+            self.solutions = self.mismatches = 0
+        def OnSolutionCallback(self):
+            self.solutions += 1
+            self.mismatches += extract_solution(ctx, self) != legacy_extract(ctx, self.Value)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = 1
+    solver.parameters.max_time_in_seconds = 3.0
+    compare = Compare()
+    status = solver.Solve(ctx['model'], compare)
+    assert status in (cp_model.OPTIMAL, cp_model.FEASIBLE) and compare.solutions > 0 and compare.mismatches == 0
+
+    # And the final solution from the solver, with a short (FIXED, opens and closes) day in it
+    schedule, emp_stats = extract_solution(ctx, solver)
+    assert (schedule, emp_stats) == legacy_extract(ctx, solver.Value)
+    assert any(shift['type'] == 'FIXED' for shift in schedule['24'].values())
+    assert sum(stat['opens'] for stat in emp_stats) > 0 and sum(stat['middle'] for stat in emp_stats) > 0
+    print(f"PASS: Batch extraction matches per-variable reads on {compare.solutions} solutions.")
+
+def test_schedule_hints():
+    print("\n=== Testing Warm Start Hints ===")
+    
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": [
+            {"name": "Alice", "role": "manager", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []},
+            {"name": "Bob", "role": "assistant", "contract_type": 1.0, "unavailable_days": [4], "vacation_days": []}
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    })
+    ctx = build_model(data)
+    
+    previous = {
+        "3": {"Alice": {"start": "08:30", "end": "18:00", "type": "OPEN", "duration": 9.5}},
+        "4": {"Bob": {"start": "11:00", "end": "21:00", "type": "CLOSE", "duration": 10.0}},   # Bob is now off on day 4
+        "5": {"Zed": {"start": "11:00", "end": "21:00", "type": "CLOSE", "duration": 10.0}}    # Zed left the store
+    }
+    stats = apply_schedule_hints(ctx, previous)
+    print(f"Hint stats: {stats}")
+    
+    assert stats["previous_shifts"] == 3
+    assert stats["matched_shifts"] == 1
+    # Day 3: Alice and Bob (off) hinted; day 4: only Alice (off), Bob's shift is gone; day 5: both off
+    templates_per_day = len(ctx['day_templates'][3])
+    assert stats["hinted_variables"] == 5 * templates_per_day
+    print("PASS: Previous shifts mapped back onto work variables.")
+
+def test_result_cache():
+    print("\n=== Testing Result Cache ===")
+    
+    a = {"year": 2025, "month": 12, "weights": {"clopen": 15, "work_hours": 1000}, "solver": {"num_workers": 4}}
+    b = {"solver": {"num_workers": 4}, "weights": {"work_hours": 1000, "clopen": 15}, "month": 12, "year": 2025}
+    c = dict(a, solver={"num_workers": 8})
+    
+    assert request_key(a) == request_key(b)
+    assert request_key(a) != request_key(c)
+    # Debug only adds a report, so it shares the entry
+    assert request_key(dict(a, solver={"num_workers": 4, "debug": True})) == request_key(a)
+    print("PASS: Key ignores ordering but not solver parameters.")
+    
+    with tempfile.TemporaryDirectory() as disk_dir:
+        cache = ResultCache(max_entries=1, disk_dir=disk_dir)
+        cache.put(request_key(a), {"status": "OPTIMAL"})
+        cache.put(request_key(c), {"status": "FEASIBLE"})  # pushes a out of memory
+        
+        result, tier = cache.get(request_key(a))
+        print(f"Lookup after memory eviction: {tier}")
+        assert tier == "disk" and result["status"] == "OPTIMAL"
+        assert cache.get(request_key(a))[1] == "memory"
+        assert cache.get("missing") == (None, None)
+        
+        stats = cache.stats()
+        assert (stats["hits_disk"], stats["hits_memory"], stats["misses"]) == (1, 1, 1)
+        print("PASS: Memory and disk tiers serve cached results.")
+        
+        # The search log of a debug solve is not kept, nested (per stage, window or month) or not
+        debug = {"search_log": ["#1 0.1s best:10"] * 3}
+        cache.put(request_key(a), {"status": "OPTIMAL", "solver_profile": {"debug": True}, "debug": debug,
+                                   "stages": [{"term": "work_hours", "debug": debug}]})
+        for tier_cache in (cache, ResultCache(disk_dir=disk_dir)):
+            result, _ = tier_cache.get(request_key(a))
+            assert result == {"status": "OPTIMAL", "solver_profile": {"debug": False}, "stages": [{"term": "work_hours"}]}
+        print("PASS: Debug blocks stay out of the cache.")
+    
+    # A debug request always solves; the plain request behind it gets the cached schedule without the log
+    client = api_client()
+    body = api_request(solver=dict(api_request()["solver"], timeLimitSeconds=5, randomSeed=0))
+    debug_body = dict(body, solver=dict(body["solver"], debug=True))
+    response = client.post("/solve", json=debug_body)
+    assert response.headers["X-Cache"] == "MISS" and response.json()["debug"]["search_log"]
+    if response.json()["status"] in ("OPTIMAL", "FEASIBLE"):
+        assert client.post("/solve", json=debug_body).headers["X-Cache"] == "MISS"
+        response = client.post("/solve", json=body)
+        assert response.headers["X-Cache"] == "HIT-MEMORY" and "debug" not in response.json()
+    print("PASS: Debug requests solve, and share the cache entry without their log.")
+
+def test_rolling_horizon():
+    print("\n=== Testing Rolling Horizon ===")
+    
+    windows = plan_windows(31, 7, 3)
+    print(f"Windows: {windows}")
+    assert windows[0] == (1, 7, 10)
+    assert windows[-1] == (29, 31, 31)
+    # Committed ranges tile the month exactly once
+    assert [d for first, commit, _ in windows for d in range(first, commit + 1)] == list(range(1, 32))
+    
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": [
+            {"name": "Alice", "role": "manager", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []},
+            {"name": "Bob", "role": "manager", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []},
+            {"name": "Cara", "role": "assistant", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []}
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    })
+    day_contexts = build_day_contexts(2025, 2, data['config'], [], {})
+    close = next(t for t in day_contexts[7].templates if t['type'] == 'CLOSE')
+    opener = next(t for t in day_contexts[6].templates if t['type'] == 'OPEN')
+    # Alice closed days 4-7 in the previous window, Bob opened on day 6
+    committed = {(0, day): close for day in range(4, 8)}
+    committed[(1, 6)] = opener
+    carry_in = build_carry_in(data['employees'], day_contexts, committed, {0: 0, 1: 0, 2: 0}, 8, 17, 28)
+    print(f"Alice carry-in: {carry_in[0]}")
+    assert carry_in[0]["closed_before"] and all(carry_in[0]["worked_before"].values())
+    assert carry_in[0]["hours_target"] < carry_in[1]["hours_target"] < carry_in[2]["hours_target"]
+    # Each employee's own opens count against their target, nobody else's
+    assert carry_in[1]["open_target"] < carry_in[2]["open_target"] == carry_in[0]["open_target"]
+    
+    ctx = build_model(data, days=range(8, 18), carry_in=carry_in, staff_reqs={day: 2 for day in range(1, 29)})
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 10.0
+    status = solver.Solve(ctx['model'])
+    assert status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    
+    assignment = read_assignment(ctx, solver)
+    # A fifth day in a row (and an open after her close) would cross the window boundary
+    assert (0, 8) not in assignment
+    
+    # Windows are hinted from the greedy schedule; one that finds nothing in time keeps it
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_medium.json')) as f:
+        medium = json.load(f)
+    random.seed(0)
+    result = solve_schedule(medium, solver_profile={"mode": "rolling", "time_limit_seconds": 0.05, "num_workers": 1})
+    windows = result['decomposition']['windows']
+    print(f"Rolling with no time: {result['status']} ({result['solver_status']}), windows {[w['status'] for w in windows]}")
+    assert result['status'] == 'FALLBACK' and result['solver_status'] == 'UNKNOWN'
+    assert result['greedy']['used_as_fallback'] and all(w.get('used_greedy') for w in windows)
+    assert len(result['employees']) == len(medium['employees'])
+    open_days = [d for d, dc in build_day_contexts(medium['year'], medium['month'], medium['config'],
+                                                   medium.get('closed_holidays', []), medium.get('special_days', {})).items()
+                 if not dc.closed]
+    assert len(result['schedule']) == len(open_days)
+    print("PASS: Window boundaries respect the 4-in-5 rule and earlier hours.")
+
+def test_employee_classes():
+    print("\n=== Testing Employee Class Aggregation ===")
+    
+    employees = [{"name": f"M{n}", "role": "manager", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []} for n in range(3)]
+    employees += [{"name": f"A{n}", "role": "assistant", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []} for n in range(4)]
+    employees.append({"name": "Off", "role": "assistant", "contract_type": 1.0, "unavailable_days": [10], "vacation_days": []})
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": employees,
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    })
+    
+    classes = employee_classes(data['employees'])
+    print(f"Classes: {classes}")
+    assert classes == [[0, 1, 2], [3, 4, 5, 6], [7]]
+    
+    ctx = build_class_model(data, classes)
+    # One counter per class instead of one variable per employee
+    assert len(ctx['counts']) < len(data['employees']) * 28 * len(ctx['day_templates'][3]) / 2
+    
+    # The greedy schedule hints each counter with how many of the class it puts on that shift
+    greedy, _ = build_greedy_schedule(ctx)
+    hint_counts(ctx, greedy)
+    hint = ctx['model'].Proto().solution_hint
+    assert len(hint.vars) == len(ctx['counts'])
+    assert sum(hint.values) == len(greedy)
+    
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 5.0
+    status = solver.Solve(ctx['model'])
+    assert status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    
+    assignment, stats = disaggregate(ctx, solver.Value)
+    print(f"Disaggregation: {stats}")
+    assert stats["consecutive_violations"] == 0
+    # Every counted shift went to exactly one member of its class
+    for (c, day, s_idx), var in ctx['counts'].items():
+        given = sum(1 for i in classes[c] if assignment.get((i, day)) is ctx['day_templates'][day][s_idx])
+        assert given == solver.Value(var)
+    for i in range(len(employees)):
+        streak = 0
+        for day in range(1, 29):
+            streak = streak + 1 if (i, day) in assignment else 0
+            assert streak <= 4
+    print("PASS: Class counts split into individual rosters within the 4-in-5 rule.")
+
+def test_compact_encoding():
+    print("\n=== Testing Compact Encoding ===")
+    
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": [
+            {"name": f"E{k}", "role": "manager" if k < 2 else "assistant", "contract_type": [1.0, 0.75, 0.5][k % 3],
+             "unavailable_days": [k + 3], "vacation_days": []}
+            for k in range(4)
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    })
+    staff_reqs = {day: 2 for day in range(1, 29)}
+    
+    results = {}
+    for compact in (False, True):
+        ctx = build_model(data, days=range(1, 11), staff_reqs=staff_reqs, compact=compact)
+        solver = cp_model.CpSolver()
+        solver.parameters.num_workers = 1
+        solver.parameters.max_time_in_seconds = 30.0
+        status = solver.Solve(ctx['model'])
+        assert status == cp_model.OPTIMAL
+        results[compact] = (model_size(ctx['model']), solver.ObjectiveValue())
+        print(f"compact={compact}: {results[compact]}")
+    
+    (standard_size, standard_obj), (compact_size, compact_obj) = results[False], results[True]
+    assert compact_obj == standard_obj
+    assert compact_size["variables"] < standard_size["variables"]
+    assert compact_size["constraints"] < standard_size["constraints"]
+    print("PASS: Compact encoding reaches the same optimum with a smaller model.")
+
+def test_template_pruning():
+    print("\n=== Testing Template Pruning ===")
+    
+    kept, pruned = get_pruned_template_table(8.5, 21.0, pruning=TemplatePruning(True, None))
+    print(f"Dominance: kept {len(kept)}, dropped {len(pruned)}")
+    # One template per (type, duration), the cheapest
+    assert len({(t['type'], t['duration']) for t in kept}) == len(kept)
+    assert all(reason == 'dominated' for _, reason in pruned)
+    
+    kept, pruned = get_pruned_template_table(8.5, 21.0, pruning=TemplatePruning(False, 20))
+    assert {t['type'] for t in kept} == {'OPEN', 'CLOSE', 'FLEX'}
+    assert all(t['cost'] > 20 for t, _ in pruned)
+    
+    # Dominance pruning is lossless: same optimum, fewer variables
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": [
+            {"name": f"E{k}", "role": "manager" if k < 2 else "assistant", "contract_type": [1.0, 0.75, 0.5][k % 3],
+             "unavailable_days": [k + 3], "vacation_days": []}
+            for k in range(4)
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    })
+    results = {}
+    for pruning in (None, TemplatePruning(True, None)):
+        ctx = build_model(data, days=range(1, 11), staff_reqs={day: 2 for day in range(1, 29)}, pruning=pruning)
+        solver = cp_model.CpSolver()
+        solver.parameters.num_workers = 1
+        solver.parameters.max_time_in_seconds = 30.0
+        assert solver.Solve(ctx['model']) == cp_model.OPTIMAL
+        results[pruning] = (len(ctx['work']), solver.ObjectiveValue())
+        print(f"pruning={pruning}: {results[pruning]}")
+    assert results[None][1] == results[TemplatePruning(True, None)][1]
+    assert results[TemplatePruning(True, None)][0] < results[None][0]
+    
+    # One employee needed every day breaks the 4-in-5 rule: the pruned model is infeasible
+    # and the solve falls back to the full tables (which are infeasible too)
+    result = solve_schedule({
+        "year": 2025, "month": 2,
+        "employees": [{"name": "Solo", "role": "manager", "contract_type": 1.0, "unavailable_days": [], "vacation_days": []}],
+        "special_days": {str(day): {"staff": 1} for day in range(1, 29)},
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"}
+    }, solver_profile={"template_cost_ceiling": 0, "num_workers": 1, "time_limit_seconds": 10})
+    print(f"Fallback: status {result['status']}, pruning {result['pruning']['templates_before']} -> "
+          f"{result['pruning']['templates_after']}, fallback {result['pruning']['fallback']}")
+    assert result['status'] == 'INFEASIBLE'
+    assert result['pruning']['fallback'] is True
+    print("PASS: Pruning keeps the optimum and falls back when infeasible.")
+
+def test_greedy_schedule():
+    print("\n=== Testing Greedy Schedule ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_medium.json')) as f:
+        data = prepare_data(json.load(f))
+    random.seed(0)
+    ctx = build_model(data)
+    
+    assignment, stats = build_greedy_schedule(ctx)
+    print(f"Greedy: {len(assignment)} shifts, {stats}")
+    assert stats["understaffed_slots"] == 0
+    assert stats["build_time_seconds"] < 1.0
+    
+    # Every hard constraint holds: fixing the work variables to it leaves a feasible model
+    model = ctx['model']
+    for (i, day, s_idx), var in ctx['work'].items():
+        model.Add(var == int(assignment.get((i, day)) is ctx['day_templates'][day][s_idx]))
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 10.0
+    assert solver.Solve(model) in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    
+    # No time to find anything: the greedy schedule comes back, labelled
+    with open(os.path.join(base_dir, 'tests', 'data_medium.json')) as f:
+        data = json.load(f)
+    random.seed(0)
+    result = solve_schedule(data, solver_profile={"time_limit_seconds": 0.01, "num_workers": 1})
+    print(f"Status {result['status']} ({result['solver_status']}), greedy: {result['greedy']}")
+    assert result['status'] == 'FALLBACK' and result['solver_status'] == 'UNKNOWN'
+    assert result['greedy']['used_as_fallback']
+    assert len(result['employees']) == len(data['employees'])
+    
+    # Time running out around the first solution (data_small needs about 0.8s on one core):
+    # with repair_hint on, OR-Tools aborted the process instead. In a child process, so an
+    # abort fails this test rather than the whole run.
+    script = (
+        "import sys, json, random; sys.path.insert(0, 'app'); import scheduler\n"
+        "for limit in (0.7, 0.75, 0.78, 0.8):\n"
+        "    random.seed(0)\n"
+        "    data = json.load(open('tests/data_small.json'))\n"
+        "    result = scheduler.solve_schedule(data, {'time_limit_seconds': limit, 'num_workers': 1, 'random_seed': 0})\n"
+        "    print('STATUS', result['status'])\n"
+    )
+    child = subprocess.run([sys.executable, "-c", script], cwd=base_dir, capture_output=True, text=True, timeout=300)
+    statuses = [line.split()[1] for line in child.stdout.splitlines() if line.startswith("STATUS ")]
+    print(f"Short limits: {statuses} (exit code {child.returncode})")
+    assert child.returncode == 0, child.stderr[-2000:]
+    assert len(statuses) == 4 and set(statuses) <= {"OPTIMAL", "FEASIBLE", "FALLBACK"}
+    print("PASS: Greedy schedule is feasible and returned when the solver finds nothing.")
+
+def test_local_search():
+    print("\n=== Testing Local Search ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = prepare_data(json.load(f))
+    random.seed(0)
+    ctx = build_model(data)
+    
+    start, _ = build_greedy_schedule(ctx)
+    state = ScheduleState(ctx)
+    state.load(start)
+    best, stats = anneal(state, 300, random.Random(0))
+    assignment = state.to_assignment()
+    score = evaluate_assignment(ctx, assignment)
+    print(f"Local search: {stats}, score {score}")
+    assert score["staffing_violations"] == 0
+    assert best == score["objective"] == state.energy()
+    assert score["objective"] < evaluate_assignment(ctx, start)["objective"]
+    
+    # Same objective as the CP-SAT model, and every hard constraint holds: fix the model to it
+    model = ctx['model']
+    for (i, day, s_idx), var in ctx['work'].items():
+        model.Add(var == int(assignment.get((i, day)) is ctx['day_templates'][day][s_idx]))
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 10.0
+    assert solver.Solve(model) == cp_model.OPTIMAL
+    assert round(solver.ObjectiveValue()) == score["objective"]
+    
+    # Through solve_schedule: same result shape, within the millisecond budget
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = json.load(f)
+    random.seed(0)
+    result = solve_schedule(data, solver_profile={"engine": "local_search", "local_search_ms": 200})
+    print(f"Status {result['status']} ({result['solver_status']}) in {result['solve_time_seconds']:.2f}s")
+    assert result['status'] == 'FEASIBLE' and result['solver_status'] == 'LOCAL_SEARCH'
+    assert result['solve_time_seconds'] < 1.0
+    assert len(result['employees']) == len(data['employees'])
+    print("PASS: Local search keeps the hard rules and scores schedules like the CP-SAT objective.")
+
+def test_staged_objective():
+    print("\n=== Testing Staged Objective ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = prepare_data(json.load(f))
+    random.seed(0)
+    ctx = build_model(data)
+    profile = get_solver_profile(data, {"objective": "staged", "time_limit_seconds": 10.0,
+                                        "num_workers": 1, "random_seed": 0})
+    
+    solver, status, _, _, _, stages = solve_staged(ctx, data, profile)
+    for stage in stages:
+        print(f"  {stage['name']:<20} {stage['status']:<9} {stage['solve_time_seconds']:.2f}s "
+              f"objective {stage['objective_value']} bound {stage['best_bound']} locked at {stage['locked_at']}")
+    assert status == cp_model.FEASIBLE
+    assert [stage['name'] for stage in stages] == [name for name, _ in ctx['objective_terms']]
+    
+    # The final schedule keeps every earlier stage within its lock
+    for (name, term), stage in zip(ctx['objective_terms'], stages):
+        assert stage['locked_at'] >= stage['objective_value']
+        assert solver.Value(term) <= stage['locked_at']
+    
+    # Unknown objectives are rejected; staged only runs on the full CP-SAT model
+    for bad in ({"objective": "pareto"}, {"objective": "staged", "mode": "rolling"}):
+        try:
+            get_solver_profile(data, bad)
+            assert False, f"accepted {bad}"
+        except ValueError:
+            pass
+    print("PASS: Staged objective locks each term before minimising the next.")
+
+def test_scenario_generator():
+    print("\n=== Testing Scenario Generator ===")
+    
+    spec = DEFAULT_SPEC._replace(year=2026, month=2, employees=(300, 500), vacation_pattern='clustered')
+    with tempfile.TemporaryDirectory() as tmp:
+        contents = []
+        for run in range(2):
+            path = os.path.join(tmp, f'run{run}.json')
+            write_scenario(generate_stores(7, stores=3, spec=spec), path)
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+    assert contents[0] == contents[1], "same seed must write byte-identical files"
+    
+    stores = generate_stores(7, stores=3, spec=spec)
+    assert stores != generate_stores(8, stores=3, spec=spec)
+    # A store does not depend on how many stores were generated after it
+    assert stores[0] == generate_stores(7, stores=1, spec=spec)[0]
+    
+    for data in stores:
+        employees = data['employees']
+        days = [d for emp in employees for d in emp['unavailable_days'] + emp['vacation_days']]
+        print(f"Store: {len(employees)} employees, {data['full_time_hours']}h full time, days {min(days)}-{max(days)}")
+        assert 300 <= len(employees) <= 500
+        assert len({emp['name'] for emp in employees}) == len(employees)
+        assert 1 <= min(days) and max(days) <= 28
+        assert employees[0]['role'] == 'manager' and employees[0]['contract_type'] == 1.0
+        assert data['special_days'] == {} and data['full_time_hours'] == 160
+    
+    tiny = generate_stores(1, spec=DEFAULT_SPEC._replace(employees=3))[0]
+    assert [emp['role'] for emp in tiny['employees']].count('manager') == 1
+    print("PASS: Generator is reproducible per seed and scales to 500 employees.")
+
+def test_bench_suite():
+    print("\n=== Testing Benchmark Suite ===")
+
+    # The script end to end on its smallest scenario, recording a baseline in a temp dir
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_path = os.path.join(tmp, 'baseline.json')
+        run = subprocess.run([sys.executable, os.path.join(base_dir, 'tests', 'bench_suite.py'),
+                              '--scenarios', 'small', '--time-limit', '2', '--baseline', baseline_path,
+                              '--update-baseline'],
+                             capture_output=True, text=True, timeout=300, cwd=base_dir)
+        assert run.returncode == 0, run.stdout + run.stderr
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    print(run.stdout.strip().splitlines()[-1])
+    assert baseline['settings'] == {"time_limit_seconds": 2.0, "num_workers": 1, "seed": 0}
+    [small] = baseline['runs']
+    assert small['scenario'] == 'small' and small['status'] in bench_suite.SOLVED
+    assert small['variables'] > 0 and small['quality'] and 'result' not in small
+
+    # The gate: a run matches its own baseline, and a clearly worse one regresses
+    assert bench_suite.compare(baseline['runs'], baseline, bench_suite.THRESHOLDS) == []
+    worse = dict(small, variables=small['variables'] * 2, status='UNKNOWN')
+    assert bench_suite.compare([worse], baseline, bench_suite.THRESHOLDS) == [('small', 'status', small['status'], 'UNKNOWN')]
+    worse['status'] = small['status']
+    assert bench_suite.compare([worse], baseline, bench_suite.THRESHOLDS) == [
+        ('small', 'variables', small['variables'], small['variables'] * 2)]
+    print("PASS: Benchmark suite runs a scenario, records a baseline and flags regressions.")
+
+def test_telemetry():
+    print("\n=== Testing Timings and Metrics ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = json.load(f)
+    
+    solves = {status: telemetry.SOLVES.value(status=status, mode="full", engine="cpsat")
+              for status in ("OPTIMAL", "FEASIBLE", "FALLBACK")}
+    random.seed(0)
+    result = solve_schedule(data, solver_profile={"time_limit_seconds": 2.0, "num_workers": 1, "random_seed": 0})
+    timings = result['timings']
+    for phase, seconds in timings.items():
+        print(f"  {phase:<32} {seconds * 1000:8.1f} ms")
+    for phase in ("prepare_data", "template_generation", "staffing_allocation", "variable_creation",
+                  "constraints.one_shift_per_day", "constraints.daily_staffing", "constraints.consecutive_days",
+                  "constraints.clopen", "constraints.fairness", "objective", "warm_start", "solve", "extraction"):
+        assert phase in timings, f"missing phase {phase}"
+    assert sum(seconds for phase, seconds in timings.items() if phase != "total") <= timings['total']
+    assert timings['solve'] >= result['solve_time_seconds'] * 0.5
+    
+    assert result['status'] in solves
+    assert telemetry.SOLVES.value(status=result['status'], mode="full", engine="cpsat") == solves[result['status']] + 1
+    assert telemetry.SOLVES_IN_FLIGHT.value() == 0
+    
+    # Histograms render cumulative buckets ending in +Inf, with label values escaped
+    histogram = telemetry.Histogram("test_seconds", "Test.", (1, 5), ("name",))
+    for value in (0.5, 2, 7):
+        histogram.observe(value, name='a"b')
+    lines = histogram.render()
+    assert 'test_seconds_bucket{name="a\\"b",le="1"} 1' in lines
+    assert 'test_seconds_bucket{name="a\\"b",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{name="a\\"b"} 3' in lines
+    
+    text = telemetry.REGISTRY.render()
+    for name in ("scheduler_http_request_duration_seconds", "scheduler_solves_total",
+                 "scheduler_phase_duration_seconds_bucket", "scheduler_model_variables", "scheduler_solves_in_flight"):
+        assert f"{name}" in text, f"missing metric {name}"
+    print("PASS: Solves report per-phase timings and feed the metrics registry.")
+
+def test_search_debug():
+    print("\n=== Testing Search Log Capture ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = json.load(f)
+    
+    random.seed(0)
+    # The first solution takes about 2s on one core
+    result = solve_schedule(data, solver_profile={"time_limit_seconds": 5.0, "num_workers": 1,
+                                                  "random_seed": 0, "debug": True})
+    debug = result['debug']
+    presolve = debug['presolve']
+    print(f"Presolve: {presolve['variables_before']} -> {presolve['variables_after']} variables, "
+          f"{presolve['constraints_before']} -> {presolve['constraints_after']} constraints, "
+          f"{presolve['rules_applied']} rule applications")
+    print(f"{debug['solutions_found']} solution(s), best from {debug['best_solution_subsolver']}, "
+          f"{debug['conflicts']} conflicts, {debug['branches']} branches, {len(debug['search_log'])} log lines")
+    
+    assert result['status'] in ("OPTIMAL", "FEASIBLE")
+    # The log describes the model we built
+    assert presolve['variables_before'] == result['model']['variables']
+    assert presolve['constraints_before'] == result['model']['constraints']
+    assert presolve['variables_after'] <= presolve['variables_before']
+    assert debug['solutions_found'] >= 1 and debug['best_solution_subsolver']
+    assert debug['solutions'][-1]['objective'] == result['objective_value']
+    assert debug['response_stats'].startswith("CpSolverResponse summary")
+    assert len(debug['search_log']) <= search_stats.SEARCH_LOG_LINES
+    
+    # Only the tail of the raw log is kept, the rest is counted
+    model = cp_model.CpModel()
+    model.Minimize(model.NewIntVar(0, 10, 'x'))
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = 1
+    search_stats.capture_search_log(solver)
+    solver.Solve(model)
+    full = search_stats.summarize(solver)
+    limit, search_stats.SEARCH_LOG_LINES = search_stats.SEARCH_LOG_LINES, 20
+    try:
+        capped = search_stats.summarize(solver)
+    finally:
+        search_stats.SEARCH_LOG_LINES = limit
+    print(f"Capped log: kept {len(capped['search_log'])} of {len(full['search_log'])} lines")
+    assert full['search_log_dropped'] == 0 and len(full['search_log']) > 20
+    assert capped['search_log'] == full['search_log'][-20:]
+    assert capped['search_log_dropped'] == len(full['search_log']) - 20
+    assert capped['presolve'] == full['presolve']
+    
+    random.seed(0)
+    result = solve_schedule(data, solver_profile={"time_limit_seconds": 1.0, "num_workers": 1})
+    assert 'debug' not in result
+    print("PASS: Debug solves return the search log and statistics.")
+
+def test_solver_presets():
+    print("\n=== Testing Solver Presets ===")
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(base_dir, 'tests', 'data_small.json')) as f:
+        data = prepare_data(json.load(f))
+    assert size_class(5, 31) == "e10_d31" and size_class(25, 31) == "e30_d31" and size_class(500, 120) == "emax_dmax"
+    
+    presets = {"presets": {"e10_d31": {"num_workers": 2, "sat_parameters": {
+        "linearization_level": 2, "search_branching": "FIXED_SEARCH"}}}}
+    previous = os.environ.get('SCHEDULER_SOLVER_PRESETS')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'presets.json')
+        with open(path, 'w') as f:
+            json.dump(presets, f)
+        os.environ['SCHEDULER_SOLVER_PRESETS'] = path
+        try:
+            profile = get_solver_profile(data)
+            print(f"Size class {profile['size_class']}: {profile['num_workers']} workers, {profile['sat_parameters']}")
+            assert profile['preset_applied'] and profile['num_workers'] == 2
+            assert profile['sat_parameters'] == presets['presets']['e10_d31']['sat_parameters']
+            
+            # The request's own settings win; presets can be turned off
+            profile = get_solver_profile(data, {"num_workers": 1, "sat_parameters": {"linearization_level": 0}})
+            assert profile['num_workers'] == 1
+            assert profile['sat_parameters'] == {"linearization_level": 0, "search_branching": "FIXED_SEARCH"}
+            profile = get_solver_profile(data, {"presets": False})
+            assert not profile['preset_applied'] and profile['sat_parameters'] == {}
+            
+            solver = cp_model.CpSolver()
+            apply_solver_profile(solver, get_solver_profile(data, {"time_limit_seconds": 7}), 1)
+            assert solver.parameters.linearization_level == 2 and solver.parameters.max_time_in_seconds == 7
+            assert solver.parameters.num_workers == 1
+            
+            # A bad parameter fails when the profile is resolved
+            presets['presets']['e10_d31']['sat_parameters'] = {"no_such_parameter": 1}
+            with open(path, 'w') as f:
+                json.dump(presets, f)
+            os.utime(path, (time.time() + 5, time.time() + 5))
+            try:
+                get_solver_profile(data)
+                assert False, "accepted an unknown CP-SAT parameter"
+            except ValueError:
+                pass
+        finally:
+            if previous is None:
+                del os.environ['SCHEDULER_SOLVER_PRESETS']
+            else:
+                os.environ['SCHEDULER_SOLVER_PRESETS'] = previous
+    
+    # The tuner always measures the defaults first, and draws the same candidates per seed
+    drawn = candidates(4, 2, random.Random(0))
+    assert drawn[0] == {} and len(drawn) == 5 and drawn == candidates(4, 2, random.Random(0))
+    assert all(candidate['num_workers'] <= 2 for candidate in drawn[1:])
+    print("PASS: Presets are picked by size class and request settings override them.")
+
+def test_planning_horizon():
+    print("\n=== Testing Planning Horizon ===")
+    
+    start = datetime.date(2025, 1, 27)
+    assert plan_segments(start, 10) == [(2025, 1, 27, 31), (2025, 2, 1, 5)]
+    assert plan_segments(datetime.date(2026, 1, 1), 90)[-1] == (2026, 3, 1, 31)
+    
+    names = ["Alice", "Bob", "Cara", "Dan", "Erin", "Finn"]
+    data = {
+        "employees": [
+            {"name": name, "role": "manager" if k < 2 else "assistant", "contract_type": 1.0,
+             "unavailable_days": [], "vacation_days": []}
+            for k, name in enumerate(names)
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"},
+        "horizon": {"start": "2025-01-27", "days": 10},
+        # Alice worked the last four days, Bob closed the last day and is 16h short
+        "carry_over": {
+            "Alice": {"trailing_worked_days": 4, "last_shift_type": "CLOSE", "hours_balance": 0},
+            "Bob": {"trailing_worked_days": 1, "last_shift_type": "CLOSE", "hours_balance": -16},
+        },
+    }
+    
+    # Dated entries land in their own month; plain numbers are days of the start month
+    dated = dict(data, closed_holidays=["2025-02-03", 30], full_time_hours={"2025-02": 150})
+    dated['employees'] = [dict(data['employees'][0], vacation_days=["2025-02-04"])]
+    february = month_data(dated, start, 2025, 2)
+    assert february['closed_holidays'] == [3] and february['employees'][0]['vacation_days'] == [4]
+    assert february['employees'][0]['hours_fund'] == 150
+    january = month_data(dated, start, 2025, 1)
+    assert january['closed_holidays'] == [30] and january['full_time_hours'] == 8 * 23
+    
+    carry_in = carry_in_from_state(data['employees'], data['carry_over'], 1, {i: 100 for i in range(6)})
+    assert all(carry_in[0]['worked_before'][d] for d in range(-3, 1)) and carry_in[0]['closed_before']
+    assert carry_in[1]['worked_before'] == {0: True, -1: False, -2: False, -3: False}
+    assert carry_in[1]['hours_target'] == 116 and 'hours_target' not in carry_in[0]
+    
+    random.seed(0)
+    result = solve_schedule(json.loads(json.dumps(data)), solver_profile={"time_limit_seconds": 20, "num_workers": 1})
+    segments = result['horizon']['segments']
+    print(f"Status {result['status']}, segments {[(s['month'], s['first_day'], s['last_day'], s['status']) for s in segments]}")
+    assert result['status'] in ('OPTIMAL', 'FEASIBLE')
+    assert sorted(result['schedule']) == [(start + datetime.timedelta(days=k)).isoformat() for k in range(10)]
+    first_day = result['schedule']['2025-01-27']
+    # A fifth day in a row, or an open after a close, would break the rules across the boundary
+    assert 'Alice' not in first_day
+    assert first_day.get('Bob', {}).get('type') != 'OPEN'
+    stats = {stat['name']: stat for stat in result['employees']}
+    assert stats['Bob']['worked'] > stats['Cara']['worked']
+    
+    # The state it hands on picks up where the schedule ends
+    carry_over = result['carry_over']
+    print(f"Carry-over: {carry_over['Bob']}")
+    last_day = result['schedule']['2025-02-05']
+    for name in names:
+        assert (carry_over[name]['last_shift_type'] is not None) == (name in last_day)
+    assert abs(carry_over['Bob']['hours_balance'] - (stats['Bob']['diff'] - 16)) < 1e-6
+
+    # The result's schedule warm-starts a re-solve: each month is hinted with its own days
+    assert month_data(dict(data, previous_schedule=result['schedule']), start, 2025, 2)['previous_schedule'] == {
+        str(day): result['schedule'][f"2025-02-0{day}"] for day in range(1, 6)}
+    random.seed(0)
+    rerun = solve_schedule(dict(json.loads(json.dumps(data)), previous_schedule=result['schedule']),
+                           solver_profile={"time_limit_seconds": 20, "num_workers": 1})
+    shifts = sum(len(day) for day in result['schedule'].values())
+    print(f"Warm start hints: {rerun['hints']}")
+    assert rerun['hints']['previous_shifts'] == shifts and rerun['hints']['matched_shifts'] == shifts
+
+    # Cancelled after the first month: January stands, February is never solved
+    stop = threading.Event()
+    solve_built = horizon.scheduler._solve_built_model
+    def solve_then_cancel(*args, **kwargs):
+        outcome = solve_built(*args, **kwargs)
+        stop.set()
+        return outcome
+    horizon.scheduler._solve_built_model = solve_then_cancel
+    try:
+        random.seed(0)
+        partial = solve_schedule(json.loads(json.dumps(data)), solver_profile={"time_limit_seconds": 20, "num_workers": 1},
+                                 stop_event=stop)
+    finally:
+        horizon.scheduler._solve_built_model = solve_built
+    print(f"Cancelled: {partial['status']}, through {partial['horizon'].get('solved_through')}")
+    assert partial['status'] == 'PARTIAL' and partial['horizon']['solved_through'] == '2025-01-31'
+    assert [s['month'] for s in partial['horizon']['segments']] == [1]
+    assert sorted(partial['schedule']) == [f"2025-01-{day}" for day in range(27, 32)]
+    assert set(partial['carry_over']) == set(names) and partial['employees']
+
+    try:
+        solve_schedule(dict(data, horizon={"start": "2025-01-01", "days": 120}))
+        assert False, "accepted a horizon longer than a quarter"
+    except ValueError:
+        pass
+    print("PASS: Horizons split at month ends and carry state across them.")
+
+def test_availability_matrix():
+    print("\n=== Testing Availability Matrix ===")
+    
+    employees = [
+        {"name": "Alice", "hours_fund": 160, "unavailable_days": [3, 4], "vacation_days": [10]},
+        {"name": "Bob", "hours_fund": 160, "unavailable_days": [4], "vacation_days": []},
+        # Days outside the month are ignored
+        {"name": "Cara", "hours_fund": 160, "unavailable_days": [0, 29, 31], "vacation_days": [4]},
+    ]
+    availability = availability_matrix(employees, 28)
+    assert availability.shape == (3, 29) and not availability[:, 0].any()
+    assert not availability[0, 3] and not availability[0, 10] and availability[0, 5]
+    assert availability[2].sum() == 27
+    
+    per_day = availability.sum(axis=0)
+    print(f"Available on days 1-5: {per_day[1:6].tolist()}")
+    assert per_day[4] == 0 and per_day[3] == 2 and per_day[1] == 3
+    
+    staffing = resolve_day_staffing(4, per_day[4], {4: 2}, {}, {})
+    assert staffing['req_staff'] == 0 and staffing['understaffed'] == {"needed": 2, "available": 0, "deficit": 2}
+    
+    # The allocation is the same whether the matrix is passed in or built from the employees
+    random.seed(0)
+    given = calculate_monthly_staffing(employees, 2025, 2, {}, {}, availability)
+    random.seed(0)
+    assert calculate_monthly_staffing(employees, 2025, 2, {}, {}) == given
+    # Extra shifts go to days with room first: nobody can work day 4, so it gets none
+    assert given[4] == min(given.values()) < max(given.values())
+    print("PASS: Availability is one matrix; counts are its column sums.")
+
+def test_schedule_metrics():
+    print("\n=== Testing Schedule Metrics ===")
+    
+    def shift(kind, start, end):
+        return {"start": start, "end": end, "type": kind, "duration": parse_time(end) - parse_time(start)}
+    
+    # Day 3 is closed (not in the schedule); Bob closes day 1 and opens day 2, a clopen
+    result = {
+        "schedule": {
+            "1": {"Alice": shift("OPEN", "08:00", "16:00"), "Bob": shift("CLOSE", "12:00", "20:00")},
+            "2": {"Alice": shift("FLEX", "10:00", "18:00"), "Bob": shift("FIXED", "08:00", "14:00")},
+            "4": {"Alice": shift("CLOSE", "12:00", "20:00"), "Bob": shift("FLEX", "09:00", "17:00")},
+        },
+        "employees": [{"name": "Alice", "diff": -4.0}, {"name": "Bob", "diff": 2.0}],
+        "understaffed": [{"day": 4, "deficit": 1}],
+    }
+    arrays = schedule_arrays(result)
+    assert arrays.type.shape == (2, 4) and arrays.days == ["1", "2", None, "4"]
+    assert arrays.type[1, 1] == TYPE_CODES['FIXED'] and arrays.type[:, 2].sum() == 0
+    assert arrays.start[1, 3] == 9.0 and arrays.duration[0, 0] == 8.0
+    
+    metrics = result_metrics(result)
+    print(f"Metrics: {metrics}")
+    assert metrics['mean_abs_diff'] == 3.0 and metrics['max_abs_diff'] == 4.0
+    assert (metrics['opens_min'], metrics['opens_max'], metrics['closes_spread']) == (1, 1, 1)
+    # Bob's FIXED on day 2 also closes, but day 3 is closed: only the day 1 -> 2 clopen counts
+    assert metrics['clopens'] == 1
+    assert (metrics['flex_shifts'], metrics['golden_flex'], metrics['golden_flex_share']) == (2, 1, 0.5)
+    assert metrics['understaffed_days'] == 1 and metrics['total_deficit'] == 1.0
+    
+    # A horizon (ISO dates) and a larger roster stack with the month: padding changes nothing
+    horizon = {
+        "schedule": {"2026-01-31": {"Cara": shift("CLOSE", "12:00", "20:00")},
+                     "2026-02-01": {"Cara": shift("OPEN", "08:00", "16:00"), "Dan": shift("OPEN", "08:00", "14:00")}},
+        "employees": [{"name": "Cara", "diff": 1.0}, {"name": "Dan", "diff": 0.0}, {"name": "Eve", "diff": -1.0}],
+        "understaffed": [],
+    }
+    batch = stack([result, horizon, {"schedule": {}, "employees": [], "understaffed": []}])
+    assert batch.type.shape == (3, 3, 4)
+    together = batch_metrics(batch)
+    assert together['clopens'].tolist() == [1, 1, 0]
+    assert together['opens_min'].tolist() == [1, 0, 0] and together['opens_max'].tolist() == [1, 1, 0]
+    assert result_metrics(horizon) == {name: values[1].item() if name != 'golden_flex_share' else None
+                                       for name, values in together.items()}
+    print("PASS: Metrics come from employee x day arrays, one schedule or many at once.")
+
+def test_demand_coverage():
+    print("\n=== Testing Demand Coverage ===")
+    
+    # Overlapping entries take the larger figure; slot k runs from k/2 to (k + 1)/2 hours
+    required = parse_curve([{"start": "09:00", "end": "13:00", "staff": 1}, {"start": "12:00", "end": "14:30", "staff": 2}])
+    assert required[18:24].tolist() == [1] * 6 and required[24:29].tolist() == [2] * 5
+    assert required.sum() == 16 and required[29] == 0
+    for bad in ({"start": "09:15", "end": "12:00", "staff": 1}, {"start": "12:00", "end": "09:00", "staff": 1}):
+        try:
+            parse_curve([bad])
+            assert False, f"{bad} should be rejected"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+    
+    # Coverage matrix: a template covers the slots inside its hours; same hours, same matrix
+    day_contexts = build_day_contexts(2025, 2, {"default_open_time": "08:30", "default_close_time": "21:00"},
+                                      [10], {"14": {"open": "10:00", "close": "16:00"}})
+    templates = day_contexts[3].templates
+    matrix = coverage_matrix(templates)
+    assert matrix.shape == (len(templates), 48)
+    first = templates[0]
+    assert matrix[0].sum() == (first['end'] - first['start']) * 2 and matrix[0, int(first['start'] * 2)]
+    assert coverage_matrix(list(day_contexts[4].templates)) is matrix
+    
+    # A day's own curve, then its weekday's, then the default; closed days and closed hours drop out
+    demand = {
+        "default": [{"start": "08:00", "end": "21:00", "staff": 1}],
+        "weekdays": {"sat": [{"start": "09:00", "end": "18:00", "staff": 3}], "sun": []},
+        "days": {"3": [{"start": "12:00", "end": "13:00", "staff": 2}]},
+    }
+    by_day = day_demand(demand, day_contexts, sorted(day_contexts))
+    assert by_day[3].sum() == 4 and by_day[1].sum() == 9 * 2 * 3  # Feb 1 2025 is a Saturday
+    assert 2 not in by_day and 10 not in by_day  # Sunday (empty curve), closed holiday
+    assert by_day[4][:17].sum() == 0 and by_day[4].sum() == 25  # from 08:30 (opening), not 08:00
+    assert by_day[14].sum() == 12  # short day, 10:00-16:00
+    
+    # The model covers what it can; the shortfall it reports matches the schedule's
+    data = prepare_data({
+        "year": 2025, "month": 2,
+        "employees": [
+            {"name": f"E{k}", "role": "manager" if k < 2 else "assistant", "contract_type": 1.0,
+             "unavailable_days": [], "vacation_days": []}
+            for k in range(4)
+        ],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"},
+        "demand": {"default": [{"start": "08:30", "end": "12:00", "staff": 1}, {"start": "12:00", "end": "17:00", "staff": 3},
+                               {"start": "17:00", "end": "21:00", "staff": 2}]},
+    })
+    ctx = build_model(data, days=range(3, 8), staff_reqs={day: 2 for day in range(1, 29)})
+    assert sorted(ctx['demand']) == [3, 4, 5, 6, 7]
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = 1
+    solver.parameters.max_time_in_seconds = 30.0
+    assert solver.Solve(ctx['model']) == cp_model.OPTIMAL
+    short = solver.Value(dict(ctx['objective_terms'])['coverage'])
+    schedule, _ = extract_solution(ctx, solver)
+    report = coverage_report(ctx['demand'], schedule)
+    print(f"Short slots: {short}, report: {report['short_staff_hours']}h of {report['required_staff_hours']}h")
+    # Two people a day cannot be three at lunch: at least 10 slots short per day
+    assert short >= 5 * 10 and short == report['short_staff_hours'] * 2
+    assert sum(e['required'] - e['scheduled'] for e in report['short_slots']) == short
+    
+    # Pruning only looks at type, duration and cost, so it could drop the shift a slot needs
+    for overrides in ({"mode": "aggregate"}, {"prune_dominated": True}, {"template_cost_ceiling": 50}):
+        try:
+            get_solver_profile(data, overrides)
+            assert False, f"{overrides} should be rejected with a demand curve"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+    print("PASS: Demand curves become per-slot coverage constraints and a coverage report.")
+
+def api_client():
+    """A TestClient on the API with a memory-only result cache, so tests leave nothing on disk."""
+    api.results = api.result_cache.ResultCache(disk_dir=None)
+    return TestClient(api.app)
+
+def api_request(**overrides):
+    """A small /solve body: four employees, February 2026."""
+    body = {
+        "month": 2, "year": 2026, "fulltimeHours": 160, "defaultOpenTime": "08:30", "defaultCloseTime": "21:00",
+        "employees": [{"id": str(k), "name": f"E{k}", "role": "manager" if k < 2 else "assistant", "contractFte": 1.0,
+                       "unavailableDays": [], "vacationDays": []} for k in range(4)],
+        "specialDays": [], "config": {"autoStaffing": True, "busyWeekends": False},
+        "solver": {"timeLimitSeconds": 2, "numWorkers": 1},
+    }
+    body.update(overrides)
+    return body
+
+def test_request_days():
+    print("\n=== Testing Request Days ===")
+    
+    client = api_client()
+    employees = api_request()["employees"]
+    employees[0] = dict(employees[0], unavailableDays=["5", 6], vacationDays=["12"])
+    request = api.SolveRequest(**api_request(employees=employees, specialDays=[{"day": "14", "type": "busy"}]))
+    data = api.transform_request(request)
+    assert data["employees"][0]["unavailable_days"] == [5, 6] and data["employees"][0]["vacation_days"] == [12]
+    assert data["heavy_days"] == {"14": {"extra_staff": 2}}
+    
+    # Anything else is a 422 before the solver sees it; ISO dates only in a horizon
+    for bad in ({"specialDays": [{"day": "x", "type": "busy"}]},
+                {"specialDays": [{"day": "2026-02-14", "type": "busy"}]},
+                {"horizon": {"start": "2026-02-01", "days": 14}, "specialDays": [{"day": "2026-02-31", "type": "busy"}]}):
+        response = client.post("/solve", json=api_request(**bad))
+        print(f"{bad['specialDays'][0]['day']}: {response.status_code} {response.json()['detail'][0]['msg']}")
+        assert response.status_code == 422
+    request = api.SolveRequest(**api_request(horizon={"start": "2026-02-01", "days": 14},
+                                             specialDays=[{"day": "2026-02-14", "type": "busy"}]))
+    assert request.specialDays[0].day == "2026-02-14"
+    print("PASS: Digit strings become day numbers, anything else is rejected with 422.")
+
+def test_request_validation():
+    print("\n=== Testing Request Validation ===")
+    
+    client = api_client()
+    # Options the solver refuses are the client's mistake: 422 from every solving route, nothing solved
+    bad_requests = [
+        {"solver": {"engine": "local_search", "mode": "rolling"}},
+        {"solver": {"satParameters": {"no_such_parameter": 1}}},
+        {"solver": {"mode": "aggregate"}, "demand": {"default": [{"start": "09:00", "end": "17:00", "staff": 2}]}},
+        {"demand": {"default": [{"start": "09:15", "end": "17:00", "staff": 2}]}},
+        {"solver": {"mode": "aggregate"}, "previousSchedule": {"2": {"E0": {"start": "08:30", "end": "18:00", "type": "OPEN"}}}},
+    ]
+    for overrides in bad_requests:
+        body = api_request(**overrides)
+        if "solver" in overrides:
+            body["solver"] = dict(api_request()["solver"], **overrides["solver"])
+        for route in ("/solve", "/solve/stream", "/jobs"):
+            response = client.post(route, json=body)
+            assert response.status_code == 422, (route, overrides, response.status_code)
+        print(f"422: {response.json()['detail']}")
+    response = client.post("/solve/batch", json={"stores": [api_request(), api_request(**bad_requests[3])]})
+    assert response.status_code == 422 and response.json()["detail"].startswith("Store 1: ")
+    assert not api.job_manager.jobs
+    print("PASS: Invalid solver options and demand curves are rejected with 422 before solving.")
+
+def wait_for(check, timeout=60.0, interval=0.2):
+    """Polls check() until it returns something truthy; fails after timeout seconds."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = check()
+        if value:
+            return value
+        time.sleep(interval)
+    assert False, f"timed out after {timeout}s"
+
+def test_jobs_api():
+    print("\n=== Testing Jobs API ===")
+    
+    client = api_client()
+    manager, api.job_manager = api.job_manager, api.jobs.JobManager(max_workers=1, queue_depth=2)
+    try:
+        # One worker: the long job runs, the next one waits, a third does not fit the queue
+        long_body = api_request(solver={"timeLimitSeconds": 120, "numWorkers": 1, "relativeGapLimit": 0})
+        long_body["employees"] = api_request()["employees"] * 3
+        long_body["employees"] = [dict(e, id=str(k), name=f"E{k}") for k, e in enumerate(long_body["employees"])]
+        running = client.post("/jobs", json=long_body)
+        assert running.status_code == 202 and running.json()["status"] in ("queued", "running")
+        running_id = running.json()["id"]
+        queued_id = client.post("/jobs", json=api_request()).json()["id"]
+        full = client.post("/jobs", json=api_request())
+        print(f"Third job: {full.status_code} {full.json()['detail']}")
+        assert full.status_code == 429
+        
+        wait_for(lambda: client.get(f"/jobs/{running_id}").json()["status"] == "running")
+        # A waiting job never starts (the pool may already hold it, then it is 'cancelling' for a moment);
+        # a running one stops and keeps what it found
+        assert client.delete(f"/jobs/{queued_id}").json()["status"] in ("cancelling", "cancelled")
+        cancelled_at = time.time()
+        assert client.delete(f"/jobs/{running_id}").json()["status"] in ("cancelling", "cancelled")
+        job = wait_for(lambda: (lambda j: j["status"] == "cancelled" and j)(client.get(f"/jobs/{running_id}").json()))
+        print(f"Running job stopped {time.time() - cancelled_at:.1f}s after the cancel")
+        assert time.time() - cancelled_at < 30 and job["started_at"] is not None
+        job = wait_for(lambda: (lambda j: j["status"] == "cancelled" and j)(client.get(f"/jobs/{queued_id}").json()))
+        assert job["started_at"] is None and job["result"] is None
+        
+        # Room again: a short job runs to the end
+        done_id = client.post("/jobs", json=dict(api_request(), metrics=True)).json()["id"]
+        job = wait_for(lambda: (lambda j: j["status"] in ("done", "failed") and j)(client.get(f"/jobs/{done_id}").json()))
+        print(f"Short job: {job['status']}, result {job['result']['status']}")
+        assert job["status"] == "done" and job["error"] is None and job["result"]["schedule"]
+        assert "metrics" in job["result"] and job["finished_at"] >= job["started_at"] >= job["submitted_at"]
+        
+        # A job whose solve raises fails, and is counted under the engine it asked for
+        good = api.transform_request(api.SolveRequest(**api_request()))
+        errors = api.jobs.telemetry.SOLVES.value(status="ERROR", mode="full", engine="local_search")
+        failed_id = api.job_manager.submit(dict(good, employees=None, solver=dict(good["solver"], engine="local_search")))
+        job = wait_for(lambda: (lambda j: j["status"] == "failed" and j)(client.get(f"/jobs/{failed_id}").json()))
+        assert job["error"] and job["result"] is None
+        assert wait_for(lambda: api.jobs.telemetry.SOLVES.value(status="ERROR", mode="full", engine="local_search") == errors + 1)
+        
+        # A worker that dies mid-solve (e.g. a native crash) fails its job and takes its lease with it:
+        # the next job gets a fresh pool and the cores back
+        crash_id = client.post("/jobs", json=long_body).json()["id"]
+        wait_for(lambda: client.get(f"/jobs/{crash_id}").json()["status"] == "running")
+        wait_for(lambda: api.scheduler.CPU_BUDGET.in_use > 0)
+        for pid in list(api.job_manager._pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        job = wait_for(lambda: (lambda j: j["status"] == "failed" and j)(client.get(f"/jobs/{crash_id}").json()))
+        print(f"Killed worker: {job['error']}")
+        after_id = client.post("/jobs", json=api_request()).json()["id"]
+        job = wait_for(lambda: (lambda j: j["status"] in ("done", "failed") and j)(client.get(f"/jobs/{after_id}").json()))
+        assert job["status"] == "done" and job["result"]["schedule"]
+        assert wait_for(lambda: api.scheduler.CPU_BUDGET.in_use == 0)
+        
+        for method in (client.get, client.delete):
+            assert method("/jobs/no-such-job").status_code == 404
+    finally:
+        api.job_manager.shutdown()
+        api.job_manager = manager
+    print("PASS: Jobs are queued, polled, cancelled and bounded by the queue depth.")
+
+def read_sse(response):
+    """[(event, payload)] from a Server-Sent Events response, keep-alive comments skipped."""
+    events = []
+    event = None
+    for line in response.iter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+def test_solve_stream():
+    print("\n=== Testing Solve Stream ===")
+    
+    client = api_client()
+    body = api_request(solver={"timeLimitSeconds": 5, "numWorkers": 1})
+    with client.stream("POST", "/solve/stream", json=body) as response:
+        assert response.status_code == 200 and response.headers["content-type"].startswith("text/event-stream")
+        events = read_sse(response)
+    names = [event for event, _ in events]
+    print(f"Events: {names}")
+    # Improving schedules as they come, then exactly one final result
+    assert names[-1] == "result" and names.count("result") == 1 and names.count("solution") >= 1
+    assert set(names[:-1]) == {"solution"}
+    solutions = [payload for event, payload in events if event == "solution"]
+    assert all(payload["schedule"] and "elapsed_seconds" in payload for payload in solutions)
+    objectives = [payload["objective_value"] for payload in solutions]
+    assert objectives == sorted(objectives, reverse=True)
+    assert events[-1][1]["status"] in ("OPTIMAL", "FEASIBLE") and events[-1][1]["objective_value"] == objectives[-1]
+    
+    # A solve that raises ends the stream with an error event instead of leaving it open
+    def broken(*args, **kwargs):
+        raise RuntimeError("solver crashed")
+    solve = api.scheduler.solve_schedule
+    api.scheduler.solve_schedule = broken
+    try:
+        with client.stream("POST", "/solve/stream", json=body) as response:
+            events = read_sse(response)
+    finally:
+        api.scheduler.solve_schedule = solve
+    print(f"Failing solve: {events}")
+    assert events == [("error", {"detail": "solver crashed"})]
+    print("PASS: The stream sends each improving solution, then the result or an error.")
+
+def test_solve_batch():
+    print("\n=== Testing Batch Solve ===")
+    
+    client = api_client()
+    small = api_request(storeId="north")
+    larger = api_request(storeId="south")
+    larger["employees"] = larger["employees"] + [dict(e, id=f"x{e['id']}", name=f"X{e['name']}") for e in larger["employees"]]
+    with client.stream("POST", "/solve/batch", json={"stores": [small, larger], "concurrency": 2}) as response:
+        assert response.status_code == 200
+        events = read_sse(response)
+    names = [event for event, _ in events]
+    print(f"Events: {names}")
+    assert names == ["store", "store", "done"]
+    stores = sorted((payload for event, payload in events if event == "store"), key=lambda p: p["index"])
+    assert [(p["index"], p["storeId"]) for p in stores] == [(0, "north"), (1, "south")]
+    assert all(p["status"] in ("OPTIMAL", "FEASIBLE", "FALLBACK") and p["result"]["schedule"] for p in stores)
+    assert len(stores[1]["result"]["employees"]) == 8 and not stores[0]["cached"]
+    done = events[-1][1]
+    print(f"Done: {done}")
+    # concurrency is capped at the CPU budget
+    assert done["stores"] == 2 and sum(done["statuses"].values()) == 2
+    assert done["concurrency"] == min(2, api.scheduler.CPU_BUDGET.total)
+    
+    # Only SCHEDULER_MAX_BATCHES batches at once
+    taken = 0
+    while api.jobs.BATCH_SLOTS.acquire(blocking=False):
+        taken += 1
+    try:
+        assert client.post("/solve/batch", json={"stores": [small]}).status_code == 429
+    finally:
+        for _ in range(taken):
+            api.jobs.BATCH_SLOTS.release()
+    
+    # A store whose solve raises is reported as ERROR, and counted under the mode it asked for;
+    # the others still finish
+    good = api.transform_request(api.SolveRequest(**api_request()))
+    broken = dict(good, employees=None, solver=dict(good["solver"], mode="rolling"))
+    errors = api.jobs.telemetry.SOLVES.value(status="ERROR", mode="rolling", engine="cpsat")
+    outcomes = dict(api.jobs.solve_batch({"good": good, "broken": broken}, concurrency=2))
+    print(f"Outcomes: { {key: (o['status'], o['error']) for key, o in outcomes.items()} }")
+    assert outcomes["broken"]["status"] == "ERROR" and outcomes["broken"]["error"] and outcomes["broken"]["result"] is None
+    assert api.jobs.telemetry.SOLVES.value(status="ERROR", mode="rolling", engine="cpsat") == errors + 1
+    assert outcomes["good"]["status"] in ("OPTIMAL", "FEASIBLE", "FALLBACK") and outcomes["good"]["result"]["schedule"]
+    print("PASS: Each store gets its own event, failures included, then a done event.")
+
+def test_cpu_budget():
+    print("\n=== Testing CPU Budget ===")
+    
+    budget = CpuBudget(4)
+    first = budget.acquire(3)
+    second = budget.acquire(8)
+    print(f"Leases on 4 cores: {first}, then {second}")
+    assert (first, second, budget.in_use) == (3, 1, 4)
+    
+    # Nothing free: the next lease waits until a core comes back
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(budget.acquire(2)))
+    waiter.start()
+    waiter.join(0.3)
+    assert waiter.is_alive() and not granted
+    budget.release(first)
+    waiter.join(5)
+    assert granted == [2] and budget.in_use == 3
+    budget.release(second)
+    budget.release(2)
+    assert budget.in_use == 0
+    with budget.lease(8) as cores:
+        assert cores == 4 and budget.in_use == 4
+    assert budget.in_use == 0
+    
+    # A limited view caps each lease but counts against the same cores
+    share = budget.limited(2)
+    with share.lease(8) as cores, budget.lease(8) as rest:
+        assert (cores, rest, budget.in_use) == (2, 2, 4)
+    
+    # A solve asking for 8 workers runs with what its lease got
+    data = {
+        "year": 2025, "month": 2,
+        "employees": [{"name": f"E{k}", "role": "manager" if k < 2 else "assistant", "contract_type": 1.0,
+                       "unavailable_days": [], "vacation_days": []} for k in range(4)],
+        "config": {"default_open_time": "08:30", "default_close_time": "21:00"},
+    }
+    server_budget, scheduler.CPU_BUDGET = scheduler.CPU_BUDGET, CpuBudget(3)
+    try:
+        with scheduler.CPU_BUDGET.lease(1):
+            result = solve_schedule(json.loads(json.dumps(data)), solver_profile={"time_limit_seconds": 2.0, "num_workers": 8})
+        print(f"Workers with 2 of 3 cores free: {result['solver_profile']['num_workers']}")
+        assert result['solver_profile']['num_workers'] == 2 and scheduler.CPU_BUDGET.in_use == 0
+    finally:
+        scheduler.CPU_BUDGET = server_budget
+    solver = cp_model.CpSolver()
+    apply_solver_profile(solver, get_solver_profile(data, {"num_workers": 8}), 2)
+    assert solver.parameters.num_workers == 2
+    
+    # A process killed mid-lease never releases: the next lease that would block takes its cores back
+    budget = CpuBudget(2)
+    holder = multiprocessing.get_context('spawn').Process(target=hold_lease, args=(budget, 2, 60))
+    holder.start()
+    try:
+        wait_for(lambda: budget.in_use == 2)
+        holder.kill()  # not joined: a zombie still counts as dead
+        started = time.time()
+        granted = budget.acquire(1)
+        print(f"Lease after the holder was killed: {granted} core(s) in {time.time() - started:.1f}s")
+        assert granted == 1 and budget.in_use == 1 and time.time() - started < 10
+        budget.release(granted)
+        assert budget.in_use == 0 and budget.reclaim() == 0
+    finally:
+        holder.kill()
+        holder.join()
+    print("PASS: Leases share the budget's cores, wait when none is free and give them back.")
+
+def hold_lease(budget, cores, seconds):
+    # (in a child process) leases cores and sits on them
+    budget.acquire(cores)
+    time.sleep(seconds)
+
 if __name__ == "__main__":
     test_flex_bias()
     test_holiday_logic()
+    test_template_cache()
+    test_work_index()
+    test_batch_extraction()
+    test_schedule_hints()
+    test_result_cache()
+    test_rolling_horizon()
+    test_employee_classes()
+    test_compact_encoding()
+    test_template_pruning()
+    test_greedy_schedule()
+    test_local_search()
+    test_staged_objective()
+    test_scenario_generator()
+    test_bench_suite()
+    test_telemetry()
+    test_search_debug()
+    test_solver_presets()
+    test_planning_horizon()
+    test_availability_matrix()
+    test_schedule_metrics()
+    test_demand_coverage()
+    test_request_days()
+    test_request_validation()
+    test_jobs_api()
+    test_solve_stream()
+    test_solve_batch()
+    test_cpu_budget()
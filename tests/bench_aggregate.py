@@ -0,0 +1,64 @@
+import sys
+import os
+import json
+import random
+import statistics
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule, build_model, prepare_data
+from aggregate import employee_classes, build_class_model
+from bench_model_build import scale_scenario
+from bench_rolling import count_clopens, count_long_runs
+
+def run_benchmark(sizes=(50, 100, 200), time_limit=120.0, seed=0):
+    filename = os.path.join(script_dir, 'data_large.json')
+    with open(filename, 'r') as f:
+        base = json.load(f)
+
+    print(f"{'Employees':<10} | {'Classes':<8} | {'Per-emp vars':<12} | {'Class vars':<10} | {'Shrink':<6}")
+    print("-" * 58)
+    for size in sizes:
+        data = prepare_data(scale_scenario(base, size))
+        classes = employee_classes(data['employees'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            full_vars = len(build_model(data)['work'])
+            class_vars = len(build_class_model(data, classes)['counts'])
+        print(f"{size:<10} | {len(classes):<8} | {full_vars:<12} | {class_vars:<10} | {full_vars / class_vars:<6.1f}")
+
+    print(f"\nTime limit: {time_limit:.0f}s per run, seed: {seed}")
+    print(f"\n{'Employees':<10} | {'Mode':<9} | {'Status':<9} | {'Wall (s)':<9} | {'Avg |diff|':<10} | {'Max |diff|':<10} | {'Clopens':<7} | {'5+ runs':<7}")
+    print("-" * 91)
+
+    for size in sizes:
+        for mode in ('full', 'aggregate'):
+            data = scale_scenario(base, size)
+            profile = {"mode": mode, "time_limit_seconds": time_limit, "random_seed": seed}
+            # Same staffing allocation for both modes (calculate_monthly_staffing shuffles ties)
+            random.seed(seed)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = solve_schedule(data, solver_profile=profile)
+            wall = time.perf_counter() - start
+
+            if result['status'] not in ('OPTIMAL', 'FEASIBLE'):
+                print(f"{size:<10} | {mode:<9} | {result['status']:<9} | {wall:<9.1f} | {'-':<10} | {'-':<10} | {'-':<7} | {'-':<7}")
+                continue
+
+            diffs = [abs(e['diff']) for e in result['employees']]
+            schedule = result['schedule']
+            num_days = max(int(d) for d in schedule) if schedule else 0
+            print(f"{size:<10} | {mode:<9} | {result['status']:<9} | {wall:<9.1f} | "
+                  f"{statistics.mean(diffs):<10.1f} | {max(diffs):<10.1f} | "
+                  f"{count_clopens(schedule):<7} | {count_long_runs(schedule, num_days):<7}")
+
+if __name__ == "__main__":
+    limit = float(sys.argv[1]) if len(sys.argv) > 1 else 120.0
+    sizes = tuple(int(s) for s in sys.argv[2].split(',')) if len(sys.argv) > 2 else (50, 100, 200)
+    run_benchmark(sizes=sizes, time_limit=limit)
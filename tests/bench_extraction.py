@@ -0,0 +1,124 @@
+import sys
+import os
+import random
+import time
+import argparse
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+import scheduler
+from scheduler import build_model, prepare_data, extract_solution, fmt_time
+from greedy import build_greedy_schedule, hint_assignment
+from ortools.sat.python import cp_model
+from generate_stress_data import DEFAULT_SPEC, generate_stores
+
+def legacy_extract(ctx, value):
+    """
+    Extraction as it was before the batch read: solver.Value on every candidate literal,
+    then one pass over the whole schedule per employee for the open/close/middle counts.
+    Kept here as the baseline (and to check the new path gives the same result).
+    """
+    assignment = {}
+    for day in ctx['days']:
+        if ctx['day_contexts'][day].closed: continue
+        for i in range(len(ctx['employees'])):
+            for s_idx, template in enumerate(ctx['day_templates'][day]):
+                if (i, day, s_idx) in ctx['work'] and value(ctx['work'][(i, day, s_idx)]):
+                    assignment[(i, day)] = template
+
+    open_days = [day for day in ctx['days'] if not ctx['day_contexts'][day].closed]
+    schedule = {day: {} for day in open_days}
+    hours = {i: 0.0 for i in range(len(ctx['employees']))}
+    for (i, day), template in sorted(assignment.items(), key=lambda item: item[0]):
+        schedule[day][i] = template
+        hours[i] += template['duration']
+    schedule_output = {
+        str(day): {ctx['employees'][i]['name']: {"start": fmt_time(t['start']), "end": fmt_time(t['end']),
+                                                  "type": t['type'], "duration": t['duration']}
+                   for i, t in shifts.items()}
+        for day, shifts in schedule.items()
+    }
+    emp_stats = []
+    for i, emp in enumerate(ctx['employees']):
+        opens = closes = middle = 0
+        for shifts in schedule.values():
+            if i in shifts:
+                kind = shifts[i]['type']
+                if kind == 'OPEN': opens += 1
+                elif kind == 'CLOSE': closes += 1
+                elif kind == 'FIXED':
+                    opens += 1
+                    closes += 1
+                else: middle += 1
+        total = hours[i] + ctx['paid_hours'][i]
+        emp_stats.append({"name": emp['name'], "worked": hours[i], "paid_off": ctx['paid_hours'][i],
+                          "total": total, "target": emp['hours_fund'], "diff": total - emp['hours_fund'],
+                          "opens": opens, "closes": closes, "middle": middle})
+    return schedule_output, emp_stats
+
+def best_of(repeats, fn):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+def solve_greedy(ctx, time_limit):
+    """
+    A solved CpSolver holding the greedy schedule: hinted and fixed, so a store this size
+    gets a solution in seconds. Extraction cost does not depend on how good the schedule is.
+    """
+    assignment, _ = build_greedy_schedule(ctx)
+    hint_assignment(ctx, assignment)
+    solver = cp_model.CpSolver()
+    solver.parameters.fix_variables_to_their_hinted_value = True
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_workers = 1
+    return solver, solver.Solve(ctx['model'])
+
+def run_benchmark(employees=200, stores=3, time_limit=60.0, repeats=5, seed=0):
+    spec = DEFAULT_SPEC._replace(employees=employees)
+    print(f"{'Store':<6} | {'Literals':<9} | {'Shifts':<7} | {'Legacy (ms)':<12} | {'Batch (ms)':<11} | {'Speed-up':<8}")
+    print("-" * 68)
+    rows = []
+    for n, data in enumerate(generate_stores(seed, stores=stores, spec=spec)):
+        data = prepare_data(data)
+        # Same staffing allocation on every run (calculate_monthly_staffing shuffles ties)
+        random.seed(seed)
+        ctx = build_model(data)
+        solver, status = solve_greedy(ctx, time_limit)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            print(f"{n + 1:<6} | no solution in {time_limit:.0f}s ({solver.StatusName(status)}), skipped")
+            continue
+
+        legacy, expected = best_of(repeats, lambda: legacy_extract(ctx, solver.Value))
+        # The first batch read also builds the extraction index; count it
+        ctx.pop('extraction', None)
+        first, output = best_of(1, lambda: extract_solution(ctx, solver))
+        batch, output = best_of(repeats, lambda: extract_solution(ctx, solver))
+        assert output == expected, "batch extraction differs from the per-variable one"
+
+        shifts = sum(len(day) for day in output[0].values())
+        rows.append((len(ctx['work']), legacy, batch, first))
+        print(f"{n + 1:<6} | {len(ctx['work']):<9} | {shifts:<7} | {legacy * 1000:<12.1f} | "
+              f"{batch * 1000:<11.1f} | {legacy / batch:<8.1f}x")
+
+    if rows:
+        print(f"\nMean: legacy {sum(r[1] for r in rows) / len(rows) * 1000:.1f} ms, "
+              f"batch {sum(r[2] for r in rows) / len(rows) * 1000:.1f} ms "
+              f"(first call, with the index: {sum(r[3] for r in rows) / len(rows) * 1000:.1f} ms)")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time solution extraction, per-variable vs batch.")
+    parser.add_argument('--employees', type=int, default=200)
+    parser.add_argument('--stores', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=60.0, help="solve time limit per store (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.employees, args.stores, args.time_limit, seed=args.seed)
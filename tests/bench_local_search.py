@@ -0,0 +1,53 @@
+import sys
+import os
+import json
+import random
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule
+
+BUDGETS_MS = (100, 500, 2000)
+
+def run_benchmark(scenarios=('small', 'medium', 'large'), time_limit=60.0, seed=0):
+    print(f"CP-SAT time limit: {time_limit:.0f}s, local search budgets: {', '.join(f'{b} ms' for b in BUDGETS_MS)}, seed: {seed}")
+    print(f"\n{'Scenario':<9} | {'Engine':<17} | {'Status':<9} | {'Wall (s)':<8} | {'Objective':<10} | {'vs CP-SAT':<9}")
+    print("-" * 77)
+
+    for scenario in scenarios:
+        filename = os.path.join(script_dir, f"data_{scenario}.json")
+        with open(filename, 'r') as f:
+            base = json.load(f)
+
+        runs = [("cpsat", {"time_limit_seconds": time_limit})]
+        runs += [(f"local_search {budget}", {"engine": "local_search", "local_search_ms": budget}) for budget in BUDGETS_MS]
+
+        reference = None
+        for label, overrides in runs:
+            data = json.loads(json.dumps(base))
+            profile = dict(overrides, random_seed=seed)
+            # Same staffing allocation for every run (calculate_monthly_staffing shuffles ties)
+            random.seed(seed)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = solve_schedule(data, solver_profile=profile)
+            wall = time.perf_counter() - start
+
+            solved = result['status'] in ('OPTIMAL', 'FEASIBLE')
+            objective = result['objective_value'] if solved else None
+            if label == "cpsat":
+                reference = objective
+            ratio = f"{objective / reference:.2f}x" if objective is not None and reference else "-"
+            shown = f"{objective:.0f}" if objective is not None else "-"
+            print(f"{scenario:<9} | {label:<17} | {result['status']:<9} | {wall:<8.2f} | {shown:<10} | {ratio:<9}")
+
+if __name__ == "__main__":
+    limit = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    scenarios = tuple(sys.argv[2].split(',')) if len(sys.argv) > 2 else ('small', 'medium', 'large')
+    run_benchmark(scenarios, limit)
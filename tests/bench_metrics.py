@@ -0,0 +1,136 @@
+import sys
+import os
+import random
+import time
+import argparse
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import build_model, prepare_data, format_assignment, parse_time
+from greedy import build_greedy_schedule
+from schedule_metrics import stack, batch_metrics, result_metrics, GOLDEN_HOURS
+from generate_stress_data import DEFAULT_SPEC, generate_stores
+
+def loop_metrics(result):
+    """
+    The metrics the way analyze_results used to compute them, one schedule at a time with
+    Python loops over days and employees (same definitions as schedule_metrics).
+    Kept here as the baseline, and to check the array version gives the same numbers.
+    """
+    employees = result['employees']
+    schedule = result['schedule']
+    diffs = [abs(e['diff']) for e in employees]
+    opens = {e['name']: 0 for e in employees}
+    closes = {e['name']: 0 for e in employees}
+    flex = golden = 0
+    for shifts in schedule.values():
+        for name, shift in shifts.items():
+            if shift['type'] in ('OPEN', 'FIXED'):
+                opens[name] += 1
+            if shift['type'] in ('CLOSE', 'FIXED'):
+                closes[name] += 1
+            if shift['type'] == 'FLEX':
+                flex += 1
+                if parse_time(shift['start']) >= GOLDEN_HOURS[0] and parse_time(shift['end']) <= GOLDEN_HOURS[1]:
+                    golden += 1
+    clopens = 0
+    for day, shifts in schedule.items():
+        after = schedule.get(str(int(day) + 1), {})
+        for name, shift in shifts.items():
+            if shift['type'] in ('CLOSE', 'FIXED') and after.get(name, {}).get('type') in ('OPEN', 'FIXED'):
+                clopens += 1
+    return {
+        "mean_abs_diff": sum(diffs) / len(diffs),
+        "max_abs_diff": max(diffs),
+        "opens_min": min(opens.values()), "opens_max": max(opens.values()),
+        "opens_mean": sum(opens.values()) / len(opens),
+        "opens_spread": max(opens.values()) - min(opens.values()),
+        "closes_min": min(closes.values()), "closes_max": max(closes.values()),
+        "closes_mean": sum(closes.values()) / len(closes),
+        "closes_spread": max(closes.values()) - min(closes.values()),
+        "clopens": clopens,
+        "flex_shifts": flex,
+        "golden_flex": golden,
+        "golden_flex_share": golden / flex if flex else None,
+        "understaffed_days": len(result['understaffed']),
+        "total_deficit": float(sum(u['deficit'] for u in result['understaffed'])),
+    }
+
+def greedy_result(data, seed):
+    """A result dict holding the greedy schedule for one store (quick to build at any size)."""
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx = build_model(prepare_data(data))
+    assignment, _ = build_greedy_schedule(ctx)
+    open_days = [day for day in ctx['days'] if not ctx['day_contexts'][day].closed]
+    schedule, employees = format_assignment(ctx['employees'], assignment, open_days, ctx['paid_hours'])
+    return {"status": "FEASIBLE", "schedule": schedule, "employees": employees, "understaffed": []}
+
+def variants(result, count, rng):
+    """count schedules made from result by handing each day's shifts to a random permutation of the staff."""
+    names = [e['name'] for e in result['employees']]
+    out = []
+    for _ in range(count):
+        schedule = {}
+        for day, shifts in result['schedule'].items():
+            order = rng.sample(names, len(names))
+            swap = dict(zip(names, order))
+            schedule[day] = {swap[name]: shift for name, shift in shifts.items()}
+        out.append(dict(result, schedule=schedule))
+    return out
+
+def same(expected, actual):
+    for name, value in expected.items():
+        other = actual[name]
+        if value is None or other is None:
+            if value is not other:
+                return False
+        elif abs(value - other) > 1e-9:
+            return False
+    return True
+
+def run_benchmark(employees=25, schedules=2000, seed=0):
+    spec = DEFAULT_SPEC._replace(employees=employees)
+    base = greedy_result(generate_stores(seed, spec=spec)[0], seed)
+    results = variants(base, schedules, random.Random(seed))
+    print(f"{schedules} schedules of {employees} employees x {len(base['schedule'])} open days")
+
+    start = time.perf_counter()
+    expected = [loop_metrics(result) for result in results]
+    loops = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = stack(results)
+    stacked = time.perf_counter() - start
+    start = time.perf_counter()
+    metrics = batch_metrics(batch)
+    arrays = time.perf_counter() - start
+
+    for n in (0, schedules // 2, schedules - 1):
+        assert same(expected[n], result_metrics(results[n])), "array metrics differ from the loops"
+    for name, values in metrics.items():
+        if name != "golden_flex_share":
+            assert all(abs(e[name] - v) < 1e-9 for e, v in zip(expected, values.tolist())), name
+
+    print(f"{'Step':<26} | {'Total (ms)':<10} | {'Per schedule (us)':<17}")
+    print("-" * 60)
+    for label, seconds in (("Python loops", loops), ("Convert to arrays (stack)", stacked),
+                           ("Metrics on arrays", arrays), ("Arrays, end to end", stacked + arrays)):
+        print(f"{label:<26} | {seconds * 1000:<10.1f} | {seconds / schedules * 1e6:<17.1f}")
+    print(f"\nSpeed-up, metrics alone: {loops / arrays:.1f}x; with the conversion: {loops / (stacked + arrays):.1f}x")
+    clopens = metrics["clopens"]
+    print(f"Clopens per schedule: min {clopens.min()}, mean {clopens.mean():.1f}, max {clopens.max()}")
+    return loops, stacked, arrays
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time schedule metrics over many schedules, loops vs arrays.")
+    parser.add_argument('--employees', type=int, default=25)
+    parser.add_argument('--schedules', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run_benchmark(args.employees, args.schedules, args.seed)
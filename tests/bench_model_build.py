@@ -0,0 +1,73 @@
+import sys
+import os
+import json
+import copy
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import build_model, prepare_data
+
+def scale_scenario(data, num_employees):
+    # Clone the base roster until we reach the requested headcount
+    base = data['employees']
+    employees = []
+    for i in range(num_employees):
+        emp = copy.deepcopy(base[i % len(base)])
+        if i >= len(base):
+            emp['name'] = f"{emp['name']}_{i}"
+        employees.append(emp)
+    scaled = copy.deepcopy(data)
+    scaled['employees'] = employees
+    return scaled
+
+# A typical store day: one person through the morning, a lunch and afternoon peak, two to close
+DEMAND = {"default": [{"start": "08:30", "end": "12:00", "staff": 1},
+                      {"start": "12:00", "end": "17:00", "staff": 3},
+                      {"start": "17:00", "end": "21:00", "staff": 2}]}
+
+def best_build(data, repeats):
+    """(fastest build_model time over repeats, work variables) for a data dict."""
+    best = None
+    num_vars = 0
+    for _ in range(repeats):
+        prepared = prepare_data(copy.deepcopy(data))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ctx = build_model(prepared)
+        elapsed = time.perf_counter() - start
+        num_vars = len(ctx['work'])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, num_vars
+
+def run_benchmark(sizes=(5, 10, 25, 50, 100, 200), repeats=3):
+    filename = os.path.join(script_dir, 'data_large.json')
+    with open(filename, 'r') as f:
+        base = json.load(f)
+
+    print(f"{'Employees':<10} | {'Variables':<10} | {'Build (s)':<10} | {'us / var':<8} | "
+          f"{'With demand (s)':<15} | {'Demand cost':<11}")
+    print("-" * 82)
+
+    rows = []
+    for size in sizes:
+        scaled = scale_scenario(base, size)
+        best, num_vars = best_build(scaled, repeats)
+        # The same store with a demand curve: the half-hour coverage constraints on top
+        with_demand, _ = best_build(dict(scaled, demand=DEMAND), repeats)
+        rows.append((size, num_vars, best, with_demand))
+        print(f"{size:<10} | {num_vars:<10} | {best:<10.3f} | {best / num_vars * 1e6:<8.1f} | "
+              f"{with_demand:<15.3f} | {(with_demand / best - 1) * 100:<+10.0f}%")
+
+    # Linear scaling means the cost per variable stays flat as the model grows
+    per_var = [t / v for _, v, t, _ in rows]
+    print(f"\nPer-variable cost ratio (largest / smallest model): {per_var[-1] / per_var[0]:.2f}")
+    return rows
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,61 @@
+import sys
+import os
+import json
+import random
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule
+
+CONFIGS = (
+    ("none", {}),
+    ("dominance", {"prune_dominated": True}),
+    ("dom+cost50", {"prune_dominated": True, "template_cost_ceiling": 50}),
+    ("dom+cost20", {"prune_dominated": True, "template_cost_ceiling": 20}),
+)
+
+def run_benchmark(scenario='small', time_limit=60.0, seed=0):
+    filename = os.path.join(script_dir, f"data_{scenario}.json")
+    with open(filename, 'r') as f:
+        base = json.load(f)
+
+    print(f"Scenario: {scenario}, time limit {time_limit:.0f}s, seed {seed}")
+    print(f"\n{'Pruning':<11} | {'Templates':<9} | {'Variables':<9} | {'Constraints':<11} | {'Status':<10} | {'Wall (s)':<8} | {'Objective':<10} | {'Fallback':<8}")
+    print("-" * 96)
+
+    dropped = {}
+    for label, pruning in CONFIGS:
+        data = json.loads(json.dumps(base))
+        profile = dict(pruning, time_limit_seconds=time_limit, random_seed=seed)
+        # Same staffing allocation for every run (calculate_monthly_staffing shuffles ties)
+        random.seed(seed)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = solve_schedule(data, solver_profile=profile)
+        wall = time.perf_counter() - start
+
+        summary = result.get('pruning') or {}
+        templates = summary.get('templates_after', '-')
+        objective = f"{result['objective_value']:.0f}" if result['status'] in ('OPTIMAL', 'FEASIBLE') else "-"
+        fallback = "yes" if summary.get('fallback') else "-"
+        print(f"{label:<11} | {templates:<9} | {result['model']['variables']:<9} | {result['model']['constraints']:<11} | "
+              f"{result['status']:<10} | {wall:<8.1f} | {objective:<10} | {fallback:<8}")
+        dropped[label] = summary.get('dropped', [])
+
+    for label, templates in dropped.items():
+        if not templates:
+            continue
+        print(f"\nDropped by '{label}' ({len(templates)} distinct):")
+        for t in templates:
+            print(f"  {t['type']:<6} {t['start']}-{t['end']} ({t['duration']}h, cost {t['cost']}): {t['reason']}")
+
+if __name__ == "__main__":
+    scenario = sys.argv[1] if len(sys.argv) > 1 else 'small'
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    run_benchmark(scenario, limit)
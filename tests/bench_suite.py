@@ -0,0 +1,241 @@
+import sys
+import os
+import json
+import random
+import time
+import platform
+import argparse
+import contextlib
+import io
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule, build_model, prepare_data
+from schedule_metrics import stack, batch_metrics, metrics_at
+from generate_stress_data import build_scenario
+from bench_model_build import scale_scenario
+
+DEFAULT_BASELINE = os.path.join(script_dir, 'bench_baseline.json')
+
+# (name, base scenario, employees): seeded scenarios of increasing size
+SCENARIOS = (
+    ("small", "small", 5),
+    ("medium", "medium", 15),
+    ("large", "large", 25),
+    ("large_50", "large", 50),
+    ("large_100", "large", 100),
+)
+
+# metric -> (relative threshold, absolute slack). A run regresses on a metric when it is
+# worse than the baseline by more than both, so small timing noise on quick runs is ignored.
+THRESHOLDS = {
+    "build_time_seconds": (0.25, 0.05),
+    "solve_time_seconds": (0.25, 1.0),
+    "time_to_first_solution_seconds": (0.5, 1.0),
+    "objective_value": (0.05, 0.0),
+    "gap": (0.0, 0.05),
+    "variables": (0.0, 0.0),
+    "constraints": (0.0, 0.0),
+    "peak_rss_mb": (0.2, 20.0),
+}
+
+SOLVED = ('OPTIMAL', 'FEASIBLE')
+
+def scenario_data(base, employees, seed):
+    # Same seed, same roster: the scenario does not depend on the global random state
+    data = build_scenario(base, random.Random(seed))
+    if employees != len(data['employees']):
+        data = scale_scenario(data, employees)
+    return data
+
+def run_scenario(name, base, employees, seed, time_limit, num_workers):
+    """Builds and solves one scenario (in a fresh process, so peak RSS is its own)."""
+    data = scenario_data(base, employees, seed)
+    profile = {"time_limit_seconds": time_limit, "num_workers": num_workers, "random_seed": seed}
+
+    # Model build on its own, with the same staffing allocation the solve will use
+    random.seed(seed)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_model(prepare_data(json.loads(json.dumps(data))))
+    build_time = time.perf_counter() - start
+
+    first_solution = []
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve_schedule(
+            data,
+            solver_profile=profile,
+            on_solution=lambda s: first_solution.append(s['elapsed_seconds']) if not first_solution else None
+        )
+
+    solved = result['status'] in SOLVED
+    objective = result['objective_value'] if solved else None
+    bound = result['best_bound'] if solved else None
+    gap = None
+    if objective is not None and bound is not None:
+        gap = (objective - bound) / max(1.0, abs(objective))
+    return {
+        "scenario": name,
+        "employees": employees,
+        "status": result['status'],
+        "build_time_seconds": build_time,
+        "solve_time_seconds": result['solve_time_seconds'],
+        "time_to_first_solution_seconds": first_solution[0] if first_solution else None,
+        "objective_value": objective,
+        "best_bound": bound,
+        "gap": gap,
+        "variables": result['model']['variables'],
+        "constraints": result['model']['constraints'],
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        # Kept for the quality table (see schedule_metrics.py); dropped before the run is stored
+        "result": result if result['schedule'] else None,
+    }
+
+def compare(results, baseline, thresholds):
+    """Returns [(scenario, metric, baseline value, new value)] for every regression."""
+    regressions = []
+    previous = {run['scenario']: run for run in baseline.get('runs', [])}
+    for run in results:
+        base = previous.get(run['scenario'])
+        if base is None:
+            continue
+        if base['status'] in SOLVED and run['status'] not in SOLVED:
+            regressions.append((run['scenario'], 'status', base['status'], run['status']))
+            continue
+        for metric, (relative, slack) in thresholds.items():
+            old, new = base.get(metric), run.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + relative) + 1e-9 and new - old > slack:
+                regressions.append((run['scenario'], metric, old, new))
+    return regressions
+
+def fmt(value, digits=2):
+    if value is None:
+        return "-"
+    return f"{value:.{digits}f}" if isinstance(value, float) else str(value)
+
+def print_table(results):
+    print(f"\n{'Scenario':<10} | {'Emp':<4} | {'Status':<9} | {'Build (s)':<9} | {'Solve (s)':<9} | {'First (s)':<9} | "
+          f"{'Objective':<10} | {'Gap':<6} | {'Vars':<7} | {'Cons':<6} | {'RSS (MB)':<8}")
+    print("-" * 118)
+    for run in results:
+        print(f"{run['scenario']:<10} | {run['employees']:<4} | {run['status']:<9} | {fmt(run['build_time_seconds']):<9} | "
+              f"{fmt(run['solve_time_seconds']):<9} | {fmt(run['time_to_first_solution_seconds']):<9} | "
+              f"{fmt(run['objective_value'], 0):<10} | {fmt(run['gap']):<6} | {run['variables']:<7} | "
+              f"{run['constraints']:<6} | {fmt(run['peak_rss_mb'], 0):<8}")
+
+# Schedule quality columns: (metric from schedule_metrics.batch_metrics, header, digits)
+QUALITY_COLUMNS = (
+    ("mean_abs_diff", "Avg |diff| (h)", 1),
+    ("max_abs_diff", "Max |diff| (h)", 1),
+    ("opens_spread", "Open spread", 0),
+    ("closes_spread", "Close spread", 0),
+    ("clopens", "Clopens", 0),
+    ("golden_flex_share", "FLEX golden", 2),
+    ("understaffed_days", "Understaffed", 0),
+)
+
+def add_quality(results):
+    """Adds each solved run's schedule quality, computed for all runs at once, as its 'quality' block."""
+    solved = [run for run in results if run.get('result') is not None]
+    metrics = batch_metrics(stack([run['result'] for run in solved]))
+    for n, run in enumerate(solved):
+        run["quality"] = metrics_at(metrics, n)
+    for run in results:
+        run.pop('result', None)
+
+def print_quality(results):
+    headers = [header for _, header, _ in QUALITY_COLUMNS]
+    print(f"\n{'Scenario':<10} | " + " | ".join(headers))
+    print("-" * (13 + sum(len(header) + 3 for header in headers)))
+    for run in results:
+        quality = run.get('quality') or {}
+        cells = [f"{fmt(quality.get(name), digits):<{len(header)}}" for name, header, digits in QUALITY_COLUMNS]
+        print(f"{run['scenario']:<10} | " + " | ".join(cells))
+
+def parse_thresholds(overrides):
+    thresholds = dict(THRESHOLDS)
+    for item in overrides or []:
+        metric, _, value = item.partition('=')
+        if metric not in thresholds:
+            raise SystemExit(f"Unknown metric '{metric}' (expected one of {', '.join(thresholds)})")
+        thresholds[metric] = (float(value), thresholds[metric][1])
+    return thresholds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the solver on seeded scenarios and gate on regressions.")
+    parser.add_argument('--scenarios', default=','.join(name for name, _, _ in SCENARIOS),
+                        help="comma-separated scenario names")
+    parser.add_argument('--time-limit', type=float, default=30.0, help="solver time limit per scenario (s)")
+    parser.add_argument('--workers', type=int, default=1, help="CP-SAT workers (1 keeps runs reproducible)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="write this run as the new baseline")
+    parser.add_argument('--threshold', action='append', metavar='METRIC=REL',
+                        help="override a metric's relative threshold, e.g. objective_value=0.1")
+    args = parser.parse_args(argv)
+
+    known = {name: (base, employees) for name, base, employees in SCENARIOS}
+    names = [name for name in args.scenarios.split(',') if name]
+    for name in names:
+        if name not in known:
+            raise SystemExit(f"Unknown scenario '{name}' (expected one of {', '.join(known)})")
+    thresholds = parse_thresholds(args.threshold)
+
+    print(f"Scenarios: {', '.join(names)}; time limit {args.time_limit:.0f}s, "
+          f"{args.workers} worker(s), seed {args.seed}")
+    results = []
+    for name in names:
+        base, employees = known[name]
+        # One process per scenario: peak RSS is per run and no state leaks between runs
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.append(pool.submit(run_scenario, name, base, employees, args.seed,
+                                       args.time_limit, args.workers).result())
+        print(f"  {name}: {results[-1]['status']}")
+    add_quality(results)
+    print_table(results)
+    print_quality(results)
+
+    if args.update_baseline:
+        baseline = {
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "settings": {"time_limit_seconds": args.time_limit, "num_workers": args.workers, "seed": args.seed},
+            "runs": results,
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('settings', {}).get('time_limit_seconds') != args.time_limit:
+        print(f"\nNote: baseline was recorded with a {baseline['settings']['time_limit_seconds']:.0f}s time limit.")
+
+    regressions = compare(results, baseline, thresholds)
+    if not regressions:
+        print("\nNo regressions against the baseline.")
+        return 0
+    print(f"\n{len(regressions)} regression(s) against the baseline:")
+    for scenario, metric, old, new in regressions:
+        print(f"  {scenario}: {metric} {fmt(old)} -> {fmt(new)}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import sys
+import os
+import json
+import copy
+import random
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule
+
+def timed_solve(data, profile, seed):
+    # Same staffing allocation for every run (calculate_monthly_staffing shuffles ties)
+    random.seed(seed)
+    first_solution = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve_schedule(
+            data,
+            solver_profile=profile,
+            on_solution=lambda s: first_solution.append(time.perf_counter() - start) if not first_solution else None
+        )
+    total = time.perf_counter() - start
+    return result, (first_solution[0] if first_solution else None), total
+
+def tweak_one_employee(data, previous):
+    # The typical edit: one employee asks for two more days off
+    tweaked = copy.deepcopy(data)
+    emp = tweaked['employees'][-1]
+    worked_days = [int(d) for d, shifts in previous['schedule'].items() if emp['name'] in shifts]
+    extra = [d for d in worked_days if d not in emp.get('unavailable_days', [])][:2]
+    emp['unavailable_days'] = list(emp.get('unavailable_days', [])) + extra
+    return tweaked, emp['name'], extra
+
+def fmt(seconds):
+    return f"{seconds:.2f}" if seconds is not None else "-"
+
+def run_benchmark(scenario='medium', time_limit=60.0, seed=0):
+    filename = os.path.join(script_dir, f"data_{scenario}.json")
+    with open(filename, 'r') as f:
+        base = json.load(f)
+    profile = {"time_limit_seconds": time_limit, "random_seed": seed}
+
+    print(f"Scenario: {scenario}, time limit {time_limit:.0f}s")
+    previous, _, _ = timed_solve(copy.deepcopy(base), profile, seed)
+    if previous['status'] not in ('OPTIMAL', 'FEASIBLE'):
+        print(f"Initial solve failed ({previous['status']}); nothing to warm-start from.")
+        return
+
+    tweaked, name, extra = tweak_one_employee(base, previous)
+    print(f"Re-solving after marking {name} unavailable on days {extra}\n")
+
+    print(f"{'Run':<8} | {'Status':<9} | {'First sol (s)':<13} | {'To gap (s)':<10} | {'Objective':<10} | {'Hit rate':<8}")
+    print("-" * 72)
+    for label, hint in (("cold", None), ("warm", previous['schedule'])):
+        data = copy.deepcopy(tweaked)
+        if hint is not None:
+            data['previous_schedule'] = hint
+        result, first, total = timed_solve(data, profile, seed)
+        hit_rate = f"{result['hints']['hit_rate']:.0%}" if 'hints' in result else "-"
+        objective = f"{result['objective_value']:.0f}" if result['status'] in ('OPTIMAL', 'FEASIBLE') else "-"
+        print(f"{label:<8} | {result['status']:<9} | {fmt(first):<13} | {fmt(total):<10} | {objective:<10} | {hit_rate:<8}")
+
+if __name__ == "__main__":
+    scenario = sys.argv[1] if len(sys.argv) > 1 else 'medium'
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    run_benchmark(scenario, limit)
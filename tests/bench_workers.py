@@ -0,0 +1,52 @@
+import sys
+import os
+import json
+import time
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+from scheduler import solve_schedule, CPU_BUDGET
+
+def run_benchmark(worker_counts=(1, 4, 8), time_limit=60.0, seed=42):
+    filename = os.path.join(script_dir, 'data_large.json')
+    print(f"Scenario: {filename}")
+    print(f"Time limit: {time_limit:.0f}s, seed: {seed}, CPU budget: {CPU_BUDGET.total} cores")
+    if CPU_BUDGET.total < max(worker_counts):
+        print(f"Note: runs asking for more than {CPU_BUDGET.total} workers are capped by the budget "
+              "(set SCHEDULER_CPU_BUDGET to override).")
+
+    print(f"\n{'Workers':<8} | {'Granted':<8} | {'Status':<9} | {'Wall (s)':<9} | {'Objective':<10} | {'Bound':<10} | {'Gap':<6}")
+    print("-" * 76)
+
+    for workers in worker_counts:
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        profile = {
+            "num_workers": workers,
+            "time_limit_seconds": time_limit,
+            "random_seed": seed,
+        }
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = solve_schedule(data, solver_profile=profile)
+        wall = time.perf_counter() - start
+
+        granted = result['solver_profile']['num_workers']
+        if result['status'] not in ('OPTIMAL', 'FEASIBLE'):
+            print(f"{workers:<8} | {granted:<8} | {result['status']:<9} | {wall:<9.1f} | {'-':<10} | {'-':<10} | {'-':<6}")
+            continue
+
+        objective = result['objective_value']
+        bound = result['best_bound']
+        gap = abs(objective - bound) / max(1.0, abs(objective))
+        print(f"{workers:<8} | {granted:<8} | {result['status']:<9} | {wall:<9.1f} | {objective:<10.0f} | {bound:<10.0f} | {gap:<6.1%}")
+
+if __name__ == "__main__":
+    limit = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    run_benchmark(time_limit=limit)
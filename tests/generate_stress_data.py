@@ -1,52 +1,101 @@
 import json
 import random
 import os
+import sys
+import argparse
+import calendar
+from collections import namedtuple
+
+NAMES = [
+    "Alice", "Bob", "Charlie", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+    "Karl", "Liam", "Mia", "Noah", "Olivia", "Peggy", "Quinn", "Rupert", "Sybil", "Ted",
+    "Ursula", "Victor", "Walter", "Xena", "Yvonne", "Zelda"
+]
+
+MAX_EMPLOYEES = 500
+
+# December Logic
+DECEMBER_SPECIAL_DAYS = {
+    "24": {"type": "holiday_short_paid", "open": "08:30", "close": "14:00"},
+    "25": {"type": "holiday_closed"},
+    "26": {"type": "holiday_closed"},
+    "31": {"type": "holiday_short_unpaid", "open": "08:30", "close": "16:00"}
+}
+
+WEIGHTS = {
+    "work_hours": 1000,
+    "day_shape": 100,
+    "shift_cost": 10,
+    "open_close_fairness": 5,
+    "clopen": 50
+}
+
+# What a generated store looks like. Mixes are ordered (role or FTE, share) pairs; roles are
+# handed out in that order, so the first roles get the first (largest) FTEs, as in the presets.
+# employees is a headcount or a (min, max) range drawn per store. unavailable_days and
+# vacation_days are (min, max) counts. vacation_pattern is 'spread' (any start) or
+# 'clustered' (starts within one week per store, like a school holiday).
+# special_days None means the December holidays in December and none otherwise.
+ScenarioSpec = namedtuple('ScenarioSpec', [
+    'year', 'month', 'employees', 'role_mix', 'fte_mix',
+    'unavailable_rate', 'unavailable_days', 'vacation_rate', 'vacation_days', 'vacation_pattern',
+    'special_days',
+])
+
+DEFAULT_SPEC = ScenarioSpec(
+    year=2025,
+    month=12,
+    employees=25,
+    # The large preset's proportions
+    role_mix=(("manager", 0.04), ("deputy", 0.08), ("supervisor", 0.16), ("assistant", 0.72)),
+    fte_mix=((1.0, 0.32), (0.75, 0.32), (0.5, 0.36)),
+    unavailable_rate=0.5,
+    unavailable_days=(2, 5),
+    vacation_rate=0.2,
+    vacation_days=(2, 5),
+    vacation_pattern='spread',
+    special_days=None,
+)
+
+def allocate(mix, total):
+    """Splits total across a mix by largest remainder: [value] * count, in mix order."""
+    shares = sum(share for _, share in mix)
+    exact = [total * share / shares for _, share in mix]
+    counts = [int(x) for x in exact]
+    by_remainder = sorted(range(len(mix)), key=lambda k: (-(exact[k] - counts[k]), k))
+    for k in by_remainder[:total - sum(counts)]:
+        counts[k] += 1
+    return [value for (value, _), count in zip(mix, counts) for _ in range(count)]
+
+def full_time_hours(year, month):
+    # 8h per weekday (184 in December 2025)
+    return 8 * sum(1 for week in calendar.monthcalendar(year, month) for d in week[:5] if d)
+
+def _build_store(rng, year, month, roles, ftes, spec, cluster_start=None):
+    num_days = calendar.monthrange(year, month)[1]
+    num_employees = len(roles)
 
-def generate_scenario(size, filename):
-    print(f"Generating {size} scenario -> {filename}")
-    
-    # Configuration
-    year = 2025
-    month = 12
-    
-    # Roles distribution
-    if size == 'small':
-        num_employees = 5
-        roles = ['manager', 'deputy', 'assistant', 'assistant', 'assistant']
-        ftes = [1.0, 1.0, 0.75, 0.5, 0.5] # Removed 0.25
-    elif size == 'medium':
-        num_employees = 15
-        roles = ['manager', 'deputy', 'deputy'] + ['supervisor']*2 + ['assistant']*10
-        ftes = [1.0]*5 + [0.75]*5 + [0.5]*5 # Removed 0.25s, added to 0.5
-    else: # large
-        num_employees = 25
-        roles = ['manager', 'deputy', 'deputy'] + ['supervisor']*4 + ['assistant']*18
-        ftes = [1.0]*8 + [0.75]*8 + [0.5]*9 # Removed 0.25s, added to 0.5
-        
     # Employees
     employees = []
-    names = [
-        "Alice", "Bob", "Charlie", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
-        "Karl", "Liam", "Mia", "Noah", "Olivia", "Peggy", "Quinn", "Rupert", "Sybil", "Ted",
-        "Ursula", "Victor", "Walter", "Xena", "Yvonne", "Zelda"
-    ]
-    
     for i in range(num_employees):
-        name = names[i % len(names)]
-        if i >= len(names): name += f"_{i}"
-        
+        name = NAMES[i % len(NAMES)]
+        if i >= len(NAMES): name += f"_{i}"
+
         # Random constraints
         unavailable = []
-        # Increased probability (0.3 -> 0.5) and max days (3 -> 5) for realism
-        if random.random() < 0.5: 
-            unavailable = random.sample(range(1, 32), k=random.randint(2, 5))
-            
+        # 50% chance of 2-5 days by default (raised from 30% and 3 days for realism)
+        if rng.random() < spec.unavailable_rate:
+            unavailable = rng.sample(range(1, num_days + 1), k=rng.randint(*spec.unavailable_days))
+
         vacation = []
-        if random.random() < 0.2: # 20% chance of vacation
-            start = random.randint(1, 20)
-            length = random.randint(2, 5)
-            vacation = list(range(start, start + length))
-            
+        if rng.random() < spec.vacation_rate: # 20% chance by default
+            if cluster_start is None:
+                start = rng.randint(1, num_days - 11)
+            else:
+                start = cluster_start + rng.randint(0, 6)
+            length = rng.randint(*spec.vacation_days)
+            vacation = [d for d in range(start, start + length) if d <= num_days]
+
         employees.append({
             "name": name,
             "role": roles[i],
@@ -54,54 +103,152 @@ def generate_scenario(size, filename):
             "unavailable_days": unavailable,
             "vacation_days": vacation
         })
-        
-    # Special Days (December Logic)
-    special_days = {
-        "24": {"type": "holiday_short_paid", "open": "08:30", "close": "14:00"},
-        "25": {"type": "holiday_closed"},
-        "26": {"type": "holiday_closed"},
-        "31": {"type": "holiday_short_unpaid", "open": "08:30", "close": "16:00"}
-    }
-    
-    # Busy weekends (Fri, Sat, Sun)
-    # In Dec 2025:
-    # Fri: 5, 12, 19
-    # Sat: 6, 13, 20, 27
-    # Sun: 7, 14, 21, 28
-    # Let's mark some as busy manually or rely on config 'busy_weekends'
-    
+
+    special_days = spec.special_days
+    if special_days is None:
+        special_days = DECEMBER_SPECIAL_DAYS if month == 12 else {}
+
     data = {
         "year": year,
         "month": month,
-        "full_time_hours": 184, # Updated to 184
+        "full_time_hours": full_time_hours(year, month),
         "config": {
             "busy_weekends": True,
             "manager_roles": ["manager", "deputy"],
-            "min_openers": 1 if size == 'small' else 2,
-            "min_closers": 1 if size == 'small' else 2,
+            "min_openers": 1 if num_employees < 10 else 2,
+            "min_closers": 1 if num_employees < 10 else 2,
             "default_open_time": "08:30", # Updated to 08:30
             "default_close_time": "21:00"
         },
         "employees": employees,
         "special_days": special_days,
-        "closed_holidays": [25, 26], # Explicitly listed for backward compat, though special_days handles it too
-        "weights": {
-            "work_hours": 1000,
-            "day_shape": 100,
-            "shift_cost": 10,
-            "open_close_fairness": 5,
-            "clopen": 50
-        }
+        # Explicitly listed for backward compat, though special_days handles it too
+        "closed_holidays": sorted(int(d) for d, sd in special_days.items() if sd.get('type') == 'holiday_closed'),
+        "weights": dict(WEIGHTS)
     }
-    
+    return data
+
+def build_scenario(size, rng=random):
+    """
+    The small / medium / large December scenario as a data dict.
+    rng draws the unavailable and vacation days (a random.Random for a reproducible scenario).
+    """
+    # Roles distribution
+    if size == 'small':
+        roles = ['manager', 'deputy', 'assistant', 'assistant', 'assistant']
+        ftes = [1.0, 1.0, 0.75, 0.5, 0.5] # Removed 0.25
+    elif size == 'medium':
+        roles = ['manager', 'deputy', 'deputy'] + ['supervisor']*2 + ['assistant']*10
+        ftes = [1.0]*5 + [0.75]*5 + [0.5]*5 # Removed 0.25s, added to 0.5
+    else: # large
+        roles = ['manager', 'deputy', 'deputy'] + ['supervisor']*4 + ['assistant']*18
+        ftes = [1.0]*8 + [0.75]*8 + [0.5]*9 # Removed 0.25s, added to 0.5
+    return _build_store(rng, 2025, 12, roles, ftes, DEFAULT_SPEC)
+
+def generate_store(rng, spec=DEFAULT_SPEC):
+    """One store from a ScenarioSpec, drawing everything from rng."""
+    employees = spec.employees
+    if isinstance(employees, (tuple, list)):
+        employees = rng.randint(*employees)
+    if not 1 <= employees <= MAX_EMPLOYEES:
+        raise ValueError(f"Headcount must be between 1 and {MAX_EMPLOYEES}, got {employees}")
+    roles = allocate(spec.role_mix, employees)
+    # Every store gets at least one of the first role (its manager), however small
+    if roles[0] != spec.role_mix[0][0]:
+        roles = [spec.role_mix[0][0]] + roles[:-1]
+    ftes = sorted(allocate(spec.fte_mix, employees), reverse=True)
+    cluster_start = None
+    if spec.vacation_pattern == 'clustered':
+        num_days = calendar.monthrange(spec.year, spec.month)[1]
+        cluster_start = rng.randint(1, num_days - 13)
+    elif spec.vacation_pattern != 'spread':
+        raise ValueError(f"Unknown vacation pattern '{spec.vacation_pattern}' (expected spread or clustered)")
+    return _build_store(rng, spec.year, spec.month, roles, ftes, spec, cluster_start)
+
+def generate_stores(seed, stores=1, spec=DEFAULT_SPEC):
+    """
+    [data] for `stores` stores. Each store has its own generator seeded from (seed, store
+    number), so a store's data does not change when more stores are generated.
+    """
+    return [generate_store(random.Random(f"{seed}/{k}"), spec) for k in range(1, stores + 1)]
+
+def write_scenario(data, filename):
+    # Fixed key order and formatting: the same seed writes byte-identical files
     with open(filename, 'w') as f:
         json.dump(data, f, indent=2)
 
-if __name__ == "__main__":
+def generate_scenario(size, filename, rng=random):
+    print(f"Generating {size} scenario -> {filename}")
+    write_scenario(build_scenario(size, rng), filename)
+
+def _range(text):
+    low, _, high = text.partition('-')
+    return (int(low), int(high or low))
+
+def _mix(text, cast):
+    pairs = []
+    for item in text.split(','):
+        value, _, share = item.partition('=')
+        pairs.append((cast(value), float(share)))
+    return tuple(pairs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate scheduler scenarios. Without --employees, writes the small/medium/large presets.")
+    parser.add_argument('--seed', type=int, default=None, help="seed (presets are unseeded without it)")
+    parser.add_argument('--employees', type=_range, default=None, metavar='N or MIN-MAX',
+                        help=f"headcount per store, up to {MAX_EMPLOYEES}")
+    parser.add_argument('--year', type=int, default=DEFAULT_SPEC.year)
+    parser.add_argument('--month', type=int, default=DEFAULT_SPEC.month)
+    parser.add_argument('--stores', type=int, default=1, help="number of stores (one file each)")
+    parser.add_argument('--roles', type=lambda t: _mix(t, str), default=DEFAULT_SPEC.role_mix,
+                        metavar='ROLE=SHARE,...', help="e.g. manager=0.04,deputy=0.08,supervisor=0.16,assistant=0.72")
+    parser.add_argument('--ftes', type=lambda t: _mix(t, float), default=DEFAULT_SPEC.fte_mix,
+                        metavar='FTE=SHARE,...', help="e.g. 1.0=0.32,0.75=0.32,0.5=0.36")
+    parser.add_argument('--unavailable-rate', type=float, default=DEFAULT_SPEC.unavailable_rate,
+                        help="share of employees with unavailable days")
+    parser.add_argument('--unavailable-days', type=_range, default=DEFAULT_SPEC.unavailable_days, metavar='MIN-MAX')
+    parser.add_argument('--vacation-rate', type=float, default=DEFAULT_SPEC.vacation_rate,
+                        help="share of employees with a vacation")
+    parser.add_argument('--vacation-days', type=_range, default=DEFAULT_SPEC.vacation_days, metavar='MIN-MAX')
+    parser.add_argument('--vacation-pattern', choices=('spread', 'clustered'), default=DEFAULT_SPEC.vacation_pattern)
+    parser.add_argument('--special-days', default=None, metavar='FILE',
+                        help="JSON file of special days (default: the December holidays in December)")
+    parser.add_argument('--out', default=None, help="output directory (default: this directory)")
+    parser.add_argument('--prefix', default=None, help="file name prefix")
+    args = parser.parse_args(argv)
+
     # Determine the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Generate files in the same directory as the script
-    generate_scenario('small', os.path.join(script_dir, 'data_small.json'))
-    generate_scenario('medium', os.path.join(script_dir, 'data_medium.json'))
-    generate_scenario('large', os.path.join(script_dir, 'data_large.json'))
+    out_dir = args.out or script_dir
+    os.makedirs(out_dir, exist_ok=True)
+
+    if args.employees is None:
+        # Generate files in the same directory as the script
+        for size in ('small', 'medium', 'large'):
+            rng = random.Random(f"{args.seed}/{size}") if args.seed is not None else random
+            generate_scenario(size, os.path.join(out_dir, f'data_{size}.json'), rng)
+        return 0
+
+    special_days = None
+    if args.special_days:
+        with open(args.special_days) as f:
+            special_days = json.load(f)
+    low, high = args.employees
+    spec = DEFAULT_SPEC._replace(
+        year=args.year, month=args.month, employees=low if low == high else (low, high),
+        role_mix=args.roles, fte_mix=args.ftes,
+        unavailable_rate=args.unavailable_rate, unavailable_days=args.unavailable_days,
+        vacation_rate=args.vacation_rate, vacation_days=args.vacation_days,
+        vacation_pattern=args.vacation_pattern, special_days=special_days,
+    )
+    seed = args.seed if args.seed is not None else 0
+    prefix = args.prefix or f"scenario_{args.year}_{args.month:02d}_{low if low == high else f'{low}-{high}'}_seed{seed}"
+    for k, data in enumerate(generate_stores(seed, args.stores, spec), start=1):
+        filename = f"{prefix}.json" if args.stores == 1 else f"{prefix}_store{k:02d}.json"
+        print(f"Generating store {k} ({len(data['employees'])} employees) -> {filename}")
+        write_scenario(data, os.path.join(out_dir, filename))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
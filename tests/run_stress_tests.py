@@ -1,7 +1,6 @@
 import sys
 import os
 import json
-import statistics
 import time
 
 # Add app directory to path (parent of tests directory + /app)
@@ -9,7 +8,8 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 sys.path.append(os.path.join(project_root, 'app'))
 
-from scheduler import solve_schedule, parse_time
+from scheduler import solve_schedule
+from schedule_metrics import result_metrics
 
 def analyze_results(scenario_name, result, data):
     print(f"\n--- Analysis: {scenario_name} ---")
@@ -19,68 +19,34 @@ def analyze_results(scenario_name, result, data):
         return
         
     employees = result['employees']
-    schedule = result['schedule']
     
     # 1. Solvability
     print(f"Status: {result['status']}")
     print(f"Solve Time: {result['solve_time_seconds']:.2f}s")
     print(f"Objective Value: {result['objective_value']}")
     
+    metrics = result_metrics(result)
+    
     # 2. Fairness (Diff from Target)
-    diffs = [e['diff'] for e in employees]
-    avg_diff = statistics.mean([abs(d) for d in diffs])
-    max_diff = max([abs(d) for d in diffs])
-    print(f"Fairness (Hours Diff): Avg Abs={avg_diff:.1f}h, Max Abs={max_diff:.1f}h")
+    print(f"Fairness (Hours Diff): Avg Abs={metrics['mean_abs_diff']:.1f}h, Max Abs={metrics['max_abs_diff']:.1f}h")
     
     # 3. Open/Close Balance
-    # Calculate standard deviation of open/close counts normalized by FTE?
-    # Or just raw counts for now.
-    opens = [e['opens'] for e in employees]
-    closes = [e['closes'] for e in employees]
-    print(f"Opens per emp: {min(opens)}-{max(opens)} (Avg {statistics.mean(opens):.1f})")
-    print(f"Closes per emp: {min(closes)}-{max(closes)} (Avg {statistics.mean(closes):.1f})")
+    print(f"Opens per emp: {metrics['opens_min']}-{metrics['opens_max']} (Avg {metrics['opens_mean']:.1f})")
+    print(f"Closes per emp: {metrics['closes_min']}-{metrics['closes_max']} (Avg {metrics['closes_mean']:.1f})")
     
-    # 4. Clopen Count
-    clopen_count = 0
-    for emp_name in schedule['1'].keys(): # Iterate employees present in day 1 (approx)
-        # We need to iterate all days
-        for day in range(1, 31):
-            day_str = str(day)
-            next_day_str = str(day + 1)
-            
-            if day_str in schedule and next_day_str in schedule:
-                if emp_name in schedule[day_str] and emp_name in schedule[next_day_str]:
-                    s1 = schedule[day_str][emp_name]
-                    s2 = schedule[next_day_str][emp_name]
-                    
-                    if s1['type'] == 'CLOSE' and s2['type'] == 'OPEN':
-                        clopen_count += 1
-                        
-    print(f"Clopen Count: {clopen_count}")
+    # 4. Clopen Count (closing one day, opening the next; FIXED shifts do both)
+    print(f"Clopen Count: {metrics['clopens']}")
     
     # 5. FLEX Quality (Golden Hours 10-19)
-    flex_shifts = []
-    golden_flex = 0
-    for day_shifts in schedule.values():
-        for s in day_shifts.values():
-            if s['type'] == 'FLEX':
-                flex_shifts.append(s)
-                # Check if roughly 10-19
-                # Parse times
-                start = parse_time(s['start'])
-                end = parse_time(s['end'])
-                if start >= 10.0 and end <= 19.0:
-                    golden_flex += 1
-                    
-    if flex_shifts:
-        print(f"FLEX Quality: {golden_flex}/{len(flex_shifts)} ({golden_flex/len(flex_shifts)*100:.1f}%) in Golden Hours (10-19)")
+    if metrics['flex_shifts']:
+        print(f"FLEX Quality: {metrics['golden_flex']}/{metrics['flex_shifts']} "
+              f"({metrics['golden_flex_share']*100:.1f}%) in Golden Hours (10-19)")
     else:
         print("FLEX Quality: N/A (No FLEX shifts)")
 
     # 6. Understaffing
-    if result['understaffed']:
-        total_deficit = sum(u['deficit'] for u in result['understaffed'])
-        print(f"Understaffing: {len(result['understaffed'])} days, Total Deficit: {total_deficit}")
+    if metrics['understaffed_days']:
+        print(f"Understaffing: {metrics['understaffed_days']} days, Total Deficit: {metrics['total_deficit']:g}")
     else:
         print("Understaffing: None")
         
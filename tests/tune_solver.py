@@ -0,0 +1,178 @@
+import sys
+import os
+import json
+import glob
+import random
+import time
+import datetime
+import argparse
+import contextlib
+import io
+
+# Add app directory to path (parent of tests directory + /app)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(os.path.join(project_root, 'app'))
+
+import scheduler
+from scheduler import solve_schedule, size_class, SOLVER_PRESETS_PATH
+from bench_staged import schedule_terms
+
+# What a candidate may set: num_workers (a profile setting) and CP-SAT parameters
+SEARCH_SPACE = {
+    "num_workers": (1, 2, 4, 8),
+    "linearization_level": (0, 1, 2),
+    "symmetry_level": (0, 2, 4),
+    "search_branching": ("AUTOMATIC_SEARCH", "FIXED_SEARCH", "PORTFOLIO_SEARCH", "PSEUDO_COST_SEARCH", "HINT_SEARCH"),
+    "use_lns_only": (False, True),
+    "use_rins_lns": (False, True),
+}
+
+# Score of a run that found no schedule, as a multiple of the best objective on that scenario
+UNSOLVED_RATIO = 10.0
+
+def candidates(trials, max_workers, rng):
+    """The default settings first, then `trials` distinct random draws from SEARCH_SPACE."""
+    found = [{}]
+    seen = {json.dumps({}, sort_keys=True)}
+    attempts = 0
+    while len(found) < trials + 1 and attempts < trials * 50:
+        attempts += 1
+        candidate = {}
+        for name, values in SEARCH_SPACE.items():
+            if name == "num_workers":
+                values = [w for w in values if w <= max_workers] or [1]
+            candidate[name] = rng.choice(values)
+        key = json.dumps(candidate, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            found.append(candidate)
+    return found
+
+def to_profile(candidate, time_limit, seed):
+    parameters = {name: value for name, value in candidate.items() if name != "num_workers"}
+    return {
+        "time_limit_seconds": time_limit,
+        "random_seed": seed,
+        # None keeps the default worker count
+        "num_workers": candidate.get("num_workers"),
+        "sat_parameters": parameters,
+        # Measure the candidate itself, not whatever preset is installed
+        "presets": False,
+    }
+
+def run(data, candidate, time_limit, seed):
+    """(objective of the returned schedule, or None if unsolved; wall seconds)"""
+    # Same staffing allocation for every candidate (calculate_monthly_staffing shuffles ties)
+    random.seed(seed)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve_schedule(json.loads(json.dumps(data)), solver_profile=to_profile(candidate, time_limit, seed))
+    wall = time.perf_counter() - start
+    if result['status'] not in ('OPTIMAL', 'FEASIBLE'):
+        return None, wall
+    random.seed(seed)
+    # Re-scored: a non-optimal solver objective can overstate what the schedule costs
+    return schedule_terms(json.loads(json.dumps(data)), result)['objective'], wall
+
+def score(objectives, best):
+    """Mean ratio to the best objective seen on each scenario (1.0 is best everywhere)."""
+    ratios = []
+    for name, objective in objectives.items():
+        if objective is None:
+            ratios.append(UNSOLVED_RATIO)
+        else:
+            ratios.append(objective / max(1.0, best[name]))
+    return sum(ratios) / len(ratios)
+
+def tune_class(scenarios, trials, time_limit, seed, max_workers):
+    """Runs every candidate on every scenario of one size class; returns (preset, rows)."""
+    rng = random.Random(seed)
+    runs = []
+    for candidate in candidates(trials, max_workers, rng):
+        objectives, walls = {}, []
+        for name, data in scenarios:
+            objectives[name], wall = run(data, candidate, time_limit, seed)
+            walls.append(wall)
+        runs.append((candidate, objectives, sum(walls) / len(walls)))
+        print(f"    {json.dumps(candidate)}: "
+              + ", ".join(f"{name} {value if value is not None else '-'}" for name, value in objectives.items()))
+
+    best = {}
+    for _, objectives, _ in runs:
+        for name, objective in objectives.items():
+            if objective is not None:
+                best[name] = min(best.get(name, objective), objective)
+    rows = [(round(score(objectives, best), 4), wall, candidate) for candidate, objectives, wall in runs]
+    # Lowest score wins and quicker runs break ties, but the defaults stay unless a
+    # candidate beats them: a better score, or the same score at least 10% quicker
+    default_score, default_wall, _ = rows[0]
+    chosen_score, chosen_wall, chosen = min(rows, key=lambda row: (row[0], row[1]))
+    if chosen_score == default_score and chosen_wall > 0.9 * default_wall:
+        chosen_score, chosen_wall, chosen = rows[0]
+    preset = {
+        "num_workers": chosen.get("num_workers"),
+        "sat_parameters": {name: value for name, value in chosen.items() if name != "num_workers"},
+        "score": chosen_score,
+        "default_score": default_score,
+        "scenarios": [name for name, _ in scenarios],
+    }
+    return preset, rows
+
+def load_corpus(patterns):
+    corpus = {}
+    for pattern in patterns:
+        for filename in sorted(glob.glob(pattern)):
+            with open(filename, 'r') as f:
+                data = json.load(f)
+            # generate_stress_data.py --stores writes one store per file; a list is several stores
+            stores = data if isinstance(data, list) else [data]
+            for k, store in enumerate(stores):
+                name = os.path.basename(filename) + (f"#{k + 1}" if len(stores) > 1 else "")
+                num_days = scheduler.calendar.monthrange(store.get('year', 2025), store.get('month', 12))[1]
+                corpus.setdefault(size_class(len(store['employees']), num_days), []).append((name, store))
+    return corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tune CP-SAT settings per size class on a corpus of scenarios and write solver presets.")
+    parser.add_argument('corpus', nargs='*', default=[os.path.join(script_dir, 'data_*.json')],
+                        help="scenario files or globs (default: the bundled data_*.json)")
+    parser.add_argument('--trials', type=int, default=8, help="random candidates per size class, besides the defaults")
+    parser.add_argument('--time-limit', type=float, default=30.0, help="solver time limit per run (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-workers', type=int, default=scheduler.CPU_BUDGET.total,
+                        help="largest num_workers to try (default: the CPU budget)")
+    parser.add_argument('--out', default=SOLVER_PRESETS_PATH, help="presets file to write")
+    parser.add_argument('--dry-run', action='store_true', help="print the presets without writing them")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        raise SystemExit("No scenarios found")
+
+    presets = {}
+    for name in sorted(corpus):
+        scenarios = corpus[name]
+        print(f"{name}: {len(scenarios)} scenario(s), {args.trials + 1} candidates, {args.time_limit:.0f}s each")
+        presets[name], _ = tune_class(scenarios, args.trials, args.time_limit, args.seed, args.max_workers)
+        preset = presets[name]
+        print(f"  -> score {preset['score']} (defaults {preset['default_score']}): "
+              f"num_workers {preset['num_workers']}, {json.dumps(preset['sat_parameters'])}")
+
+    output = {
+        "tuned_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        "settings": {"time_limit_seconds": args.time_limit, "trials": args.trials, "seed": args.seed,
+                     "max_workers": args.max_workers, "cpus": os.cpu_count()},
+        "presets": presets,
+    }
+    if args.dry_run:
+        print(json.dumps(output, indent=2))
+        return 0
+    with open(args.out, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nPresets written to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())